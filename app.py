@@ -1,11 +1,24 @@
 import streamlit as st
 from divination_agent import DivinationAgent
 from chart_generator import ChartGenerator
-import time
+from interpretation_cache import InterpretationCache
+from question_similarity import QuestionIndex, DEFAULT_THRESHOLD
+from base_interpretations import BaseInterpretationStore
+from hedging import HedgePolicy
+from rate_limiter import UpstreamLimiter
+from circuit_breaker import CircuitBreaker
+from timing import Trace, enable_json_log
+from metrics import start_metrics_server
+from divination_methods import get_method, method_names
+from pipeline import BackgroundStream, ProgressSteps, CHUNK, QUEUE, CHART, PROGRESS, TICK
+from line_models import MODELS as LINE_MODELS
+from ganzhi_calendar import BEIJING
 import os
-import random
 import base64
+import uuid
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 # 设置页面配置
 st.set_page_config(
@@ -626,10 +639,132 @@ if "messages" not in st.session_state:
 if "api_key" not in st.session_state:
     st.session_state.api_key = os.getenv("MODELSCOPE_API_KEY", "ms-df56303c-e814-48da-a195-3dc2487c3b33")
 
+# 会话ID，用于在上游限流器中按会话公平排队
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# 解读缓存在进程内所有会话间共享
+@st.cache_resource
+def get_interpretation_cache():
+    # 相似问题（仅语气词、标点、语序不同，时间和事项相同）复用同一卦象下已有的解读
+    threshold = float(os.getenv("DIVINATION_SIMILARITY_THRESHOLD", DEFAULT_THRESHOLD))
+    return InterpretationCache(question_index=QuestionIndex(threshold=threshold))
+
+# 预生成的通用解读，文件不存在时全部交给AI模型生成
+@st.cache_resource
+def get_base_store():
+    path = os.getenv("DIVINATION_BASE_PATH", "base_interpretations.bin")
+    return BaseInterpretationStore(path) if os.path.exists(path) else None
+
+# 对冲请求策略，设置 DIVINATION_HEDGE=1 开启，所有会话共享首token延迟统计
+@st.cache_resource
+def get_hedge_policy():
+    if os.getenv("DIVINATION_HEDGE", "0") != "1":
+        return None
+    return HedgePolicy(percentile=float(os.getenv("DIVINATION_HEDGE_PERCENTILE", "0.95")))
+
+# 上游限流器，所有会话共享同一个API密钥的请求额度
+@st.cache_resource
+def get_upstream_limiter():
+    return UpstreamLimiter(rate=float(os.getenv("DIVINATION_RPS", "2")),
+                           burst=int(os.getenv("DIVINATION_BURST", "4")),
+                           max_concurrent=int(os.getenv("DIVINATION_MAX_STREAMS", "8")))
+
+# 上游熔断器，ModelScope降级时所有会话立即改用本地解读
+@st.cache_resource
+def get_circuit_breaker():
+    return CircuitBreaker(failure_threshold=int(os.getenv("DIVINATION_BREAKER_FAILURES", "5")),
+                          latency_slo=float(os.getenv("DIVINATION_LATENCY_SLO", "15")),
+                          reset_timeout=float(os.getenv("DIVINATION_BREAKER_RESET", "30")))
+
+# 每次占卜输出一行JSON格式的分阶段耗时，设置 DIVINATION_TIMING_LOG=0 关闭
+if os.getenv("DIVINATION_TIMING_LOG", "1") != "0":
+    enable_json_log()
+
+# Prometheus监控指标，默认在 127.0.0.1:9108/metrics 暴露，设置 DIVINATION_METRICS_PORT=0 关闭
+@st.cache_resource
+def get_metrics_server():
+    port = int(os.getenv("DIVINATION_METRICS_PORT", "9108"))
+    if port == 0:
+        return None
+    try:
+        return start_metrics_server(host=os.getenv("DIVINATION_METRICS_HOST", "127.0.0.1"), port=port,
+                                    cache=get_interpretation_cache(), limiter=get_upstream_limiter(),
+                                    circuit_breaker=get_circuit_breaker(), hedge_policy=get_hedge_policy())
+    except OSError:
+        # 端口被占用（例如同时运行了多个实例）时不影响占卜
+        return None
+
+get_metrics_server()
+
 # 初始化占卜智能体
-divination_agent = DivinationAgent(api_key=st.session_state.api_key)
+divination_agent = DivinationAgent(api_key=st.session_state.api_key, cache=get_interpretation_cache(),
+                                   base_store=get_base_store(), hedge=get_hedge_policy(),
+                                   limiter=get_upstream_limiter(), circuit_breaker=get_circuit_breaker())
 chart_generator = ChartGenerator()
 
+# 图表渲染线程，pyplot不是线程安全的，所有会话共享一个线程串行渲染
+@st.cache_resource
+def get_chart_executor():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+
+# 占卜过程的步骤，每一步在对应阶段真实完成后推进：
+# cast 起卦完成，chart 图表渲染完成，connect 上游已连接，first_token 收到首个解读文本
+PROGRESS_STEPS = {
+    "梅花易数": [
+        ("cast", "🔮 启动梅花易数占卜程序..."),
+        ("cast", "🌀 生成随机数字..."),
+        ("cast", "🔢 计算卦象..."),
+        ("chart", "📊 绘制数字分布图..."),
+        ("connect", "🧠 调用AI模型进行深度解读..."),
+        ("first_token", "📈 等待AI模型返回结果..."),
+    ],
+    "天干地支": [
+        ("cast", "🔮 启动天干地支占卜程序..."),
+        ("cast", "🌀 推算天干..."),
+        ("cast", "🔢 推算地支..."),
+        ("chart", "📊 组合干支..."),
+        ("connect", "🧠 调用AI模型进行深度解读..."),
+        ("first_token", "📈 等待AI模型返回结果..."),
+    ],
+    "六爻": [
+        ("cast", "🔮 启动六爻占卜程序..."),
+        ("cast", "🌀 抛掷六爻..."),
+        ("chart", "📊 绘制卦象..."),
+        ("connect", "🧠 调用AI模型进行深度解读..."),
+        ("first_token", "📈 等待AI模型返回结果..."),
+    ],
+    "紫微斗数": [
+        ("cast", "🔮 启动紫微斗数占卜程序..."),
+        ("cast", "🌀 推算命宫..."),
+        ("cast", "🔢 分析主星..."),
+        ("chart", "📊 定位宫位..."),
+        ("connect", "🧠 调用AI模型进行深度解读..."),
+        ("first_token", "📈 等待AI模型返回结果..."),
+    ],
+}
+
+# 每一步至少展示的秒数，仅为视觉效果且不阻塞占卜流程，默认0即完成即推进
+PROGRESS_MIN_STEP = float(os.getenv("DIVINATION_PROGRESS_MIN_STEP", "0"))
+
+def build_hexagram_html(cast):
+    """根据起卦结果生成卦象展示HTML，由各占卜方式注册的display生成，没有卦象展示的方式返回None"""
+    display = get_method(cast.method).display
+    return display(cast) if display is not None else None
+
+def render_chart_html(cast, trace):
+    """在渲染线程中生成图表HTML，紫微斗数没有图表"""
+    with trace.span("chart"):
+        chart_data = chart_generator.generate_chart(cast)
+    if chart_data is None:
+        return None
+    return f"""
+    <div class='chart-container'>
+        <h3>📈 {get_method(cast.method).chart_title}</h3>
+        <img src='{chart_data}' style='max-width: 100%; height: auto; border-radius: 10px;' />
+    </div>
+    """
+
 # 侧边栏设置
 with st.sidebar:
     st.markdown("<div class='sidebar-content'>", unsafe_allow_html=True)
@@ -648,7 +783,10 @@ with st.sidebar:
         if api_key_input and api_key_input != st.session_state.api_key:
             st.session_state.api_key = api_key_input
             # 重新初始化占卜智能体
-            divination_agent = DivinationAgent(api_key=st.session_state.api_key)
+            divination_agent = DivinationAgent(api_key=st.session_state.api_key, cache=get_interpretation_cache(),
+                                               base_store=get_base_store(), hedge=get_hedge_policy(),
+                                               limiter=get_upstream_limiter(),
+                                               circuit_breaker=get_circuit_breaker())
             st.success("API密钥已保存并更新！")
         elif api_key_input == st.session_state.api_key:
             st.info("API密钥没有变化")
@@ -659,8 +797,19 @@ with st.sidebar:
     
     divination_type = st.selectbox(
         "选择占卜方式",
-        ["梅花易数", "天干地支", "六爻", "紫微斗数"]
+        method_names()
     )
+    cast_options = {}
+    if divination_type == "六爻":
+        cast_options["model"] = st.radio("起爻方式", list(LINE_MODELS), horizontal=True,
+                                         help="均匀：四种爻值机会相同（默认）；铜钱：三枚铜钱摇卦；"
+                                              "蓍草：大衍筮法，老阳多于老阴")
+    time_help = {
+        "天干地支": "当前时间：按干支历取今日日柱，并给出年、月、日、时四柱",
+        "梅花易数": "当前时间：按农历年月日与时辰起卦，同一时辰起出的卦相同",
+    }
+    time_based = divination_type in time_help and st.radio(
+        "起卦方式", ["随机", "当前时间"], horizontal=True, help=time_help[divination_type]) == "当前时间"
     
     st.divider()
     st.subheader("🔮 占卜介绍")
@@ -758,188 +907,113 @@ if prompt := st.chat_input("请输入您想占卜的问题..."):
     
     # 添加助手响应到历史记录
     with st.chat_message("assistant"):
-        # 显示占卜过程
+        # 本次占卜的分阶段耗时记录
+        trace = Trace(method=divination_type)
+        
+        # 占卜过程随流水线的真实进度推进，不再固定等待
+        progress = ProgressSteps(PROGRESS_STEPS[divination_type], min_step_seconds=PROGRESS_MIN_STEP)
         process_placeholder = st.empty()
+        hexagram_placeholder = st.empty()
+        chart_placeholder = st.empty()
+        queue_placeholder = st.empty()
+        result_placeholder = st.empty()
         
-        # 占卜过程动画
-        if divination_type == "梅花易数":
-            process_steps = [
-                "🔮 启动梅花易数占卜程序...",
-                "🌀 生成随机数字...",
-                "🔢 计算卦象...",
-                "📊 分析卦象含义...",
-                "🧠 调用AI模型进行深度解读...",
-                "📈 等待AI模型返回结果...",
-                "✅ 占卜完成！"
-            ]
-        elif divination_type == "天干地支":
-            process_steps = [
-                "🔮 启动天干地支占卜程序...",
-                "🌀 推算天干...",
-                "🔢 推算地支...",
-                "📊 组合干支...",
-                "🧠 调用AI模型进行深度解读...",
-                "📈 等待AI模型返回结果...",
-                "✅ 占卜完成！"
-            ]
-        elif divination_type == "六爻":
-            process_steps = [
-                "🔮 启动六爻占卜程序...",
-                "🌀 抛掷第一爻...",
-                "🔢 抛掷第二爻...",
-                "📊 抛掷第三爻...",
-                "🧠 抛掷第四爻...",
-                "🔮 抛掷第五爻...",
-                "✨ 抛掷第六爻...",
-                "📊 绘制卦象...",
-                "🧠 调用AI模型进行深度解读...",
-                "📈 等待AI模型返回结果...",
-                "✅ 占卜完成！"
-            ]
-        else:  # 紫微斗数
-            process_steps = [
-                "🔮 启动紫微斗数占卜程序...",
-                "🌀 推算命宫...",
-                "🔢 分析主星...",
-                "📊 定位宫位...",
-                "🧠 调用AI模型进行深度解读...",
-                "📈 等待AI模型返回结果...",
-                "✅ 占卜完成！"
-            ]
+        def render_progress():
+            """刷新占卜过程，全部完成后清除"""
+            if progress.finished:
+                process_placeholder.empty()
+            else:
+                process_html = "".join(f"<div class='process-step'>步骤 {i+1}: {step}</div>"
+                                       for i, step in enumerate(progress.lines()))
+                process_placeholder.markdown(process_html, unsafe_allow_html=True)
         
-        # 显示过程步骤（除了最后一步）
-        process_text = ""
-        for i, step in enumerate(process_steps[:-1]):  # 不显示最后一步"占卜完成"
-            process_text += f"<div class='process-step'>步骤 {i+1}: {step}</div>"
-            process_placeholder.markdown(process_text, unsafe_allow_html=True)
-            time.sleep(0.5)
+        def show_chart(future):
+            try:
+                with trace.span("chart_wait"):
+                    chart_html = future.result()
+                if chart_html:
+                    chart_placeholder.markdown(chart_html, unsafe_allow_html=True)
+            except Exception as e:
+                chart_placeholder.warning(f"图表生成失败: {str(e)}")
+            progress.complete("chart")
         
-        # 执行占卜（这会等待AI返回结果）
+        render_progress()
+        stream = None
         try:
-            # 显示卦象图表
-            hexagram_placeholder = st.empty()
-            chart_placeholder = st.empty()
+            # 先起卦，AI解读、卦象展示和图表都基于同一个卦象
+            with trace.span("cast"):
+                if time_based:
+                    cast_options["moment"] = datetime.now(BEIJING)
+                cast = divination_agent.cast(divination_type, **cast_options)
+            progress.complete("cast")
             
-            if divination_type == "六爻":
-                # 提取爻线信息
-                lines = ["———", "-- --"]  # 阳爻和阴爻
-                yao_lines = []
-                for _ in range(6):
-                    yao_lines.append(random.choice(lines))
-                
-                # 显示卦象
-                hexagram_html = "<div class='hexagram-display'>六爻卦象</div>"
-                hexagram_html += "<div class='visualization-container'>"
-                hexagram_html += "<h3>📊 卦象展示</h3>"
-                for i, line in enumerate(reversed(yao_lines)):  # 从下到上显示
-                    hexagram_html += f"<div class='yao-line'>{line}</div>"
-                hexagram_html += "</div>"
-                hexagram_placeholder.markdown(hexagram_html, unsafe_allow_html=True)
-                
-                # 生成六爻卦象图表
-                try:
-                    chart_data = chart_generator.generate_six_yao_chart(yao_lines)
-                    chart_html = f"""
-                    <div class='chart-container'>
-                        <h3>📈 六爻卦象可视化</h3>
-                        <img src='{chart_data}' style='max-width: 100%; height: auto; border-radius: 10px;' />
-                    </div>
-                    """
-                    chart_placeholder.markdown(chart_html, unsafe_allow_html=True)
-                except Exception as e:
-                    st.warning(f"图表生成失败: {str(e)}")
+            # 立即开始AI解读，上游的首token等待与图表渲染同时进行
+            if st.session_state.api_key:
+                stream = BackgroundStream()
+                stream.track(trace, ("connect", "first_token"))
+                stream.start(divination_agent.run_divination_stream(divination_type, prompt,
+                                                                    session_id=st.session_state.session_id,
+                                                                    on_queue=stream.on_queue, trace=trace,
+                                                                    cast=cast))
             
-            elif divination_type == "天干地支":
-                # 模拟天干地支
-                heavenly_stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-                earthly_branches = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-                stem = random.choice(heavenly_stems)
-                branch = random.choice(earthly_branches)
-                
-                # 显示天干地支
-                hexagram_html = f"<div class='hexagram-display'>天干地支：{stem}{branch}</div>"
-                hexagram_html += "<div class='visualization-container'>"
-                hexagram_html += "<h3>📊 干支详情</h3>"
-                hexagram_html += f"<p><strong>天干</strong>：{stem}</p>"
-                hexagram_html += f"<p><strong>地支</strong>：{branch}</p>"
-                hexagram_html += f"<p><strong>组合</strong>：{stem}{branch}</p>"
-                hexagram_html += "</div>"
-                hexagram_placeholder.markdown(hexagram_html, unsafe_allow_html=True)
-                
-                # 生成天干地支图表
-                try:
-                    chart_data = chart_generator.generate_heavenly_stems_chart(stem, branch)
-                    chart_html = f"""
-                    <div class='chart-container'>
-                        <h3>📈 天干地支关系图</h3>
-                        <img src='{chart_data}' style='max-width: 100%; height: auto; border-radius: 10px;' />
-                    </div>
-                    """
-                    chart_placeholder.markdown(chart_html, unsafe_allow_html=True)
-                except Exception as e:
-                    st.warning(f"图表生成失败: {str(e)}")
+            # 图表在渲染线程中生成
+            chart_future = get_chart_executor().submit(render_chart_html, cast, trace)
             
-            elif divination_type == "梅花易数":
-                # 模拟数字
-                numbers = [random.randint(1, 8) for _ in range(3)]
-                
-                # 显示数字
-                hexagram_html = f"<div class='hexagram-display'>梅花易数：{numbers[0]}, {numbers[1]}, {numbers[2]}</div>"
-                hexagram_html += "<div class='visualization-container'>"
-                hexagram_html += "<h3>📊 数字详情</h3>"
-                hexagram_html += f"<p><strong>数字1</strong>：{numbers[0]}</p>"
-                hexagram_html += f"<p><strong>数字2</strong>：{numbers[1]}</p>"
-                hexagram_html += f"<p><strong>数字3</strong>：{numbers[2]}</p>"
-                hexagram_html += "</div>"
+            # 显示卦象
+            hexagram_html = build_hexagram_html(cast)
+            if hexagram_html:
                 hexagram_placeholder.markdown(hexagram_html, unsafe_allow_html=True)
-                
-                # 生成梅花易数图表
-                try:
-                    chart_data = chart_generator.generate_plum_blossom_chart(numbers)
-                    chart_html = f"""
-                    <div class='chart-container'>
-                        <h3>📈 梅花易数数字分布</h3>
-                        <img src='{chart_data}' style='max-width: 100%; height: auto; border-radius: 10px;' />
-                    </div>
-                    """
-                    chart_placeholder.markdown(chart_html, unsafe_allow_html=True)
-                except Exception as e:
-                    st.warning(f"图表生成失败: {str(e)}")
+            render_progress()
             
             # 检查API密钥是否设置
-            if not st.session_state.api_key:
-                # 显示API密钥未设置的提示
-                process_text += f"<div class='process-step'>步骤 {len(process_steps)}: {process_steps[-1]}</div>"
-                process_placeholder.markdown(process_text, unsafe_allow_html=True)
-                time.sleep(0.5)
+            if stream is None:
+                show_chart(chart_future)
                 process_placeholder.empty()
                 
+                # 显示API密钥未设置的提示
                 warning_msg = "⚠️ API密钥未设置或使用默认密钥，无法调用AI模型进行深度解读。请在侧边栏输入您的ModelScope API密钥以启用AI功能。"
                 st.warning(warning_msg)
                 st.session_state.messages.append({"role": "assistant", "content": warning_msg})
             else:
-                # 现在显示最后一步"占卜完成"
-                process_text += f"<div class='process-step'>步骤 {len(process_steps)}: {process_steps[-1]}</div>"
-                process_placeholder.markdown(process_text, unsafe_allow_html=True)
-                
-                # 等待一小段时间让用户看到"占卜完成"
-                time.sleep(0.5)
-                
-                # 清除过程显示
-                process_placeholder.empty()
-                
-                # 流式输出结果
-                result_placeholder = st.empty()
+                # 图表渲染完成后与解读流在同一个事件队列中显示
+                chart_future.add_done_callback(lambda future: stream.post(CHART, future))
+                chart_shown = False
                 result_text = ""
                 
-                # 使用流式输出
+                # 设置了最短展示时间时定时刷新，让已完成的步骤依次出现
+                tick = 0.1 if PROGRESS_MIN_STEP > 0 else None
+                
+                # 使用流式输出，后台线程已提前收到的内容会一次性显示
                 try:
-                    for chunk in divination_agent.run_divination_stream(divination_type, prompt):
-                        result_text += chunk
-                        result_placeholder.markdown(f"<div class='result-container'><div class='stream-text'>{result_text}</div></div>", unsafe_allow_html=True)
+                    for kind, payload in stream.events(tick=tick):
+                        with trace.span("render"):
+                            if kind == CHUNK:
+                                queue_placeholder.empty()
+                                result_text += payload
+                                result_placeholder.markdown(f"<div class='result-container'><div class='stream-text'>{result_text}</div></div>", unsafe_allow_html=True)
+                                continue
+                            if kind == QUEUE:
+                                # 上游繁忙时显示真实的排队位置和预计等待时间
+                                position, wait = payload
+                                queue_placeholder.info(f"⏳ 请求较多，正在排队：第 {position} 位，预计等待约 {max(1, round(wait))} 秒")
+                            elif kind == CHART:
+                                show_chart(payload)
+                                chart_shown = True
+                            elif kind == PROGRESS:
+                                # 命中缓存或合并到在途请求时没有连接阶段，收到首token即视为已连接
+                                progress.complete(*(("connect", payload) if payload == "first_token" else (payload,)))
+                            elif kind == TICK and not progress.pending:
+                                continue
+                            render_progress()
+                    
+                    # 解读先于图表完成时（例如命中缓存）补上图表
+                    if not chart_shown:
+                        show_chart(chart_future)
+                    process_placeholder.empty()
                     
                     # 确保最终完整结果显示
-                    result_placeholder.markdown(f"<div class='result-container'><div class='stream-text'>{result_text}</div></div>", unsafe_allow_html=True)
+                    with trace.span("render"):
+                        result_placeholder.markdown(f"<div class='result-container'><div class='stream-text'>{result_text}</div></div>", unsafe_allow_html=True)
                     st.session_state.messages.append({"role": "assistant", "content": result_text})
                 except Exception as ai_error:
                     # 清除过程显示
@@ -957,3 +1031,9 @@ if prompt := st.chat_input("请输入您想占卜的问题..."):
             error_msg = f"❌ 占卜过程中出现错误：{str(e)}"
             st.error(error_msg)
             st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        finally:
+            # 页面中断时通知后台线程停止读取上游
+            if stream is not None:
+                stream.close()
+            # 输出本次占卜的分阶段耗时
+            trace.finish()
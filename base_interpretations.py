@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通用卦象解读预生成模块
+卦象空间是有限的：梅花易数64卦、天干地支10×12、紫微斗数6×6、六爻2^6。
+离线为每个卦象生成一份通用解读并写入带索引的紧凑文件，
+请求时直接输出通用部分，只让AI模型补充针对问题的部分。
+
+用法：
+    python base_interpretations.py --output base_interpretations.bin --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from divination_methods import get_method, method_names
+
+# 文件格式：魔数、版本、条目数、索引长度，随后是JSON索引与zlib压缩的正文
+MAGIC = b'DVBI'
+VERSION = 1
+HEADER = struct.Struct('<4sHII')
+
+# 生成通用解读时代替用户问题
+GENERIC_QUESTION = '（通用解读，不针对具体问题）请从事业、财运、感情、健康等方面概述此卦象的含义'
+
+
+
+def base_key(divination_type: str, cast: str) -> str:
+    """由卦象键得到通用解读的键，梅花易数只取卦名，不区分起卦数字；六爻只取本卦阴阳，不区分动爻；
+    天干地支只取干支，不区分四柱"""
+    if divination_type in ("梅花易数", "六爻"):
+        return cast.split(' ', 1)[0]
+    if divination_type == "天干地支":
+        return cast.split(',', 1)[0]
+    return cast
+
+
+def enumerate_casts() -> Iterator[Tuple[str, str, str]]:
+    """枚举全部卦象，产出（占卜方式，通用解读键，占卜结果）"""
+    for name in method_names():
+        method = get_method(name)
+        if method.base_casts is None:
+            continue
+        for key, result in method.base_casts():
+            yield name, key, result
+
+
+class BaseInterpretationStore:
+    """通用解读文件的只读访问"""
+
+    def __init__(self, path: str):
+        """加载索引，正文按需解压"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, count, index_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"无法识别的通用解读文件：{path}")
+
+        start = HEADER.size
+        self._index: Dict[str, List[int]] = json.loads(data[start:start + index_size].decode('utf-8'))
+        self._body = memoryview(data)[start + index_size:]
+        self._decoded: Dict[str, str] = {}
+
+    @staticmethod
+    def _entry_key(divination_type: str, key: str) -> str:
+        return f"{divination_type}\x1f{key}"
+
+    def get(self, divination_type: str, key: str) -> Optional[str]:
+        """读取某个卦象的通用解读"""
+        entry_key = self._entry_key(divination_type, key)
+        text = self._decoded.get(entry_key)
+        if text is None:
+            location = self._index.get(entry_key)
+            if location is None:
+                return None
+            offset, length = location
+            text = zlib.decompress(self._body[offset:offset + length]).decode('utf-8')
+            self._decoded[entry_key] = text
+        return text
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @classmethod
+    def write(cls, path: str, entries: Dict[Tuple[str, str], str]) -> None:
+        """将 {(占卜方式, 键): 解读} 写入文件"""
+        index: Dict[str, List[int]] = {}
+        body = bytearray()
+        for (divination_type, key), text in entries.items():
+            compressed = zlib.compress(text.encode('utf-8'), 9)
+            index[cls._entry_key(divination_type, key)] = [len(body), len(compressed)]
+            body += compressed
+
+        index_bytes = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(index), len(index_bytes)))
+            f.write(index_bytes)
+            f.write(body)
+        os.replace(tmp_path, path)
+
+
+async def generate_all(agent, concurrency: int = 8) -> Dict[Tuple[str, str], str]:
+    """并发生成全部通用解读，同时在途的请求数不超过concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    entries: Dict[Tuple[str, str], str] = {}
+    casts = list(enumerate_casts())
+
+    async def generate(divination_type: str, key: str, result: str) -> None:
+        async with semaphore:
+            response = await agent.retry_policy.call_async(lambda: agent.async_client.chat.completions.create(
+                model=agent.model,
+                messages=agent._build_messages(divination_type, GENERIC_QUESTION, result),
+                stream=False,
+                temperature=0.7,
+                max_tokens=1500
+            ))
+        entries[(divination_type, key)] = response.choices[0].message.content
+        print(f"✅ [{len(entries)}/{len(casts)}] {divination_type} {key}")
+
+    results = await asyncio.gather(*(generate(*cast) for cast in casts), return_exceptions=True)
+    for cast, outcome in zip(casts, results):
+        if isinstance(outcome, Exception):
+            print(f"❌ {cast[0]} {cast[1]} 生成失败: {outcome}")
+    return entries
+
+
+def main():
+    from divination_agent import DivinationAgent
+
+    parser = argparse.ArgumentParser(description="预生成全部卦象的通用解读")
+    parser.add_argument('--output', default=os.getenv('DIVINATION_BASE_PATH', 'base_interpretations.bin'))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--api-key', default=None)
+    args = parser.parse_args()
+
+    agent = DivinationAgent(api_key=args.api_key)
+    entries = asyncio.run(generate_all(agent, args.concurrency))
+    BaseInterpretationStore.write(args.output, entries)
+    print(f"🎉 已写入 {len(entries)} 条通用解读到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
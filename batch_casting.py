@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量起卦模块
+用 NumPy 随机数生成器一次生成大量卦象，结果全部是数组，供统计分析和公平性审计使用，
+不经过智能体和网络请求。各占卜方式的批量起卦函数由 method_* 模块注册
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import hexagrams
+from divination_methods import get_method
+
+# 第i爻对应卦值的第i位
+_LINE_SHIFTS = np.arange(6, dtype=np.uint8)
+# 先天八卦数 -> 三爻卦，下标0不使用
+_PRE_HEAVEN = np.array([0] + list(hexagrams.PRE_HEAVEN_TRIGRAMS[1:]), dtype=np.uint8)
+KING_WEN = np.array(hexagrams.KING_WEN, dtype=np.uint8)
+
+
+class CastBatch:
+    """一批起卦结果，每行一卦
+
+    numbers为起卦数字或爻值，形状（N，k），没有数字的方式k为0；
+    symbols为文字部分在对应列表中的下标，形状（N，k）；
+    outcomes为每卦的结果编号，六爻、梅花易数为卦值（0~63），其余为文字下标的组合，labels为编号对应的文字；
+    moving为动爻掩码，没有动爻的方式为None
+    """
+
+    __slots__ = ('method', 'numbers', 'symbols', 'outcomes', 'labels', 'moving', 'seed')
+
+    def __init__(self, method: str, outcomes: np.ndarray, labels: Sequence[str],
+                 numbers: Optional[np.ndarray] = None, symbols: Optional[np.ndarray] = None,
+                 moving: Optional[np.ndarray] = None):
+        count = len(outcomes)
+        self.method = method
+        self.outcomes = outcomes
+        self.labels = list(labels)
+        self.numbers = numbers if numbers is not None else np.empty((count, 0), dtype=np.int8)
+        self.symbols = symbols if symbols is not None else np.empty((count, 0), dtype=np.int8)
+        self.moving = moving
+        self.seed: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def frequencies(self) -> np.ndarray:
+        """各结果编号出现的次数"""
+        return np.bincount(self.outcomes, minlength=len(self.labels))
+
+    def frequency_table(self) -> Dict[str, int]:
+        """结果文字 -> 出现次数"""
+        return dict(zip(self.labels, self.frequencies().tolist()))
+
+    def changed(self) -> np.ndarray:
+        """变卦的卦值，没有动爻的方式返回本卦"""
+        if self.moving is None:
+            return self.outcomes
+        return self.outcomes ^ self.moving
+
+
+def lines_to_hexagrams(lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """由（N，6）的爻值数组得到卦值和动爻掩码，与 hexagrams.from_lines 逐行一致"""
+    values = ((lines & 1).astype(np.uint8) << _LINE_SHIFTS).sum(axis=1, dtype=np.uint8)
+    moving = (((lines == 6) | (lines == 9)).astype(np.uint8) << _LINE_SHIFTS).sum(axis=1, dtype=np.uint8)
+    return values, moving
+
+
+def plum_blossom_hexagrams(numbers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """由（N，3）的起卦数字得到卦值和动爻掩码，与 hexagrams.plum_blossom 逐行一致"""
+    numbers = numbers.astype(np.int64)
+    upper = _PRE_HEAVEN[(numbers[:, 0] - 1) % 8 + 1]
+    lower = _PRE_HEAVEN[(numbers[:, 1] - 1) % 8 + 1]
+    values = upper << 3 | lower
+    moving = (1 << ((numbers.sum(axis=1) - 1) % 6)).astype(np.uint8)
+    return values, moving
+
+
+def pair_labels(first: List[str], second: List[str]) -> List[str]:
+    """两列文字组合的结果标签（与卦象键的格式相同），编号为 first下标 * len(second) + second下标"""
+    return [f"{a} {b}" for a in first for b in second]
+
+
+def batch_cast(divination_type: str, count: int, seed: Optional[int] = None, **options) -> Optional[CastBatch]:
+    """批量起卦，不支持的方式返回None；传入相同的种子得到相同的结果，options与 casting.cast 相同"""
+    method = get_method(divination_type)
+    if method is None or method.batch is None:
+        return None
+    batch = method.batch(np.random.default_rng(seed), count, **options)
+    batch.seed = seed
+    return batch
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+起卦模块
+每次占卜只起卦一次，得到结构化的起卦结果 CastResult，
+智能体的提示词、图表、界面展示和解读缓存都使用同一个结果，保证所见即所解。
+各占卜方式的起卦规则见 divination_methods 注册的 method_* 模块
+"""
+
+import random
+from typing import List, Optional, Tuple
+
+from divination_methods import get_method
+from interpretation_cache import format_cast
+
+HEAVENLY_STEMS = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+EARTHLY_BRANCHES = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
+
+YANG_LINE = "———"
+YIN_LINE = "-- --"
+
+
+class CastResult:
+    """一次起卦的结构化结果
+
+    method为占卜方式；symbols为卦名、干支、星曜宫位等文字部分；
+    numbers为梅花易数的起卦数字，或六爻从初爻到上爻的爻值（6老阴、7少阳、8少阴、9老阳）；
+    seed为起卦使用的随机种子，用同一种子可以重现同一卦象（不参与比较）
+    """
+
+    __slots__ = ('method', 'symbols', 'numbers', 'seed')
+
+    def __init__(self, method: str, symbols: Tuple[str, ...] = (), numbers: Tuple[int, ...] = (),
+                 seed: Optional[int] = None):
+        self.method = method
+        self.symbols = tuple(symbols)
+        self.numbers = tuple(numbers)
+        self.seed = seed
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CastResult) and self._fields() == other._fields()
+
+    def __hash__(self) -> int:
+        return hash(self._fields())
+
+    def __repr__(self) -> str:
+        return (f"CastResult({self.method!r}, symbols={self.symbols!r}, numbers={self.numbers!r}, "
+                f"seed={self.seed!r})")
+
+    def _fields(self) -> Tuple:
+        return self.method, self.symbols, self.numbers
+
+    @property
+    def bits(self) -> str:
+        """六爻从初爻到上爻的阴阳，1为阳爻，0为阴爻"""
+        return ''.join('1' if value % 2 else '0' for value in self.numbers)
+
+    @property
+    def yao_lines(self) -> List[str]:
+        """六爻从初爻到上爻的爻线"""
+        return [YANG_LINE if value % 2 else YIN_LINE for value in self.numbers]
+
+    @property
+    def key(self) -> str:
+        """卦象键，用于解读缓存、通用解读和请求合并"""
+        if self.method == "六爻":
+            # 阴阳之后附上动爻位置，动爻不同则变卦不同
+            moving = [i + 1 for i, value in enumerate(self.numbers) if value in (6, 9)]
+            return format_cast([self.bits] + moving)
+        return format_cast(list(self.symbols) + list(self.numbers))
+
+    @property
+    def prompt(self) -> str:
+        """提供给AI模型的占卜结果"""
+        return get_method(self.method).texts(self)[0]
+
+    @property
+    def header(self) -> str:
+        """流式输出中先于AI解读展示的起卦结果"""
+        return get_method(self.method).texts(self)[1]
+
+
+def new_seed() -> int:
+    """生成新的随机种子"""
+    return random.SystemRandom().getrandbits(64)
+
+
+def cast(divination_type: str, seed: Optional[int] = None, **options) -> Optional[CastResult]:
+    """按占卜方式起卦，不支持的方式返回None
+
+    每次起卦使用独立的随机数生成器，不与其他线程共享全局random的状态；
+    seed为None时生成新种子，种子记录在结果中，传入相同的种子得到相同的卦象；
+    options为占卜方式自己的起卦选项，例如六爻的 model（起爻方式）
+    """
+    method = get_method(divination_type)
+    if method is None:
+        return None
+    if seed is None:
+        seed = new_seed()
+    result = method.cast(random.Random(seed), **options)
+    result.seed = seed
+    return result
@@ -9,11 +9,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import random
-from typing import Dict, List, Tuple
+import time
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 import io
 import base64
 from matplotlib.font_manager import FontProperties
 import matplotlib.font_manager as fm
+from casting import CastResult
+from divination_methods import get_method
 
 # 设置中文字体支持
 def set_chinese_font():
@@ -35,6 +41,40 @@ def set_chinese_font():
 font_name = set_chinese_font()
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号'-'显示为方块的问题
 
+# 图表渲染耗时钩子，参数为（图表类型，耗时秒数），用于监控指标
+_render_hooks: List[Callable[[str, float], None]] = []
+
+def add_render_hook(hook: Callable[[str, float], None]):
+    """注册图表渲染耗时钩子"""
+    if hook not in _render_hooks:
+        _render_hooks.append(hook)
+
+def remove_render_hook(hook: Callable[[str, float], None]):
+    """移除图表渲染耗时钩子"""
+    if hook in _render_hooks:
+        _render_hooks.remove(hook)
+
+def _timed(chart_type: str):
+    """统计图表生成耗时（包括失败的情况）并通知钩子"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                for hook in list(_render_hooks):
+                    hook(chart_type, elapsed)
+        return wrapper
+    return decorator
+
+# generate_chart 保留的最近图表数；缓存在模块级别，所有生成器实例共用
+# （Streamlit每次重跑脚本都会新建生成器，例如同一时辰的时间起卦仍只渲染一次）
+RECENT_CHARTS = 64
+_recent_charts: "OrderedDict[CastResult, str]" = OrderedDict()
+_recent_lock = threading.Lock()
+
 class ChartGenerator:
     """图表生成器"""
     
@@ -63,6 +103,7 @@ class ChartGenerator:
         except:
             return 'DejaVu Sans'
     
+    @_timed("six_yao")
     def generate_six_yao_chart(self, yao_lines: List[str]) -> str:
         """生成六爻卦象图"""
         try:
@@ -113,8 +154,9 @@ class ChartGenerator:
             plt.close()
             raise Exception(f"生成六爻卦象图失败: {str(e)}")
     
-    def generate_plum_blossom_chart(self, numbers: List[int]) -> str:
-        """生成梅花易数数字分布图"""
+    @_timed("plum_blossom")
+    def generate_plum_blossom_chart(self, numbers: List[int], labels: Optional[List[str]] = None) -> str:
+        """生成梅花易数数字分布图，labels默认为 Number 1、Number 2……"""
         try:
             # 创建图形 - 进一步减小尺寸
             fig, ax = plt.subplots(figsize=(6, 4))
@@ -125,11 +167,11 @@ class ChartGenerator:
             ax.set_title('Plum Blossom Numbers', fontsize=12, fontweight='bold', pad=10)
             
             # 数据
-            labels = ['Number 1', 'Number 2', 'Number 3']
+            labels = labels or [f'Number {i + 1}' for i in range(len(numbers))]
             values = numbers
             
             # 创建柱状图
-            bars = ax.bar(labels, values, color=['#9b59b6', '#8e44ad', '#3498db'])
+            bars = ax.bar(labels, values, color=['#9b59b6', '#8e44ad', '#3498db', '#2980b9'][:len(values)])
             
             # 在柱子上添加数值标签
             for bar, value in zip(bars, values):
@@ -159,6 +201,7 @@ class ChartGenerator:
             plt.close()
             raise Exception(f"生成梅花易数图表失败: {str(e)}")
     
+    @_timed("heavenly_stems")
     def generate_heavenly_stems_chart(self, stem: str, branch: str) -> str:
         """生成天干地支关系图"""
         try:
@@ -209,6 +252,7 @@ class ChartGenerator:
             plt.close()
             raise Exception(f"生成天干地支图表失败: {str(e)}")
     
+    @_timed("fortune_trend")
     def generate_fortune_trend_chart(self, fortune_data: Dict[str, int]) -> str:
         """生成运势趋势图"""
         try:
@@ -260,6 +304,7 @@ class ChartGenerator:
             plt.close()
             raise Exception(f"生成运势趋势图失败: {str(e)}")
     
+    @_timed("pie")
     def generate_pie_chart(self, data: Dict[str, float], title: str = "分布图") -> str:
         """生成饼图"""
         try:
@@ -301,6 +346,23 @@ class ChartGenerator:
         except Exception as e:
             plt.close()
             raise Exception(f"生成饼图失败: {str(e)}")
+    
+    def generate_chart(self, cast: CastResult) -> Optional[str]:
+        """根据起卦结果生成对应的图表，没有图表的占卜方式返回None，相同的卦象复用最近生成的图表"""
+        method = get_method(cast.method)
+        if method is None or method.chart is None:
+            return None
+        with _recent_lock:
+            chart = _recent_charts.get(cast)
+            if chart is not None:
+                _recent_charts.move_to_end(cast)
+                return chart
+        chart = method.chart(self, cast)
+        with _recent_lock:
+            _recent_charts[cast] = chart
+            if len(_recent_charts) > RECENT_CHARTS:
+                _recent_charts.popitem(last=False)
+        return chart
 
 # 测试代码
 if __name__ == "__main__":
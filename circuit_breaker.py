@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游熔断模块
+ModelScope服务降级时，每次占卜都要等到超时才失败。连续失败达到阈值或
+首token延迟持续超出SLO时熔断器打开，期间直接使用本地模板解读；
+冷却结束后在后台发起探测请求，探测成功再恢复调用AI模型
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """连续失败 + 慢调用比例双触发的熔断器"""
+
+    def __init__(self, failure_threshold: int = 5, latency_slo: float = 15.0, window: int = 20,
+                 min_calls: int = 10, slow_call_ratio: float = 0.5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """failure_threshold为连续失败次数阈值；最近window次调用中至少min_calls次、
+        且首token延迟超过latency_slo秒的比例达到slow_call_ratio时同样熔断；
+        打开reset_timeout秒后进入半开状态进行探测
+        """
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.min_calls = min_calls
+        self.slow_call_ratio = slow_call_ratio
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._slow: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self, probe: Optional[Callable[[], None]] = None) -> bool:
+        """是否可以调用上游
+
+        熔断打开且冷却结束后：提供了probe时在后台线程中探测，本次仍返回False；
+        否则进入半开状态并放行一个试探请求
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = self._clock()
+            # 冷却结束（或上一次试探迟迟没有结果）后重新试探
+            if not self._probing and now - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._opened_at = now
+                if probe is None:
+                    return True
+                self._probing = True
+                threading.Thread(target=self._run_probe, args=(probe,), daemon=True).start()
+            self.rejected += 1
+            return False
+
+    def _run_probe(self, probe: Callable[[], None]) -> None:
+        started = self._clock()
+        error = None
+        try:
+            probe()
+        except Exception as e:
+            error = e
+        # 先结束探测标记再更新状态，状态变化后的下一次allow即可再次探测
+        with self._lock:
+            self._probing = False
+        if error is None:
+            self.record_success(self._clock() - started)
+        else:
+            logger.info("熔断探测失败：%s", error)
+            self.record_failure()
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """记录一次成功调用，latency为首token延迟（秒），未知时传None"""
+        slow = latency is not None and latency > self.latency_slo
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if slow:
+                    self._open()
+                else:
+                    self._close()
+                return
+            self._failures = 0
+            self._slow.append(slow)
+            if self._state == CLOSED and self._too_slow():
+                logger.warning("首token延迟持续超过%.1f秒，熔断器打开", self.latency_slo)
+                self._open()
+
+    def record_failure(self) -> None:
+        """记录一次失败调用"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._failures += 1
+            if self._state == CLOSED and self._failures >= self.failure_threshold:
+                logger.warning("AI模型连续失败%d次，熔断器打开", self._failures)
+                self._open()
+
+    def _too_slow(self) -> bool:
+        """慢调用比例是否超出阈值（调用方需持有锁）"""
+        return len(self._slow) >= self.min_calls and sum(self._slow) / len(self._slow) >= self.slow_call_ratio
+
+    def _open(self) -> None:
+        """打开熔断器（调用方需持有锁）"""
+        if self._state == CLOSED:
+            self.opened += 1
+        self._state = OPEN
+        self._opened_at = self._clock()
+
+    def _close(self) -> None:
+        """关闭熔断器并清空统计（调用方需持有锁）"""
+        self._state = CLOSED
+        self._failures = 0
+        self._slow.clear()
+
+    def stats(self) -> Dict[str, object]:
+        """当前熔断状态"""
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ModelScope客户端连接池模块
+Streamlit每次重跑脚本都会新建DivinationAgent，这里按（API密钥，base_url）
+在进程内复用OpenAI客户端，并让它们共享同一个调优过的httpx连接池，
+避免每次占卜都重新建立TCP/TLS连接。
+SDK自带的重试被关闭，统一由 retry.RetryPolicy 控制
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+# 最多保留的客户端数量（不同API密钥）
+MAX_CLIENTS = 32
+
+# 连接池参数：保持长连接，限制到上游的并发连接数
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120.0)
+
+# 流式输出可能持续数十秒，读取超时放宽，连接超时收紧
+POOL_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+def _http2_available() -> bool:
+    """HTTP/2需要安装h2，未安装时退回HTTP/1.1长连接"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+# 正在关闭的异步客户端任务，保留引用以免被垃圾回收
+_closing: Set[asyncio.Future] = set()
+
+
+def _close_async(client: AsyncOpenAI, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """关闭被淘汰的异步客户端：在创建它的事件循环上调度 close()，
+    该循环已不在运行时改在当前循环或新循环中关闭"""
+    if loop is not None and loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(client.close(), loop)
+    elif _running_loop() is not None:
+        future = asyncio.ensure_future(client.close())
+    else:
+        try:
+            asyncio.run(client.close())
+        except Exception:
+            # 连接绑定的事件循环已经关闭，只能交给垃圾回收
+            pass
+        return
+    _closing.add(future)
+    future.add_done_callback(_closing.discard)
+
+
+class ClientPool:
+    """按（API密钥，base_url）缓存OpenAI客户端，超出容量时淘汰最久未使用的"""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients: 'OrderedDict[Tuple[str, str], OpenAI]' = OrderedDict()
+        # 异步客户端与创建它时所在的事件循环（不在事件循环中创建时为None）
+        self._async_clients: 'OrderedDict[Tuple[str, str], Tuple[AsyncOpenAI, Optional[asyncio.AbstractEventLoop]]]' = \
+            OrderedDict()
+        self._http_client = None
+        self.http2 = _http2_available()
+
+    def _shared_http_client(self) -> httpx.Client:
+        """所有同步客户端共享的httpx连接池（调用方需持有锁）"""
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=POOL_LIMITS, timeout=POOL_TIMEOUT, http2=self.http2)
+        return self._http_client
+
+    def _touch(self, clients: OrderedDict, key: Tuple[str, str], factory) -> Tuple[object, List]:
+        """读取或创建客户端并维护LRU顺序，返回（客户端，被淘汰的条目）（调用方需持有锁）"""
+        evicted = []
+        client = clients.get(key)
+        if client is None:
+            client = factory()
+            clients[key] = client
+            while len(clients) > self.max_clients:
+                evicted.append(clients.popitem(last=False)[1])
+        else:
+            clients.move_to_end(key)
+        return client, evicted
+
+    def get(self, api_key: str, base_url: str) -> OpenAI:
+        """获取同步客户端，被淘汰的客户端共用连接池，无需关闭"""
+        with self._lock:
+            client, _ = self._touch(self._clients, (api_key, base_url), lambda: OpenAI(
+                api_key=api_key, base_url=base_url, http_client=self._shared_http_client(), max_retries=0))
+        return client
+
+    def get_async(self, api_key: str, base_url: str) -> AsyncOpenAI:
+        """获取异步客户端
+
+        httpx.AsyncClient的连接绑定在创建它的事件循环上，因此异步客户端各自持有
+        连接池，只在同一个长期运行的事件循环中复用；被淘汰时关闭其连接池，
+        因此调用方应在每次请求时重新获取，而不是长期持有
+        """
+        with self._lock:
+            (client, _), evicted = self._touch(self._async_clients, (api_key, base_url), lambda: (AsyncOpenAI(
+                api_key=api_key, base_url=base_url, max_retries=0,
+                http_client=httpx.AsyncClient(limits=POOL_LIMITS, timeout=POOL_TIMEOUT, http2=self.http2)),
+                _running_loop()))
+        for old_client, loop in evicted:
+            _close_async(old_client, loop)
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def close(self) -> None:
+        """关闭共享连接池和各异步客户端的连接池，并清空客户端"""
+        with self._lock:
+            self._clients.clear()
+            async_clients = list(self._async_clients.values())
+            self._async_clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+        for client, loop in async_clients:
+            _close_async(client, loop)
+
+
+# 进程内共享的客户端池
+default_pool = ClientPool()
+
+
+def get_client(api_key: str, base_url: str) -> OpenAI:
+    """从进程共享的池中获取同步客户端"""
+    return default_pool.get(api_key, base_url)
+
+
+def get_async_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """从进程共享的池中获取异步客户端"""
+    return default_pool.get_async(api_key, base_url)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试共用的模拟OpenAI客户端
+各测试脚本直接 from conftest import ...，单独运行脚本和在pytest下运行都可用
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Callable, Iterable, Optional, Union
+
+from divination_agent import DivinationAgent
+
+# 模拟的输出片段，或根据请求参数生成片段的函数
+Pieces = Union[Iterable[str], Callable[[dict], Iterable[str]]]
+
+
+def chunk(content: str) -> SimpleNamespace:
+    """流式响应中的一段"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def completion(content: str) -> SimpleNamespace:
+    """非流式响应"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def fake_client(completions) -> SimpleNamespace:
+    """把模拟的 chat.completions 接口包装成客户端"""
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+class FakeCompletions:
+    """模拟同步 chat.completions 接口：逐段返回pieces（每段前等待delay秒），记录请求参数"""
+
+    def __init__(self, pieces: Pieces = ("解",), delay: float = 0.0, error: Optional[Exception] = None):
+        self.pieces = pieces
+        self.delay = delay
+        self.error = error
+        self.requests = []
+
+    @property
+    def calls(self) -> int:
+        return len(self.requests)
+
+    def _pieces(self, kwargs) -> list:
+        return list(self.pieces(kwargs) if callable(self.pieces) else self.pieces)
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        pieces = self._pieces(kwargs)
+        if not kwargs.get("stream"):
+            return completion("".join(pieces))
+
+        def chunks():
+            for piece in pieces:
+                if self.delay:
+                    time.sleep(self.delay)
+                yield chunk(piece)
+        return chunks()
+
+
+class FakeAsyncStream:
+    """模拟异步流式响应"""
+
+    def __init__(self, pieces, delay: float):
+        self.pieces = list(pieces)
+        self.delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        return chunk(self.pieces.pop(0))
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    """模拟异步 chat.completions 接口，另外记录同时进行的最大请求数"""
+
+    def __init__(self, pieces: Pieces = ("解",), delay: float = 0.01, error: Optional[Exception] = None):
+        super().__init__(pieces, delay, error)
+        self.active = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        pieces = self._pieces(kwargs)
+        if kwargs.get("stream"):
+            return FakeAsyncStream(pieces, self.delay)
+
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return completion("".join(pieces))
+
+
+def make_agent(pieces: Pieces = ("解",), delay: float = 0.0, cast=None, **kwargs) -> DivinationAgent:
+    """创建使用模拟客户端的智能体，kwargs传给DivinationAgent；传入cast时每次起卦都返回它
+
+    同步、异步接口分别为 agent.client.chat.completions 和 agent.async_client.chat.completions
+    """
+    kwargs.setdefault("api_key", "test_key")
+    agent = DivinationAgent(**kwargs)
+    agent.client = fake_client(FakeCompletions(pieces, delay))
+    agent.async_client = fake_client(FakeAsyncCompletions(pieces))
+    if cast is not None:
+        agent.cast = lambda divination_type, *args, **options: cast
+    return agent
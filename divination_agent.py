@@ -1,33 +1,118 @@
-import random
-from typing import List, Tuple, Optional
-from openai import OpenAI
+import logging
+import time
+from typing import List, Tuple, Optional, Dict
 import os
+from contextlib import nullcontext
+from openai import AsyncOpenAI
+from interpretation_cache import InterpretationCache, normalize_question
+from base_interpretations import BaseInterpretationStore, base_key
+from single_flight import StreamCoalescer, AsyncStreamCoalescer
+from client_pool import get_client, get_async_client
+from hedging import HedgePolicy, hedged_stream
+from errors import UpstreamError, classify_error
+from retry import RetryPolicy
+from rate_limiter import UpstreamLimiter, QueueCallback, Slot
+from circuit_breaker import CircuitBreaker
+from local_interpretation import LOCAL_NOTICE, local_interpretation
+from timing import Trace, NULL_TRACE
+import casting
+from casting import CastResult
+from divination_methods import get_method
+
+logger = logging.getLogger(__name__)
+
+# ModelScope的OpenAI兼容接口地址
+DEFAULT_BASE_URL = 'https://api-inference.modelscope.cn/v1'
+
+# 缓存命中时每次回放的字符数
+REPLAY_CHUNK_SIZE = 16
+
+# 已有通用解读时，只请求针对问题部分的最大token数
+QUESTION_MAX_TOKENS = 600
+
+# 通用解读与针对问题的解读之间的分隔标题
+QUESTION_SECTION = "\n\n【针对您的问题】\n"
+
+# 进程内所有智能体共享的请求合并器
+_stream_coalescer = StreamCoalescer()
+_async_stream_coalescer = AsyncStreamCoalescer()
+
+# 系统提示词，同步与异步调用共用
+SYSTEM_PROMPT = '你是一个专业的占卜师，精通各种占卜方法，能够为用户提供深入的占卜解读和实用建议。请确保回答完整，不要截断内容。'
 
 class DivinationAgent:
     """占卜智能体，支持多种占卜方法"""
-    
-    def __init__(self, api_key: Optional[str] = None):
-        """初始化占卜智能体"""
+
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[InterpretationCache] = None,
+                 base_store: Optional[BaseInterpretationStore] = None, coalesce: bool = True,
+                 base_url: Optional[str] = None, hedge: Optional[HedgePolicy] = None,
+                 retry_policy: Optional[RetryPolicy] = None, limiter: Optional[UpstreamLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        """初始化占卜智能体
+
+        cache为解读缓存，base_store为预生成的通用解读，coalesce控制是否合并相同请求，
+        hedge为对冲策略，首token超时未到时补发请求，retry_policy为上游错误的重试策略，
+        limiter为进程内共享的上游限流器，circuit_breaker为上游熔断器，打开时直接使用本地解读
+        """
         # 如果没有提供API密钥，则从环境变量获取
         if api_key is None:
             api_key = os.getenv('MODELSCOPE_API_KEY',"ms-df56303c-e814-48da-a195-3dc2487c3b33")
-        
-        # 安全地初始化ModelScope客户端，避免传递不支持的参数
-        client_kwargs = {
-            'base_url': 'https://api-inference.modelscope.cn/v1',
-            'api_key': api_key
-        }
-        
-        # 只传递支持的参数
-        self.client = OpenAI(**client_kwargs)
-        
+
+        if base_url is None:
+            base_url = os.getenv('MODELSCOPE_BASE_URL', DEFAULT_BASE_URL)
+
+        # 从进程共享的连接池获取ModelScope客户端，复用已建立的连接
+        self.api_key = api_key
+        self.base_url = base_url
+        self.client = get_client(api_key, base_url)
+
+        # 异步客户端，多个占卜请求可以在同一个事件循环中并发等待；
+        # 不在这里持有，每次调用时从连接池取得，见 async_client
+        self._async_client = None
+
         # 使用的模型
         self.model = 'Qwen/Qwen3-235B-A22B-Instruct-2507'
-    
-    def _get_ai_interpretation(self, divination_type: str, question: str, result: str) -> str:
-        """使用AI模型对占卜结果进行解释"""
-        try:
-            prompt = f"""
+
+        # 解读缓存（可选）
+        self.cache = cache
+
+        # 预生成的通用解读（可选），由 base_interpretations.py 离线生成
+        self.base_store = base_store
+
+        # 相同请求合并器，在进程内所有智能体之间共享
+        self.coalescer = _stream_coalescer if coalesce else None
+        self.async_coalescer = _async_stream_coalescer if coalesce else None
+
+        # 对冲策略（可选），应在多个智能体之间共享以积累延迟分布
+        self.hedge = hedge
+
+        # 重试策略：429/5xx/网络错误退避重试，401/403立即失败
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        # 上游限流器（可选），应在多个智能体之间共享，超出限额的请求按会话公平排队
+        self.limiter = limiter
+
+        # 上游熔断器（可选），应在多个智能体之间共享
+        self.circuit_breaker = circuit_breaker
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """异步客户端，每次从进程共享的连接池中取得
+
+        池满时最久未使用的异步客户端会被淘汰并关闭，持有旧的引用会在关闭的连接上请求失败
+        """
+        if self._async_client is not None:
+            return self._async_client
+        return get_async_client(self.api_key, self.base_url)
+
+    @async_client.setter
+    def async_client(self, client: AsyncOpenAI) -> None:
+        """指定固定使用的异步客户端（例如测试中的模拟客户端）"""
+        self._async_client = client
+
+    def _build_messages(self, divination_type: str, question: str, result: str) -> List[Dict[str, str]]:
+        """构建发送给AI模型的对话消息"""
+        prompt = f"""
 你是一个专业的占卜师，精通各种占卜方法。请根据以下占卜结果，为用户的问题提供专业解读。
 
 占卜方式: {divination_type}
@@ -41,351 +126,570 @@ class DivinationAgent:
 
 请用中文回答，语言要通俗易懂，富有智慧。请确保回答完整，不要截断内容。
 """
+        return [
+            {
+                'role': 'system',
+                'content': SYSTEM_PROMPT
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ]
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的占卜师，精通各种占卜方法，能够为用户提供深入的占卜解读和实用建议。请确保回答完整，不要截断内容。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                stream=False,
-                temperature=0.7,
-                max_tokens=1500  # 增加最大token数以确保完整响应
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            # 如果AI解释失败，返回默认解释
-            return f"AI解读暂时不可用，使用默认解释：{result}"
-    
-    def _get_ai_interpretation_stream(self, divination_type: str, question: str, result: str):
-        """使用AI模型对占卜结果进行解释（流式输出）"""
-        try:
-            prompt = f"""
+    def _build_question_messages(self, divination_type: str, question: str, result: str,
+                                 base: str) -> List[Dict[str, str]]:
+        """构建只针对用户问题的对话消息，通用解读已预先生成"""
+        prompt = f"""
 你是一个专业的占卜师，精通各种占卜方法。请根据以下占卜结果，为用户的问题提供专业解读。
 
 占卜方式: {divination_type}
 用户问题: {question}
 占卜结果: {result}
 
-请提供：
-1. 详细的卦象/结果解析
-2. 对用户问题的具体回答
-3. 实用的建议和指导
+用户已经看到了这个卦象的通用解读，请不要重复：
+{base}
 
-请用中文回答，语言要通俗易懂，富有智慧。请确保回答完整，不要截断内容。
+请只提供：
+1. 对用户问题的具体回答
+2. 实用的建议和指导
+
+请用中文回答，语言要通俗易懂，富有智慧，篇幅简洁。
 """
+        return [
+            {
+                'role': 'system',
+                'content': SYSTEM_PROMPT
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ]
+
+    def _request_kwargs(self, divination_type: str, question: str, result: str,
+                        base: Optional[str], stream: bool) -> Dict:
+        """生成 chat.completions.create 的参数，有通用解读时只请求针对问题的部分"""
+        if base is None:
+            messages = self._build_messages(divination_type, question, result)
+            max_tokens = 1500  # 增加最大token数以确保完整响应
+        else:
+            messages = self._build_question_messages(divination_type, question, result, base)
+            max_tokens = QUESTION_MAX_TOKENS
+        return {
+            'model': self.model,
+            'messages': messages,
+            'stream': stream,
+            'temperature': 0.7,
+            'max_tokens': max_tokens
+        }
+
+    def _get_ai_interpretation(self, divination_type: str, question: str, result: str,
+                               cast: Optional[str] = None) -> str:
+        """使用AI模型对占卜结果进行解释，cast为卦象键，用于读写缓存"""
+        base = self._get_base(divination_type, cast)
+        content = self._get_cached(divination_type, question, cast, base)
+        if content is None:
+            if not self._breaker_allows():
+                # 熔断打开时不再等待上游超时，直接使用本地解读
+                return self._compose(base, LOCAL_NOTICE + local_interpretation(divination_type, cast, question, result))
+            try:
+                with self._upstream_slot():
+                    response = self.retry_policy.call(lambda: self.client.chat.completions.create(
+                        **self._request_kwargs(divination_type, question, result, base, stream=False)))
+
+                content = response.choices[0].message.content
+                self._record_upstream(None)
+                self._set_cached(divination_type, question, cast, base, content)
+            except UpstreamError as e:
+                # 如果AI解释失败，记录原因并返回本地解读
+                self._record_upstream(None, e)
+                logger.warning("AI解读失败（%s）：%s", type(e).__name__, e)
+                return self._local_after_error(divination_type, question, result, cast, base, e)
+        return self._compose(base, content)
+
+    def _get_ai_interpretation_stream(self, divination_type: str, question: str, result: str,
+                                      base: Optional[str] = None, trace=NULL_TRACE):
+        """使用AI模型对占卜结果进行解释（流式输出）"""
+        try:
+            with trace.span("prompt"):
+                kwargs = self._request_kwargs(divination_type, question, result, base, stream=True)
+            with trace.span("connect"):
+                response = self.client.chat.completions.create(**kwargs)  # 启用流式输出
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的占卜师，精通各种占卜方法，能够为用户提供深入的占卜解读和实用建议。请确保回答完整，不要截断内容。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                stream=True,  # 启用流式输出
-                temperature=0.7,
-                max_tokens=1500
-            )
-            
             return response
         except Exception as e:
-            # 检查具体错误类型
-            error_message = str(e)
-            if "401" in error_message or "Unauthorized" in error_message:
-                raise Exception("API密钥无效或已过期，请检查您的ModelScope API密钥")
-            elif "403" in error_message or "Forbidden" in error_message:
-                raise Exception("API密钥权限不足，请检查您的ModelScope API密钥权限")
-            elif "429" in error_message or "rate limit" in error_message.lower():
-                raise Exception("API请求频率过高，请稍后重试")
-            elif "timeout" in error_message.lower():
-                raise Exception("API请求超时，请检查网络连接")
-            else:
-                # 重新抛出具体错误
-                raise Exception(f"AI解读失败：{error_message}")
-    
-    def plum_blossom_divination(self, question: str) -> str:
-        """梅花易数占卜"""
-        # 模拟梅花易数计算过程
-        numbers = [random.randint(1, 8) for _ in range(3)]
-        hexagram = self._generate_hexagram(numbers)
-        
-        result = f"""
-梅花易数占卜结果：
-
-卦象：{hexagram}
-数字：{numbers[0]}, {numbers[1]}, {numbers[2]}
-"""
+            # 转换为类型化的错误，由重试策略决定是否重试
+            raise classify_error(e) from e
 
-        # 使用AI进行解释
-        ai_interpretation = self._get_ai_interpretation("梅花易数", question, result)
-        return f"{result}\nAI解读：\n{ai_interpretation}"
-    
-    def plum_blossom_divination_stream(self, question: str):
-        """梅花易数占卜（流式输出）"""
-        # 模拟梅花易数计算过程
-        numbers = [random.randint(1, 8) for _ in range(3)]
-        hexagram = self._generate_hexagram(numbers)
-        
-        result = f"""
-梅花易数占卜结果：
-
-卦象：{hexagram}
-数字：{numbers[0]}, {numbers[1]}, {numbers[2]}
-"""
+    async def _get_ai_interpretation_async(self, divination_type: str, question: str, result: str,
+                                           cast: Optional[str] = None) -> str:
+        """使用AI模型对占卜结果进行解释（异步）"""
+        base = self._get_base(divination_type, cast)
+        content = self._get_cached(divination_type, question, cast, base)
+        if content is None:
+            if not self._breaker_allows():
+                return self._compose(base, LOCAL_NOTICE + local_interpretation(divination_type, cast, question, result))
+            try:
+                slot = await self._acquire_slot_async()
+                try:
+                    response = await self.retry_policy.call_async(lambda: self.async_client.chat.completions.create(
+                        **self._request_kwargs(divination_type, question, result, base, stream=False)))
+                finally:
+                    if slot is not None:
+                        slot.release()
 
-        # 使用AI进行解释（流式输出）
-        yield f"占卜结果：{hexagram}\n数字：{numbers[0]}, {numbers[1]}, {numbers[2]}\n\n"
-        yield "AI解读：\n"
-        
+                content = response.choices[0].message.content
+                self._record_upstream(None)
+                self._set_cached(divination_type, question, cast, base, content)
+            except UpstreamError as e:
+                # 如果AI解释失败，记录原因并返回本地解读
+                self._record_upstream(None, e)
+                logger.warning("AI解读失败（%s）：%s", type(e).__name__, e)
+                return self._local_after_error(divination_type, question, result, cast, base, e)
+        return self._compose(base, content)
+
+    async def _get_ai_interpretation_stream_async(self, divination_type: str, question: str, result: str,
+                                                  base: Optional[str] = None, trace=NULL_TRACE):
+        """使用AI模型对占卜结果进行解释（异步流式输出）"""
         try:
-            stream_response = self._get_ai_interpretation_stream("梅花易数", question, result)
-            # 检查是否是字符串（错误情况）
-            if isinstance(stream_response, str):
-                yield stream_response
-            else:
-                # 处理流式响应
-                for chunk in stream_response:
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
+            with trace.span("prompt"):
+                kwargs = self._request_kwargs(divination_type, question, result, base, stream=True)
+            with trace.span("connect"):
+                response = await self.async_client.chat.completions.create(**kwargs)
+
+            return response
         except Exception as e:
-            yield f"\nAI解读失败：{str(e)}"
-            # 重新抛出异常以供上层处理
+            raise classify_error(e) from e
+
+    def _breaker_allows(self) -> bool:
+        """熔断器是否允许调用上游，冷却结束后在后台探测"""
+        return self.circuit_breaker is None or self.circuit_breaker.allow(self._probe_upstream)
+
+    def _probe_upstream(self) -> None:
+        """熔断半开时的探测请求，只生成一个token"""
+        self.client.chat.completions.create(
+            model=self.model,
+            messages=[{'role': 'user', 'content': '你好'}],
+            stream=False,
+            max_tokens=1
+        )
+
+    def _record_upstream(self, latency: Optional[float], error: Optional[UpstreamError] = None) -> None:
+        """向熔断器报告一次上游调用结果，latency为首token延迟
+
+        401/403等调用方自身的错误不代表上游降级，不计入熔断
+        """
+        if self.circuit_breaker is None:
+            return
+        if error is None:
+            self.circuit_breaker.record_success(latency)
+        elif error.retryable:
+            self.circuit_breaker.record_failure()
+
+    def _local_after_error(self, divination_type: str, question: str, result: str, cast: Optional[str],
+                           base: Optional[str], error: UpstreamError) -> str:
+        """AI调用失败后的本地解读，附带失败原因"""
+        local = local_interpretation(divination_type, cast, question, result)
+        return self._compose(base, f"AI解读暂时不可用（{error}），以下为本地解读：\n\n{local}")
+
+    def _upstream_slot(self, session_id: Optional[str] = None, on_queue: Optional[QueueCallback] = None):
+        """在限流器中排队获取上游槽位，未配置限流器时不限制"""
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.acquire(session_id, on_queue)
+
+    async def _acquire_slot_async(self, session_id: Optional[str] = None,
+                                  on_queue: Optional[QueueCallback] = None) -> Optional[Slot]:
+        """_upstream_slot 的异步版本，未配置限流器时返回None"""
+        if self.limiter is None:
+            return None
+        return await self.limiter.acquire_async(session_id, on_queue)
+
+    @staticmethod
+    def _hold_slot(slot: Slot, texts):
+        """文本流结束或出错后释放上游槽位"""
+        try:
+            yield from texts
+        finally:
+            slot.release()
+
+    @staticmethod
+    async def _hold_slot_async(slot: Slot, texts):
+        """_hold_slot 的异步版本"""
+        try:
+            async for text in texts:
+                yield text
+        finally:
+            slot.release()
+
+    def _get_base(self, divination_type: str, cast: Optional[str]) -> Optional[str]:
+        """读取预生成的通用解读"""
+        if self.base_store is None or cast is None:
+            return None
+        return self.base_store.get(divination_type, base_key(divination_type, cast))
+
+    def _compose(self, base: Optional[str], content: str) -> str:
+        """拼接通用解读与针对问题的解读"""
+        if base is None:
+            return content
+        return f"{base}{QUESTION_SECTION}{content}"
+
+    def _cache_method(self, divination_type: str, base: Optional[str]) -> str:
+        """有通用解读时缓存的只是针对问题的部分，使用不同的缓存命名空间"""
+        return divination_type if base is None else f"{divination_type}:问题"
+
+    def _get_cached(self, divination_type: str, question: str, cast: Optional[str],
+                    base: Optional[str] = None) -> Optional[str]:
+        """读取缓存的解读"""
+        if self.cache is None or cast is None:
+            return None
+        return self.cache.get(self._cache_method(divination_type, base), cast, question)
+
+    def _set_cached(self, divination_type: str, question: str, cast: Optional[str],
+                    base: Optional[str], content: str) -> None:
+        """写入解读缓存，空内容不缓存"""
+        if self.cache is None or cast is None or not content:
+            return
+        self.cache.set(self._cache_method(divination_type, base), cast, question, content)
+
+    def _replay(self, content: str):
+        """按固定长度分段回放缓存的解读"""
+        for i in range(0, len(content), REPLAY_CHUNK_SIZE):
+            yield content[i:i + REPLAY_CHUNK_SIZE]
+
+    def _stream_interpretation(self, divination_type: str, question: str, result: str,
+                               cast: Optional[str] = None, session_id: Optional[str] = None,
+                               on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """逐段产出AI解读文本，先输出通用解读，命中缓存时直接回放
+
+        需要请求上游时先在限流器中排队，排队期间用（位置，预计等待秒数）调用on_queue
+        """
+        with trace.span("cache"):
+            base = self._get_base(divination_type, cast)
+        if base is not None:
+            yield from self._replay(base)
+            yield QUESTION_SECTION
+
+        with trace.span("cache"):
+            cached = self._get_cached(divination_type, question, cast, base)
+        if cached is not None:
+            trace.set(source="cache")
+            yield from self._replay(cached)
+            return
+
+        if not self._breaker_allows():
+            # 熔断打开时不再排队等待上游，立即输出本地解读
+            trace.set(source="local")
+            yield from self._replay(LOCAL_NOTICE + local_interpretation(divination_type, cast, question, result))
+            return
+
+        upstream = lambda: self._upstream_interpretation(divination_type, question, result, cast, base, trace)
+        trace.set(source="upstream")
+        if self.coalescer is None:
+            with trace.span("queue"):
+                slot = self._upstream_slot(session_id, on_queue)
+            with slot:
+                yield from upstream()
+            return
+
+        # 相同请求同时在途时只向上游发起一次生成，合并的调用方不占用上游槽位
+        key = self._flight_key(divination_type, question, result, cast, base)
+        if self.limiter is None or self.coalescer.is_inflight(key):
+            yield from self.coalescer.stream(key, upstream, on_join=lambda: trace.set(source="coalesced"))
+            return
+
+        # 在调用方线程中排队，on_queue才能直接刷新界面；排队期间别人发起了相同请求时归还槽位
+        with trace.span("queue"):
+            slot = self.limiter.acquire(session_id, on_queue)
+        def joined():
+            slot.release()
+            trace.set(source="coalesced")
+
+        yield from self.coalescer.stream(key, lambda: self._hold_slot(slot, upstream()), on_join=joined)
+
+    def _upstream_interpretation(self, divination_type: str, question: str, result: str,
+                                 cast: Optional[str], base: Optional[str], trace=NULL_TRACE):
+        """向AI模型发起流式请求并逐段产出文本，完整结束后写入缓存"""
+        def open_texts():
+            open_stream = lambda: self._get_ai_interpretation_stream(divination_type, question, result, base, trace)
+            if self.hedge is not None:
+                # 首个token超时未到时补发请求，取先到者
+                return hedged_stream(open_stream, self._chunk_text, self.hedge)
+            return (text for text in map(self._chunk_text, open_stream()) if text)
+
+        # 首个token产出前遇到可重试的错误会自动退避重试
+        started = time.monotonic()
+        texts = self.retry_policy.stream(open_texts)
+
+        # 处理流式响应，完整结束后才写入缓存
+        pieces = []
+        try:
+            for text in texts:
+                if not pieces:
+                    ttft = time.monotonic() - started
+                    self._record_upstream(ttft)
+                    trace.add("llm_ttft", ttft)
+                pieces.append(text)
+                yield text
+        except UpstreamError as e:
+            self._record_upstream(None, e)
             raise
-    
-    def heavenly_stems_earthly_branches(self, question: str) -> str:
-        """天干地支占卜"""
-        heavenly_stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-        earthly_branches = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-        
-        stem = random.choice(heavenly_stems)
-        branch = random.choice(earthly_branches)
-        
-        result = f"""
-天干地支占卜结果：
-
-天干：{stem}
-地支：{branch}
-干支组合：{stem}{branch}
-"""
+        finally:
+            trace.add("llm_total", time.monotonic() - started)
+            trace.set(chunks=len(pieces))
+        self._set_cached(divination_type, question, cast, base, ''.join(pieces))
 
-        # 使用AI进行解释
-        ai_interpretation = self._get_ai_interpretation("天干地支", question, result)
-        return f"{result}\nAI解读：\n{ai_interpretation}"
-    
-    def heavenly_stems_earthly_branches_stream(self, question: str):
-        """天干地支占卜（流式输出）"""
-        heavenly_stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-        earthly_branches = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-        
-        stem = random.choice(heavenly_stems)
-        branch = random.choice(earthly_branches)
-        
-        result = f"""
-天干地支占卜结果：
-
-天干：{stem}
-地支：{branch}
-干支组合：{stem}{branch}
-"""
+    @staticmethod
+    def _chunk_text(chunk) -> Optional[str]:
+        """取出流式响应块中的文本"""
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+        return None
 
-        # 使用AI进行解释（流式输出）
-        yield f"天干：{stem}\n地支：{branch}\n干支组合：{stem}{branch}\n\n"
+    def _flight_key(self, divination_type: str, question: str, result: str,
+                    cast: Optional[str], base: Optional[str]) -> Tuple:
+        """请求合并的键，不同API密钥之间不合并"""
+        return (self.api_key, self.model, self._cache_method(divination_type, base),
+                cast if cast is not None else result, normalize_question(question))
+
+    async def _stream_interpretation_async(self, divination_type: str, question: str, result: str,
+                                           cast: Optional[str] = None, session_id: Optional[str] = None,
+                                           on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """逐段产出AI解读文本（异步），先输出通用解读，命中缓存时直接回放"""
+        with trace.span("cache"):
+            base = self._get_base(divination_type, cast)
+        if base is not None:
+            for text in self._replay(base):
+                yield text
+            yield QUESTION_SECTION
+
+        with trace.span("cache"):
+            cached = self._get_cached(divination_type, question, cast, base)
+        if cached is not None:
+            trace.set(source="cache")
+            for text in self._replay(cached):
+                yield text
+            return
+
+        if not self._breaker_allows():
+            trace.set(source="local")
+            for text in self._replay(LOCAL_NOTICE + local_interpretation(divination_type, cast, question, result)):
+                yield text
+            return
+
+        upstream = lambda: self._upstream_interpretation_async(divination_type, question, result, cast, base, trace)
+        trace.set(source="upstream")
+        key = self._flight_key(divination_type, question, result, cast, base)
+        if self.limiter is None or (self.async_coalescer is not None and self.async_coalescer.is_inflight(key)):
+            slot = None
+        else:
+            with trace.span("queue"):
+                slot = await self.limiter.acquire_async(session_id, on_queue)
+
+        def joined():
+            if slot is not None:
+                slot.release()
+            trace.set(source="coalesced")
+
+        if self.async_coalescer is None:
+            stream = upstream() if slot is None else self._hold_slot_async(slot, upstream())
+        elif slot is None:
+            # 相同请求同时在途时只向上游发起一次生成
+            stream = self.async_coalescer.stream(key, upstream, on_join=joined)
+        else:
+            stream = self.async_coalescer.stream(key, lambda: self._hold_slot_async(slot, upstream()),
+                                                 on_join=joined)
+        async for text in stream:
+            yield text
+
+    async def _upstream_interpretation_async(self, divination_type: str, question: str, result: str,
+                                             cast: Optional[str], base: Optional[str], trace=NULL_TRACE):
+        """向AI模型发起异步流式请求并逐段产出文本，完整结束后写入缓存"""
+        async def open_texts():
+            stream_response = await self._get_ai_interpretation_stream_async(divination_type, question, result,
+                                                                             base, trace)
+            async for chunk in stream_response:
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+
+        # 首个token产出前遇到可重试的错误会自动退避重试
+        started = time.monotonic()
+        pieces = []
+        try:
+            async for text in self.retry_policy.stream_async(open_texts):
+                if not pieces:
+                    ttft = time.monotonic() - started
+                    self._record_upstream(ttft)
+                    trace.add("llm_ttft", ttft)
+                pieces.append(text)
+                yield text
+        except UpstreamError as e:
+            self._record_upstream(None, e)
+            raise
+        finally:
+            trace.add("llm_total", time.monotonic() - started)
+            trace.set(chunks=len(pieces))
+        self._set_cached(divination_type, question, cast, base, ''.join(pieces))
+
+    def _stream_with_header(self, cast: CastResult, question: str, session_id: Optional[str] = None,
+                            on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """先输出起卦结果，再流式输出AI解读"""
+        # 记录随机种子，便于按日志重现卦象
+        trace.set(seed=cast.seed)
+        yield cast.header
         yield "AI解读：\n"
-        
+
         try:
-            stream_response = self._get_ai_interpretation_stream("天干地支", question, result)
-            # 检查是否是字符串（错误情况）
-            if isinstance(stream_response, str):
-                yield stream_response
-            else:
-                # 处理流式响应
-                for chunk in stream_response:
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
+            for text in self._stream_interpretation(cast.method, question, cast.prompt, cast.key, session_id,
+                                                    on_queue, trace):
+                trace.mark("first_token")
+                yield text
+            trace.mark("last_token")
         except Exception as e:
+            trace.set(error=type(e).__name__)
             yield f"\nAI解读失败：{str(e)}"
             # 重新抛出异常以供上层处理
             raise
-    
+
+    def cast(self, divination_type: str, seed: Optional[int] = None, **options) -> Optional[CastResult]:
+        """按占卜方式起卦，不支持的方式返回None；传入seed可重现之前的卦象，options见 casting.cast"""
+        return casting.cast(divination_type, seed, **options)
+
+    def _divination(self, divination_type: str, question: str) -> str:
+        """起卦并获取完整的AI解读"""
+        cast = self.cast(divination_type)
+
+        # 使用AI进行解释
+        ai_interpretation = self._get_ai_interpretation(divination_type, question, cast.prompt, cast.key)
+        return f"{cast.prompt}\nAI解读：\n{ai_interpretation}"
+
+    def _divination_stream(self, divination_type: str, question: str, session_id: Optional[str] = None,
+                           on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """起卦并流式输出AI解读"""
+        with trace.span("cast"):
+            cast = self.cast(divination_type)
+
+        # 使用AI进行解释（流式输出）
+        yield from self._stream_with_header(cast, question, session_id, on_queue, trace)
+
+    def plum_blossom_divination(self, question: str) -> str:
+        """梅花易数占卜"""
+        return self._divination("梅花易数", question)
+
+    def plum_blossom_divination_stream(self, question: str, session_id: Optional[str] = None,
+                                       on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """梅花易数占卜（流式输出）"""
+        yield from self._divination_stream("梅花易数", question, session_id, on_queue, trace)
+
+    def heavenly_stems_earthly_branches(self, question: str) -> str:
+        """天干地支占卜"""
+        return self._divination("天干地支", question)
+
+    def heavenly_stems_earthly_branches_stream(self, question: str, session_id: Optional[str] = None,
+                                               on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
+        """天干地支占卜（流式输出）"""
+        yield from self._divination_stream("天干地支", question, session_id, on_queue, trace)
+
     def six_yao_divination(self, question: str) -> str:
         """六爻占卜"""
-        yao_lines = []
-        for i in range(6):
-            # 生成爻线 (6为老阴，7为少阳，8为少阴，9为老阳)
-            line_value = random.randint(6, 9)
-            if line_value in [7, 9]:
-                line = "———"  # 阳爻
-            else:
-                line = "-- --"  # 阴爻
-            yao_lines.append(line)
-        
-        hexagram = "\n".join(yao_lines[::-1])  # 倒序显示（从下到上）
-        
-        result = f"""
-六爻占卜结果：
-
-卦象：
-{hexagram}
-"""
+        return self._divination("六爻", question)
 
-        # 使用AI进行解释
-        ai_interpretation = self._get_ai_interpretation("六爻", question, result)
-        return f"{result}\nAI解读：\n{ai_interpretation}"
-    
-    def six_yao_divination_stream(self, question: str):
+    def six_yao_divination_stream(self, question: str, session_id: Optional[str] = None,
+                                  on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
         """六爻占卜（流式输出）"""
-        yao_lines = []
-        for i in range(6):
-            # 生成爻线 (6为老阴，7为少阳，8为少阴，9为老阳)
-            line_value = random.randint(6, 9)
-            if line_value in [7, 9]:
-                line = "———"  # 阳爻
-            else:
-                line = "-- --"  # 阴爻
-            yao_lines.append(line)
-        
-        hexagram = "\n".join(yao_lines[::-1])  # 倒序显示（从下到上）
-        
-        result = f"""
-六爻占卜结果：
-
-卦象：
-{hexagram}
-"""
+        yield from self._divination_stream("六爻", question, session_id, on_queue, trace)
 
-        # 使用AI进行解释（流式输出）
-        yield f"六爻卦象：\n{hexagram}\n\n"
-        yield "AI解读：\n"
-        
-        try:
-            stream_response = self._get_ai_interpretation_stream("六爻", question, result)
-            # 检查是否是字符串（错误情况）
-            if isinstance(stream_response, str):
-                yield stream_response
-            else:
-                # 处理流式响应
-                for chunk in stream_response:
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-        except Exception as e:
-            yield f"\nAI解读失败：{str(e)}"
-            # 重新抛出异常以供上层处理
-            raise
-    
     def purple_star_divination(self, question: str) -> str:
         """紫微斗数占卜"""
-        stars = ["紫微星", "天机星", "太阳星", "武曲星", "天同星", "廉贞星"]
-        positions = ["命宫", "兄弟宫", "夫妻宫", "子女宫", "财帛宫", "疾厄宫"]
-        
-        star = random.choice(stars)
-        position = random.choice(positions)
-        
-        result = f"""
-紫微斗数占卜结果：
-
-主星：{star}
-宫位：{position}
-"""
+        return self._divination("紫微斗数", question)
 
-        # 使用AI进行解释
-        ai_interpretation = self._get_ai_interpretation("紫微斗数", question, result)
-        return f"{result}\nAI解读：\n{ai_interpretation}"
-    
-    def purple_star_divination_stream(self, question: str):
+    def purple_star_divination_stream(self, question: str, session_id: Optional[str] = None,
+                                      on_queue: Optional[QueueCallback] = None, trace=NULL_TRACE):
         """紫微斗数占卜（流式输出）"""
-        stars = ["紫微星", "天机星", "太阳星", "武曲星", "天同星", "廉贞星"]
-        positions = ["命宫", "兄弟宫", "夫妻宫", "子女宫", "财帛宫", "疾厄宫"]
-        
-        star = random.choice(stars)
-        position = random.choice(positions)
-        
-        result = f"""
-紫微斗数占卜结果：
-
-主星：{star}
-宫位：{position}
-"""
+        yield from self._divination_stream("紫微斗数", question, session_id, on_queue, trace)
 
-        # 使用AI进行解释（流式输出）
-        yield f"主星：{star}\n宫位：{position}\n\n"
-        yield "AI解读：\n"
-        
-        try:
-            stream_response = self._get_ai_interpretation_stream("紫微斗数", question, result)
-            # 检查是否是字符串（错误情况）
-            if isinstance(stream_response, str):
-                yield stream_response
-            else:
-                # 处理流式响应
-                for chunk in stream_response:
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-        except Exception as e:
-            yield f"\nAI解读失败：{str(e)}"
-            # 重新抛出异常以供上层处理
-            raise
-    
-    def _generate_hexagram(self, numbers: List[int]) -> str:
-        """根据数字生成卦象名称"""
-        hexagrams = {
-            (1, 1, 1): "乾卦",
-            (1, 1, 2): "姤卦",
-            (1, 2, 1): "同人卦",
-            (1, 2, 2): "大有卦",
-            (2, 1, 1): "履卦",
-            (2, 1, 2): "小畜卦",
-            (2, 2, 1): "需卦",
-            (2, 2, 2): "大畜卦"
-        }
-        
-        # 将数字转换为键
-        key: Tuple[int, int, int] = tuple(min(n, 2) for n in numbers)  # type: ignore
-        return hexagrams.get(key, "未知卦")
-    
     def run_divination(self, divination_type: str, question: str) -> str:
         """执行占卜"""
         try:
-            if divination_type == "梅花易数":
-                return self.plum_blossom_divination(question)
-            elif divination_type == "天干地支":
-                return self.heavenly_stems_earthly_branches(question)
-            elif divination_type == "六爻":
-                return self.six_yao_divination(question)
-            elif divination_type == "紫微斗数":
-                return self.purple_star_divination(question)
-            else:
+            if get_method(divination_type) is None:
                 return f"暂不支持 {divination_type} 占卜方法"
+            return self._divination(divination_type, question)
         except Exception as e:
             return f"占卜过程中出现错误：{str(e)}"
-    
-    def run_divination_stream(self, divination_type: str, question: str):
-        """执行占卜（流式输出）"""
+
+    def run_divination_stream(self, divination_type: str, question: str, session_id: Optional[str] = None,
+                              on_queue: Optional[QueueCallback] = None, trace: Optional[Trace] = None,
+                              cast: Optional[CastResult] = None):
+        """执行占卜（流式输出）
+
+        session_id用于在限流器中按会话公平排队，排队期间用（位置，预计等待秒数）调用on_queue；
+        trace为分阶段耗时记录，未传入时由本方法创建并在结束时输出；
+        cast为调用方预先用 cast() 得到的起卦结果，界面据此绘制图表，解读与图表使用同一卦象
+        """
+        own_trace = trace is None
+        if own_trace:
+            trace = Trace(method=divination_type)
         try:
-            if divination_type == "梅花易数":
-                for chunk in self.plum_blossom_divination_stream(question):
-                    yield chunk
-            elif divination_type == "天干地支":
-                for chunk in self.heavenly_stems_earthly_branches_stream(question):
-                    yield chunk
-            elif divination_type == "六爻":
-                for chunk in self.six_yao_divination_stream(question):
-                    yield chunk
-            elif divination_type == "紫微斗数":
-                for chunk in self.purple_star_divination_stream(question):
-                    yield chunk
+            if cast is not None:
+                yield from self._stream_with_header(cast, question, session_id, on_queue, trace)
+            elif get_method(divination_type) is not None:
+                yield from self._divination_stream(divination_type, question, session_id, on_queue, trace)
             else:
                 yield f"暂不支持 {divination_type} 占卜方法"
         except Exception as e:
             yield f"占卜过程中出现错误：{str(e)}"
+        finally:
+            if own_trace:
+                trace.finish()
+
+    async def run_divination_async(self, divination_type: str, question: str) -> str:
+        """执行占卜（异步）"""
+        try:
+            cast = self.cast(divination_type)
+            if cast is None:
+                return f"暂不支持 {divination_type} 占卜方法"
+
+            ai_interpretation = await self._get_ai_interpretation_async(divination_type, question, cast.prompt,
+                                                                        cast.key)
+            return f"{cast.prompt}\nAI解读：\n{ai_interpretation}"
+        except Exception as e:
+            return f"占卜过程中出现错误：{str(e)}"
+
+    async def run_divination_stream_async(self, divination_type: str, question: str,
+                                          session_id: Optional[str] = None,
+                                          on_queue: Optional[QueueCallback] = None,
+                                          trace: Optional[Trace] = None,
+                                          cast: Optional[CastResult] = None):
+        """执行占卜（异步流式输出），cast同 run_divination_stream"""
+        own_trace = trace is None
+        if own_trace:
+            trace = Trace(method=divination_type)
+        try:
+            if cast is None:
+                with trace.span("cast"):
+                    cast = self.cast(divination_type)
+            if cast is None:
+                yield f"暂不支持 {divination_type} 占卜方法"
+                return
+
+            trace.set(seed=cast.seed)
+            yield cast.header
+            yield "AI解读：\n"
+
+            try:
+                async for text in self._stream_interpretation_async(cast.method, question, cast.prompt,
+                                                                     cast.key, session_id, on_queue, trace):
+                    trace.mark("first_token")
+                    yield text
+                trace.mark("last_token")
+            except Exception as e:
+                trace.set(error=type(e).__name__)
+                yield f"\nAI解读失败：{str(e)}"
+                raise
+        except Exception as e:
+            yield f"占卜过程中出现错误：{str(e)}"
+        finally:
+            if own_trace:
+                trace.finish()
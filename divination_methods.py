@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+占卜方式注册表
+每种占卜方式在独立的模块中注册起卦函数、提示词文本、图表渲染和通用解读枚举，
+查表按方式名直接分派。注册表只记录方式名到模块名的对应关系，
+某种方式第一次被使用时才导入其模块，模块中的查找表在导入（注册）时一次性建好
+"""
+
+import importlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 内置占卜方式及其实现模块，按界面展示顺序排列
+BUILTIN_METHODS: Dict[str, str] = {
+    "梅花易数": "method_plum_blossom",
+    "天干地支": "method_heavenly_stems",
+    "六爻": "method_six_yao",
+    "紫微斗数": "method_purple_star",
+}
+
+
+class DivinationMethod:
+    """一种占卜方式的注册信息
+
+    cast(rng, **options)用传入的 random.Random 起卦并返回 CastResult；
+    texts(cast)返回（提供给AI模型的占卜结果，展示文本）；
+    chart(chart_generator, cast)返回图表，没有图表的方式为None；
+    display(cast)返回界面上卦象展示的HTML，没有卦象展示的方式为None；
+    base_casts()枚举全部卦象的（通用解读键，占卜结果），用于离线预生成通用解读；
+    batch(generator, count, **options)用 numpy.random.Generator 批量起卦并返回 batch_casting.CastBatch
+    """
+
+    __slots__ = ('name', 'cast', 'texts', 'chart', 'chart_title', 'base_casts', 'batch', 'display')
+
+    def __init__(self, name: str, cast: Callable, texts: Callable, chart: Optional[Callable] = None,
+                 chart_title: Optional[str] = None,
+                 base_casts: Optional[Callable[[], Iterator[Tuple[str, str]]]] = None,
+                 batch: Optional[Callable] = None, display: Optional[Callable] = None):
+        self.name = name
+        self.cast = cast
+        self.texts = texts
+        self.chart = chart
+        self.chart_title = chart_title
+        self.base_casts = base_casts
+        self.batch = batch
+        self.display = display
+
+
+_methods: Dict[str, DivinationMethod] = {}
+_modules: Dict[str, str] = dict(BUILTIN_METHODS)
+
+
+def register(method: DivinationMethod) -> DivinationMethod:
+    """注册占卜方式，同名时覆盖"""
+    _methods[method.name] = method
+    return method
+
+
+def register_lazy(name: str, module: str) -> None:
+    """登记占卜方式的实现模块，第一次使用时导入"""
+    _modules[name] = module
+
+
+def get_method(name: str) -> Optional[DivinationMethod]:
+    """按名称取得占卜方式，必要时导入其模块，不支持的方式返回None"""
+    method = _methods.get(name)
+    if method is None and name in _modules:
+        # 导入锁保证并发的首次使用只执行一次模块注册
+        importlib.import_module(_modules[name])
+        method = _methods.get(name)
+    return method
+
+
+def method_names() -> List[str]:
+    """全部占卜方式的名称，不会导入任何实现模块"""
+    return list(dict.fromkeys(list(_modules) + list(_methods)))
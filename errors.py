@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+占卜服务错误类型
+将上游（ModelScope）的各种异常归类为带中文提示的类型化异常，
+并标明是否值得重试以及服务端要求的等待时间
+"""
+
+import email.utils
+import time
+from typing import Optional
+
+import httpx
+import openai
+
+
+class DivinationError(Exception):
+    """占卜服务错误基类"""
+
+
+class UpstreamError(DivinationError):
+    """AI模型调用失败"""
+
+    # 是否值得重试
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # 服务端通过Retry-After要求的等待秒数
+        self.retry_after = retry_after
+
+
+class AuthenticationError(UpstreamError):
+    """API密钥无效（401）"""
+
+
+class PermissionDeniedError(UpstreamError):
+    """API密钥权限不足（403）"""
+
+
+class RateLimitError(UpstreamError):
+    """请求频率过高（429）"""
+    retryable = True
+
+
+class ServerError(UpstreamError):
+    """上游服务端错误（5xx）"""
+    retryable = True
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """请求超时"""
+    retryable = True
+
+
+class UpstreamConnectionError(UpstreamError):
+    """网络连接失败"""
+    retryable = True
+
+
+class InterpretationError(UpstreamError):
+    """其他无法重试的AI解读错误"""
+
+
+def parse_retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """解析Retry-After / retry-after-ms响应头，返回等待秒数"""
+    if response is None:
+        return None
+    headers = response.headers
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    # HTTP日期格式
+    parsed = email.utils.parsedate_tz(retry_after)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+def classify_error(e: BaseException) -> UpstreamError:
+    """将底层异常转换为类型化的上游错误，已归类的异常原样返回"""
+    if isinstance(e, UpstreamError):
+        return e
+
+    if isinstance(e, openai.APIStatusError):
+        status = e.status_code
+        response = e.response
+        if status == 401:
+            return AuthenticationError("API密钥无效或已过期，请检查您的ModelScope API密钥", status)
+        if status == 403:
+            return PermissionDeniedError("API密钥权限不足，请检查您的ModelScope API密钥权限", status)
+        if status == 429:
+            return RateLimitError("API请求频率过高，请稍后重试", status, parse_retry_after(response))
+        if status >= 500:
+            return ServerError(f"AI服务暂时不可用（{status}），请稍后重试", status, parse_retry_after(response))
+        return InterpretationError(f"AI解读失败：{e}", status)
+
+    # APITimeoutError是APIConnectionError的子类，需先判断
+    if isinstance(e, (openai.APITimeoutError, httpx.TimeoutException)):
+        return UpstreamTimeoutError("API请求超时，请检查网络连接")
+    if isinstance(e, (openai.APIConnectionError, httpx.TransportError)):
+        return UpstreamConnectionError("无法连接AI服务，请检查网络连接")
+
+    return InterpretationError(f"AI解读失败：{e}")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+干支历模块
+由公历时间得到年、月、日、时四柱。年柱以立春为界，月柱以十二节（立春、惊蛰……小寒）为界，
+日柱以子初（23点）换日，时柱按时辰。时间一律按北京时间（UTC+8）计算，不做真太阳时修正。
+
+1900~2100年的二十四节气时刻预先算好，存放在 solar_terms.bin 中（int32，自1900年1月1日0时起的分钟数），
+第一次使用时才加载。节气时刻由 Meeus《天文算法》的低精度太阳视黄经公式求得，与天文台公布的时刻相差十分钟以内。
+单个时间的换算为常数次数组访问，pillars_array 可以一次换算整段时间序列。
+
+重新生成节气表：
+    python ganzhi_calendar.py --build
+"""
+
+import argparse
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from casting import HEAVENLY_STEMS, EARTHLY_BRANCHES
+
+BEIJING = timezone(timedelta(hours=8), "Asia/Shanghai")
+EPOCH = datetime(1900, 1, 1)  # 北京时间
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+
+SOLAR_TERMS = ["小寒", "大寒", "立春", "雨水", "惊蛰", "春分", "清明", "谷雨", "立夏", "小满", "芒种", "夏至",
+               "小暑", "大暑", "立秋", "处暑", "白露", "秋分", "寒露", "霜降", "立冬", "小雪", "大雪", "冬至"]
+# 六十甲子，下标即干支序号（甲子为0）
+SEXAGENARY = [HEAVENLY_STEMS[i % 10] + EARTHLY_BRANCHES[i % 12] for i in range(60)]
+
+# 1900年1月1日为甲戌日；1900年小寒所在月（己亥年十二月）为丁丑月
+_EPOCH_DAY = 10
+_FIRST_MONTH = 13
+
+# 节气表文件：魔数、版本、起始年、年数，随后是 年数×24 个 int32
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solar_terms.bin")
+MAGIC = b'DVST'
+VERSION = 1
+HEADER = struct.Struct('<4sHHH')
+
+_MINUTES_PER_DAY = 1440
+# 两节之间的平均分钟数，用于直接估算所在的月
+_MEAN_MONTH = 365.2422 * _MINUTES_PER_DAY / 12
+
+_terms: Optional[np.ndarray] = None
+_jie: Optional[np.ndarray] = None
+_limit: Optional[int] = None
+
+
+def _apparent_longitude(jde: np.ndarray) -> np.ndarray:
+    """太阳视黄经（度），Meeus 低精度公式"""
+    t = (jde - 2451545.0) / 36525
+    l0 = 280.46646 + 36000.76983 * t + 0.0003032 * t * t
+    m = np.radians(357.52911 + 35999.05029 * t - 0.0001537 * t * t)
+    c = ((1.914602 - 0.004817 * t - 0.000014 * t * t) * np.sin(m)
+         + (0.019993 - 0.000101 * t) * np.sin(2 * m) + 0.000289 * np.sin(3 * m))
+    omega = np.radians(125.04 - 1934.136 * t)
+    return (l0 + c - 0.00569 - 0.00478 * np.sin(omega)) % 360
+
+
+def build_table(first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR) -> np.ndarray:
+    """计算各年二十四节气的时刻，返回形状（年数，24）的int32数组，单位为自EPOCH起的分钟数"""
+    years = np.arange(first_year, last_year + 1, dtype=np.float64)[:, None]
+    index = np.arange(24)[None, :]
+    target = (285.0 + 15.0 * index) % 360  # 小寒为黄经285度
+
+    # 北京时间 EPOCH 的儒略日；ΔT用 Morrison-Stephenson 抛物线近似
+    epoch_jd = 2415020.5 - 8 / 24
+    delta_t = (-20 + 32 * ((years - 1820) / 100) ** 2) / 86400
+    # 初值：各年1月6日起每个节气约15.22天
+    days = (years - 1900) * 365.2422 + 5 + index * 365.2422 / 24
+    for _ in range(6):
+        error = (target - _apparent_longitude(epoch_jd + days + delta_t) + 180) % 360 - 180
+        days = days + error * 365.2422 / 360
+    return np.floor(days * _MINUTES_PER_DAY).astype(np.int32)
+
+
+def write_table(path: str = TABLE_PATH) -> None:
+    """生成并写入节气表文件"""
+    table = build_table()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, FIRST_YEAR, table.shape[0]))
+        f.write(table.astype('<i4').tobytes())
+    os.replace(tmp_path, path)
+
+
+def _load() -> np.ndarray:
+    """加载节气表，文件缺失时现场计算"""
+    global _terms, _jie, _limit
+    if _terms is None:
+        try:
+            with open(TABLE_PATH, 'rb') as f:
+                data = f.read()
+            magic, version, first_year, years = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or first_year != FIRST_YEAR:
+                raise ValueError(f"无法识别的节气表文件：{TABLE_PATH}")
+            terms = np.frombuffer(data, dtype='<i4', offset=HEADER.size).reshape(years, 24)
+        except FileNotFoundError:
+            terms = build_table()
+        # 十二节（小寒、立春、惊蛰……大雪）展平成一条递增序列，下标即自1900年丁丑月起的月数
+        _jie = np.ascontiguousarray(terms[:, 0::2]).ravel().astype(np.int64)
+        _limit = _minutes(datetime(LAST_YEAR + 1, 1, 1))
+        _terms = terms
+    return _terms
+
+
+def _minutes(moment: datetime) -> int:
+    """自EPOCH起的分钟数，带时区的时间先换算为北京时间"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(BEIJING).replace(tzinfo=None)
+    return (moment - EPOCH) // timedelta(minutes=1)
+
+
+def _month_index(minutes: int) -> int:
+    """所在节月的序号：按平均月长估算后至多前后调整一次"""
+    jie = _jie
+    if not jie[0] <= minutes < _limit:
+        raise ValueError(f"超出节气表范围（{FIRST_YEAR}年小寒至{LAST_YEAR}年末）")
+    index = min(int((minutes - jie[0]) // _MEAN_MONTH), len(jie) - 1)
+    while jie[index] > minutes:
+        index -= 1
+    while index + 1 < len(jie) and jie[index + 1] <= minutes:
+        index += 1
+    return index
+
+
+def pillars(moment: datetime) -> Tuple[int, int, int, int]:
+    """年、月、日、时四柱的干支序号（甲子为0），不带时区的时间视为北京时间"""
+    _load()
+    minutes = _minutes(moment)
+    month = _month_index(minutes)
+    # 第0个节月是1899年（己亥年）的丑月，此后每12个节月进入新的一年
+    year = FIRST_YEAR + (month - 1) // 12
+    # 子初（23点）换日：整体推后一小时，日序号与时辰都按推后的时间计算
+    shifted = minutes + 60
+    day = (_EPOCH_DAY + shifted // _MINUTES_PER_DAY) % 60
+    branch = shifted % _MINUTES_PER_DAY // 120
+    return (year - 4) % 60, (_FIRST_MONTH + month) % 60, day, (day % 5 * 12 + branch) % 60
+
+
+def pillar_names(moment: datetime) -> Tuple[str, str, str, str]:
+    """四柱干支，例如 ('甲辰', '丙寅', '戊戌', '戊午')"""
+    return tuple(SEXAGENARY[index] for index in pillars(moment))
+
+
+def pillars_array(moments) -> np.ndarray:
+    """批量换算，moments为北京时间的 datetime64 数组（或可转换为它的序列），返回形状（N，4）的int8数组"""
+    _load()
+    minutes = ((np.asarray(moments, dtype='datetime64[m]') - np.datetime64(EPOCH, 'm'))
+               // np.timedelta64(1, 'm')).astype(np.int64)
+    if minutes.size and (minutes.min() < _jie[0] or minutes.max() >= _limit):
+        raise ValueError(f"超出节气表范围（{FIRST_YEAR}年小寒至{LAST_YEAR}年末）")
+    month = np.searchsorted(_jie, minutes, side='right') - 1
+    year = FIRST_YEAR + (month - 1) // 12
+    shifted = minutes + 60
+    day = (_EPOCH_DAY + shifted // _MINUTES_PER_DAY) % 60
+    branch = shifted % _MINUTES_PER_DAY // 120
+    return np.stack([(year - 4) % 60, (_FIRST_MONTH + month) % 60, day, (day % 5 * 12 + branch) % 60],
+                    axis=-1).astype(np.int8)
+
+
+def solar_terms(year: int) -> List[Tuple[str, datetime]]:
+    """某年的二十四节气及其北京时间"""
+    if not FIRST_YEAR <= year <= LAST_YEAR:
+        raise ValueError(f"超出节气表范围（{FIRST_YEAR}~{LAST_YEAR}年）")
+    row = _load()[year - FIRST_YEAR]
+    return [(name, EPOCH + timedelta(minutes=int(minutes))) for name, minutes in zip(SOLAR_TERMS, row)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="干支历")
+    parser.add_argument('--build', action='store_true', help=f"重新生成 {os.path.basename(TABLE_PATH)}")
+    parser.add_argument('--date', default=None, help="查询某一时间的四柱，例如 2024-02-04T16:30")
+    args = parser.parse_args()
+
+    if args.build:
+        write_table()
+        print(f"已写入 {TABLE_PATH}")
+    moment = datetime.fromisoformat(args.date) if args.date else datetime.now(BEIJING)
+    print(" ".join(f"{name}{label}" for name, label in zip(pillar_names(moment), "年月日时")))
+
+
+if __name__ == "__main__":
+    main()
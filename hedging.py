@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+对冲请求模块
+首个token迟迟不到时再发一个相同的请求，谁先产出token就用谁，另一个立即取消，
+以较小的额外开销削减首token延迟的长尾
+"""
+
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """计算分位数（最近秩法），q取0到1"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class HedgePolicy:
+    """对冲策略：根据最近的首token延迟分布决定何时补发请求，并统计对冲效果"""
+
+    def __init__(self, percentile: float = 0.95, min_delay: float = 0.5, max_delay: float = 5.0,
+                 initial_delay: float = 2.0, window: int = 200, min_samples: int = 20):
+        """percentile为触发对冲的首token延迟分位数，样本不足min_samples时使用initial_delay"""
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        # 用户实际等待的首token延迟（从首发请求开始计时）
+        self._ttft: Deque[float] = deque(maxlen=window)
+        # 胜出请求自身的首token延迟（从该请求发出开始计时），近似不做对冲时的分布
+        self._upstream_ttft: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def delay(self) -> float:
+        """当前的对冲触发延迟（秒）"""
+        with self._lock:
+            samples = list(self._upstream_ttft)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, percentile(samples, self.percentile)))
+
+    def record(self, ttft: float, upstream_ttft: float, fired: bool, hedge_won: bool) -> None:
+        """记录一次请求的结果"""
+        with self._lock:
+            self.requests += 1
+            self.hedges_fired += int(fired)
+            self.hedges_won += int(hedge_won)
+            self._ttft.append(ttft)
+            self._upstream_ttft.append(upstream_ttft)
+
+    def stats(self) -> Dict[str, float]:
+        """对冲统计：触发率、胜出次数，以及各分位首token延迟的节省量
+
+        节省量 = 上游自身首token延迟分位数 - 用户实际等待的分位数。
+        上游样本只来自胜出的请求，偏快，因此节省量是保守估计
+        """
+        with self._lock:
+            ttft = list(self._ttft)
+            upstream = list(self._upstream_ttft)
+            stats = {
+                'requests': self.requests,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+                'fire_rate': self.hedges_fired / self.requests if self.requests else 0.0,
+            }
+        for q in (0.5, 0.95, 0.99):
+            name = f"p{int(q * 100)}"
+            stats[f'ttft_{name}'] = percentile(ttft, q)
+            stats[f'upstream_ttft_{name}'] = percentile(upstream, q)
+            stats[f'saved_{name}'] = max(0.0, stats[f'upstream_ttft_{name}'] - stats[f'ttft_{name}'])
+        return stats
+
+
+class _Attempt:
+    """一次上游请求，在后台线程中读取并把事件放入共享队列"""
+
+    def __init__(self, index: int, open_stream: Callable[[], Iterable], events: queue.Queue):
+        self.index = index
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+        self.response: Any = None
+        self._open_stream = open_stream
+        self._events = events
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.response = self._open_stream()
+            if self.cancelled.is_set():
+                self._close()
+                return
+            for chunk in self.response:
+                if self.cancelled.is_set():
+                    break
+                self._events.put((self.index, 'chunk', chunk))
+            self._events.put((self.index, 'end', None))
+        except BaseException as e:
+            if not self.cancelled.is_set():
+                self._events.put((self.index, 'error', e))
+
+    def _close(self) -> None:
+        close = getattr(self.response, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def cancel(self) -> None:
+        """取消请求并关闭底层连接，阻塞中的读取会随之结束"""
+        self.cancelled.set()
+        self._close()
+
+
+def hedged_stream(open_stream: Callable[[], Iterable], extract: Callable[[Any], Optional[str]],
+                  policy: HedgePolicy) -> Iterator[str]:
+    """对冲地读取流式响应
+
+    open_stream每次调用发起一个新的流式请求，extract从响应块中取出文本（无文本返回None）。
+    首个文本块在策略给出的延迟内未到达时补发一次请求，先产出文本的请求胜出，另一个被取消
+    """
+    events: queue.Queue = queue.Queue()
+    started = time.perf_counter()
+    attempts = [_Attempt(0, open_stream, events)]
+    alive = {0}
+    winner: Optional[int] = None
+    hedge_at = started + policy.delay()
+    first_error: Optional[BaseException] = None
+
+    try:
+        # 等待首个文本块，必要时补发对冲请求
+        while winner is None:
+            timeout = None
+            if len(attempts) == 1:
+                timeout = max(0.0, hedge_at - time.perf_counter())
+            try:
+                index, kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                attempts.append(_Attempt(1, open_stream, events))
+                alive.add(1)
+                continue
+
+            if kind == 'chunk':
+                text = extract(payload)
+                if text:
+                    winner = index
+                    now = time.perf_counter()
+                    policy.record(now - started, now - attempts[index].started,
+                                  fired=len(attempts) > 1, hedge_won=index == 1)
+                    yield text
+            elif kind == 'end':
+                # 没有产出任何文本就结束了，视为空响应
+                alive.discard(index)
+                if not alive:
+                    return
+            else:
+                alive.discard(index)
+                if first_error is None:
+                    first_error = payload
+                if not alive:
+                    raise first_error
+
+        for attempt in attempts:
+            if attempt.index != winner:
+                attempt.cancel()
+
+        # 继续读取胜出请求的剩余内容
+        while True:
+            index, kind, payload = events.get()
+            if index != winner:
+                continue
+            if kind == 'chunk':
+                text = extract(payload)
+                if text:
+                    yield text
+            elif kind == 'end':
+                return
+            else:
+                raise payload
+    finally:
+        # 调用方提前结束或出错时，确保所有请求都被取消
+        for attempt in attempts:
+            if attempt.thread.is_alive():
+                attempt.cancel()
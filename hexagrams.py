@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+六十四卦引擎
+卦用6位整数表示：第i位（从0开始）为第i+1爻，初爻在最低位，1为阳爻、0为阴爻；
+低3位为下卦（内卦），高3位为上卦（外卦）。动爻用同样排列的6位掩码表示。
+卦名、上下卦、文王卦序、互卦、错卦、综卦均在导入时预先算成长度64的表，
+查询只是一次下标访问；变卦为本卦与动爻掩码的异或
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+# 三爻卦，按3位整数（初爻在最低位）索引
+TRIGRAM_NAMES = ("坤", "震", "坎", "兑", "艮", "离", "巽", "乾")
+TRIGRAM_IMAGES = ("地", "雷", "水", "泽", "山", "火", "风", "天")
+TRIGRAM_SYMBOLS = ("☷", "☳", "☵", "☱", "☶", "☲", "☴", "☰")
+
+# 先天八卦数：乾1 兑2 离3 震4 巽5 坎6 艮7 坤8，下标为先天数
+PRE_HEAVEN_TRIGRAMS = (None, 7, 3, 5, 1, 6, 2, 4, 0)
+
+# 文王卦序（1~64）对应的卦名
+KING_WEN_NAMES = (
+    "乾", "坤", "屯", "蒙", "需", "讼", "师", "比", "小畜", "履", "泰", "否", "同人", "大有", "谦", "豫",
+    "随", "蛊", "临", "观", "噬嗑", "贲", "剥", "复", "无妄", "大畜", "颐", "大过", "坎", "离", "咸", "恒",
+    "遁", "大壮", "晋", "明夷", "家人", "睽", "蹇", "解", "损", "益", "夬", "姤", "萃", "升", "困", "井",
+    "革", "鼎", "震", "艮", "渐", "归妹", "丰", "旅", "巽", "兑", "涣", "节", "中孚", "小过", "既济", "未济",
+)
+
+# 文王卦序表：行为上卦、列为下卦，均按 乾 震 坎 艮 坤 巽 离 兑 排列
+_GRID_ORDER = (7, 1, 2, 4, 0, 6, 5, 3)
+_KING_WEN_GRID = (
+    (1, 25, 6, 33, 12, 44, 13, 10),
+    (34, 51, 40, 62, 16, 32, 55, 54),
+    (5, 3, 29, 39, 8, 48, 63, 60),
+    (26, 27, 4, 52, 23, 18, 22, 41),
+    (11, 24, 7, 15, 2, 46, 36, 19),
+    (9, 42, 59, 53, 20, 57, 37, 61),
+    (14, 21, 64, 56, 35, 50, 30, 38),
+    (43, 17, 47, 31, 45, 28, 49, 58),
+)
+
+LINE_NAMES = ("初爻", "二爻", "三爻", "四爻", "五爻", "上爻")
+ALL_LINES = 0b111111
+
+
+def from_trigrams(upper: int, lower: int) -> int:
+    """由上卦、下卦（3位整数）组成卦"""
+    return upper << 3 | lower
+
+
+def _reverse_bits(value: int) -> int:
+    return int(format(value, '06b')[::-1], 2)
+
+
+def _build_tables():
+    king_wen = [0] * 64
+    for row, upper in enumerate(_GRID_ORDER):
+        for column, lower in enumerate(_GRID_ORDER):
+            king_wen[from_trigrams(upper, lower)] = _KING_WEN_GRID[row][column]
+
+    names, full_names = [], []
+    for value in range(64):
+        upper, lower = value >> 3, value & 7
+        name = KING_WEN_NAMES[king_wen[value] - 1]
+        names.append(name + "卦")
+        if upper == lower:
+            full_names.append(f"{TRIGRAM_NAMES[upper]}为{TRIGRAM_IMAGES[upper]}")
+        else:
+            full_names.append(f"{TRIGRAM_IMAGES[upper]}{TRIGRAM_IMAGES[lower]}{name}")
+
+    # 互卦：二三四爻为下卦，三四五爻为上卦
+    nuclear = [from_trigrams(value >> 2 & 7, value >> 1 & 7) for value in range(64)]
+    # 错卦：六爻阴阳全变
+    opposite = [value ^ ALL_LINES for value in range(64)]
+    # 综卦：上下颠倒
+    reverse = [_reverse_bits(value) for value in range(64)]
+    return tuple(king_wen), tuple(names), tuple(full_names), tuple(nuclear), tuple(opposite), tuple(reverse)
+
+
+KING_WEN, NAMES, FULL_NAMES, NUCLEAR, OPPOSITE, REVERSED = _build_tables()
+UPPER = tuple(value >> 3 for value in range(64))
+LOWER = tuple(value & 7 for value in range(64))
+
+# 文王卦序 -> 卦值，下标0不使用
+BY_KING_WEN = (None,) + tuple(sorted(range(64), key=lambda value: KING_WEN[value]))
+BY_NAME: Dict[str, int] = {name: value for value, name in enumerate(NAMES)}
+
+
+def from_lines(values: Iterable[int]) -> Tuple[int, int]:
+    """由从初爻到上爻的爻值（6老阴、7少阳、8少阴、9老阳）得到（卦值，动爻掩码）"""
+    value = mask = 0
+    for i, line in enumerate(values):
+        if line & 1:
+            value |= 1 << i
+        if line in (6, 9):
+            mask |= 1 << i
+    return value, mask
+
+
+def to_lines(value: int, mask: int = 0) -> List[int]:
+    """由卦值和动爻掩码还原从初爻到上爻的爻值"""
+    return [(9 if value >> i & 1 else 6) if mask >> i & 1 else (7 if value >> i & 1 else 8) for i in range(6)]
+
+
+def changed(value: int, mask: int) -> int:
+    """变卦：动爻阴阳互变"""
+    return value ^ mask
+
+
+def moving_lines(mask: int) -> List[int]:
+    """动爻的位置（1为初爻，6为上爻）"""
+    return [i + 1 for i in range(6) if mask >> i & 1]
+
+
+def plum_blossom(numbers: Iterable[int]) -> Tuple[int, int]:
+    """梅花易数三数起卦：第一数取上卦，第二数取下卦（除8取余，余0作8），
+    三数之和除6取余为动爻（余0作6），返回（卦值，动爻掩码）"""
+    first, second, third = numbers
+    upper = PRE_HEAVEN_TRIGRAMS[(first - 1) % 8 + 1]
+    lower = PRE_HEAVEN_TRIGRAMS[(second - 1) % 8 + 1]
+    line = (first + second + third - 1) % 6
+    return from_trigrams(upper, lower), 1 << line
+
+
+def plum_blossom_time(year: int, month: int, day: int, hour: int) -> Tuple[int, int]:
+    """梅花易数年月日时起卦：年支数、农历月、农历日之和取上卦，再加时支数取下卦（除8取余，余0作8），
+    四数之和除6取余为动爻（余0作6），返回（卦值，动爻掩码）"""
+    upper_sum = year + month + day
+    lower_sum = upper_sum + hour
+    upper = PRE_HEAVEN_TRIGRAMS[(upper_sum - 1) % 8 + 1]
+    lower = PRE_HEAVEN_TRIGRAMS[(lower_sum - 1) % 8 + 1]
+    return from_trigrams(upper, lower), 1 << (lower_sum - 1) % 6
+
+
+def describe(value: int, mask: int = 0) -> Dict[str, str]:
+    """卦的文字说明：本卦、上下卦、动爻、变卦、互卦、错卦、综卦"""
+    info = {
+        '本卦': f"{NAMES[value]}（{FULL_NAMES[value]}，第{KING_WEN[value]}卦）",
+        '上卦': f"{TRIGRAM_NAMES[UPPER[value]]}（{TRIGRAM_IMAGES[UPPER[value]]}）",
+        '下卦': f"{TRIGRAM_NAMES[LOWER[value]]}（{TRIGRAM_IMAGES[LOWER[value]]}）",
+    }
+    if mask:
+        info['动爻'] = "、".join(LINE_NAMES[line - 1] for line in moving_lines(mask))
+        info['变卦'] = f"{NAMES[value ^ mask]}（{FULL_NAMES[value ^ mask]}）"
+    info['互卦'] = f"{NAMES[NUCLEAR[value]]}（{FULL_NAMES[NUCLEAR[value]]}）"
+    info['错卦'] = f"{NAMES[OPPOSITE[value]]}（{FULL_NAMES[OPPOSITE[value]]}）"
+    info['综卦'] = f"{NAMES[REVERSED[value]]}（{FULL_NAMES[REVERSED[value]]}）"
+    return info
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+占卜解读缓存模块
+以（占卜方式，卦象，规范化问题）为键，将AI解读持久化到SQLite，
+按LRU + TTL策略淘汰；可选挂载近似问题索引，提高相似问题的命中率
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from question_similarity import QuestionIndex
+
+
+def normalize_question(question: str) -> str:
+    """规范化用户问题：统一全半角与大小写，去掉空白和标点"""
+    text = unicodedata.normalize('NFKC', question).lower()
+    return ''.join(ch for ch in text if unicodedata.category(ch)[0] in ('L', 'N'))
+
+
+def format_cast(cast: Iterable) -> str:
+    """将结构化卦象转换为缓存使用的文本，例如 "乾卦 1,1,1" """
+    parts = [str(part) for part in cast]
+    if not parts:
+        return ''
+    return f"{parts[0]} {','.join(parts[1:])}".strip()
+
+
+class InterpretationCache:
+    """基于SQLite的占卜解读缓存（LRU + TTL）"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000,
+                 ttl_seconds: float = 7 * 24 * 3600, question_index: Optional['QuestionIndex'] = None):
+        """初始化缓存，path为None时读取环境变量DIVINATION_CACHE_PATH"""
+        if path is None:
+            path = os.getenv('DIVINATION_CACHE_PATH', 'interpretation_cache.db')
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.question_index = question_index
+
+        # Streamlit的每个会话运行在不同线程中，共用一个连接并加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS interpretations (
+                    key TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    cast_key TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_interpretations_accessed ON interpretations (accessed_at)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_interpretations_cast ON interpretations (method, cast_key)')
+            self._conn.commit()
+
+        if question_index is not None:
+            self._load_question_index()
+
+    def _load_question_index(self) -> None:
+        """用已缓存的问题预热近似问题索引"""
+        with self._lock:
+            rows = self._conn.execute('SELECT method, cast_key, question FROM interpretations').fetchall()
+        for method, cast, question in rows:
+            self.question_index.add(self._group(method, cast), question)
+
+    @staticmethod
+    def _group(method: str, cast: str) -> str:
+        """近似匹配只在同一占卜方式、同一卦象内进行"""
+        return f"{method}\x1f{cast}"
+
+    @staticmethod
+    def make_key(method: str, cast: str, question: str) -> str:
+        """生成缓存键"""
+        raw = '\x1f'.join([method, cast, normalize_question(question)])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key: str, now: float) -> Optional[str]:
+        """按缓存键读取，过期则删除（调用方需持有锁）"""
+        row = self._conn.execute(
+            'SELECT content, created_at FROM interpretations WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        content, created_at = row
+        if now - created_at > self.ttl_seconds:
+            self._conn.execute('DELETE FROM interpretations WHERE key = ?', (key,))
+            self._conn.commit()
+            return None
+
+        # 更新访问时间，供LRU淘汰使用
+        self._conn.execute('UPDATE interpretations SET accessed_at = ? WHERE key = ?', (now, key))
+        self._conn.commit()
+        return content
+
+    def get(self, method: str, cast: str, question: str) -> Optional[str]:
+        """读取缓存的解读，精确未命中时尝试相似问题，仍未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            content = self._lookup(self.make_key(method, cast, question), now)
+        if content is not None:
+            self.hits += 1
+            return content
+
+        if self.question_index is not None:
+            similar = self.question_index.query(self._group(method, cast), question)
+            if similar is not None:
+                with self._lock:
+                    content = self._lookup(self.make_key(method, cast, similar), now)
+                if content is not None:
+                    self.hits += 1
+                    self.similar_hits += 1
+                    return content
+
+        self.misses += 1
+        return None
+
+    def set(self, method: str, cast: str, question: str, content: str) -> None:
+        """写入解读并按容量淘汰最久未使用的条目"""
+        key = self.make_key(method, cast, question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO interpretations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, method, cast, normalize_question(question), content, now, now))
+            evicted = self._evict(now)
+            self._conn.commit()
+
+        if self.question_index is not None:
+            for evicted_method, evicted_cast, evicted_question in evicted:
+                self.question_index.discard(self._group(evicted_method, evicted_cast), evicted_question)
+            self.question_index.add(self._group(method, cast), normalize_question(question))
+
+    def _evict(self, now: float) -> List[Tuple[str, str, str]]:
+        """删除过期条目以及超出容量的最久未使用条目，返回被删除的条目（调用方需持有锁）"""
+        expired = self._conn.execute(
+            'SELECT key, method, cast_key, question FROM interpretations WHERE created_at < ?',
+            (now - self.ttl_seconds,)).fetchall()
+        count = self._conn.execute('SELECT COUNT(*) FROM interpretations').fetchone()[0] - len(expired)
+        overflow = []
+        if count > self.max_entries:
+            overflow = self._conn.execute("""
+                SELECT key, method, cast_key, question FROM interpretations
+                WHERE created_at >= ? ORDER BY accessed_at ASC LIMIT ?
+            """, (now - self.ttl_seconds, count - self.max_entries)).fetchall()
+
+        rows = expired + overflow
+        self._conn.executemany('DELETE FROM interpretations WHERE key = ?', [(row[0],) for row in rows])
+        return [row[1:] for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM interpretations').fetchone()[0]
+
+    @property
+    def hit_ratio(self) -> float:
+        """缓存命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM interpretations')
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
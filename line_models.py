@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+六爻起爻概率模型
+均匀（默认）：四种爻值各1/4，与引入起爻模型之前的起卦一致；
+三钱法（铜钱）：老阴1/8、少阳3/8、少阴3/8、老阳1/8；
+大衍筮法（蓍草）：老阴1/16、少阳5/16、少阴7/16、老阳3/16。
+每种模型预先建好别名表（Vose alias method），逐爻抽样和批量抽样都是O(1)：
+取一个均匀下标和一个均匀小数，比较一次即可得到爻值
+
+统计基准：python line_models.py --samples 10000000
+"""
+
+import argparse
+import json
+import random
+import time
+from fractions import Fraction
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LINE_VALUES = (6, 7, 8, 9)
+
+
+class AliasTable:
+    """离散分布的别名表"""
+
+    __slots__ = ('values', 'probabilities', 'threshold', 'alias', '_values', '_threshold', '_alias')
+
+    def __init__(self, values: Sequence[int], weights: Sequence):
+        total = sum(Fraction(weight) for weight in weights)
+        self.values = tuple(values)
+        self.probabilities = tuple(Fraction(weight) / total for weight in weights)
+        count = len(self.values)
+
+        # 用分数建表，概率为二进分数时门限可以精确表示为浮点数
+        scaled = [p * count for p in self.probabilities]
+        threshold: List[Fraction] = [Fraction(1)] * count
+        alias = list(range(count))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            threshold[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+        self.threshold = tuple(float(t) for t in threshold)
+        # 别名表直接存放结果值，抽样时省去一次下标转换
+        self.alias = tuple(self.values[i] for i in alias)
+        self._values = np.array(self.values, dtype=np.int8)
+        self._threshold = np.array(self.threshold)
+        self._alias = np.array(self.alias, dtype=np.int8)
+
+    def draw(self, rng: random.Random) -> int:
+        """抽取一个值"""
+        i = rng.randrange(len(self.values))
+        return self.values[i] if rng.random() < self.threshold[i] else self.alias[i]
+
+    def sample(self, generator: np.random.Generator, shape) -> np.ndarray:
+        """批量抽取，返回int8数组"""
+        index = generator.integers(0, len(self.values), size=shape)
+        keep = generator.random(size=shape) < self._threshold[index]
+        return np.where(keep, self._values[index], self._alias[index])
+
+
+# 起爻方式 -> 爻值6、7、8、9的权重，铜钱、蓍草需显式选择
+MODEL_WEIGHTS: Dict[str, Tuple[int, int, int, int]] = {
+    "均匀": (1, 1, 1, 1),
+    "铜钱": (1, 3, 3, 1),
+    "蓍草": (1, 5, 7, 3),
+}
+DEFAULT_MODEL = "均匀"
+
+MODELS: Dict[str, AliasTable] = {name: AliasTable(LINE_VALUES, weights)
+                                 for name, weights in MODEL_WEIGHTS.items()}
+
+
+def get_model(name: Optional[str] = None) -> AliasTable:
+    """按名称取得起爻模型，None为默认的均匀模型，不支持的名称抛出ValueError"""
+    try:
+        return MODELS[name or DEFAULT_MODEL]
+    except KeyError:
+        raise ValueError(f"不支持的起爻方式：{name}") from None
+
+
+# 自由度为3的卡方分布在显著性水平0.001下的临界值
+CHI_SQUARE_CRITICAL = 16.266
+
+
+def benchmark(name: str, samples: int = 10 ** 7, scalar_samples: int = 10 ** 6,
+              seed: Optional[int] = None) -> Dict:
+    """抽样检验模型的分布并测量抽样速度
+
+    批量抽取samples个爻值做卡方拟合优度检验，另外逐个抽取scalar_samples个测量单次抽样的速度
+    """
+    table = get_model(name)
+    generator = np.random.default_rng(seed)
+    started = time.perf_counter()
+    values = table.sample(generator, samples)
+    batch_seconds = time.perf_counter() - started
+    counts = np.bincount(values - LINE_VALUES[0], minlength=len(LINE_VALUES))
+
+    rng = random.Random(seed)
+    draw = table.draw
+    started = time.perf_counter()
+    for _ in range(scalar_samples):
+        draw(rng)
+    scalar_seconds = time.perf_counter() - started
+
+    expected = np.array([float(p) for p in table.probabilities]) * samples
+    chi_square = float(((counts - expected) ** 2 / expected).sum())
+    return {
+        'model': name,
+        'samples': samples,
+        'expected': {value: float(p) for value, p in zip(LINE_VALUES, table.probabilities)},
+        'observed': {value: count / samples for value, count in zip(LINE_VALUES, counts.tolist())},
+        'chi_square': chi_square,
+        'passed': chi_square < CHI_SQUARE_CRITICAL,
+        'batch_samples_per_second': samples / batch_seconds,
+        'scalar_samples_per_second': scalar_samples / scalar_seconds,
+    }
+
+
+def format_report(report: Dict) -> str:
+    """把基准结果格式化为文本"""
+    lines = [f"起爻方式：{report['model']}（{report['samples']}次）"]
+    for value in LINE_VALUES:
+        lines.append(f"  {value}: 期望 {report['expected'][value]:.5f}  实际 {report['observed'][value]:.5f}")
+    lines.append(f"  卡方 {report['chi_square']:.2f}（临界值 {CHI_SQUARE_CRITICAL}）"
+                 f"{'通过' if report['passed'] else '未通过'}")
+    lines.append(f"  批量 {report['batch_samples_per_second']:,.0f} 次/秒，"
+                 f"逐个 {report['scalar_samples_per_second']:,.0f} 次/秒")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起爻概率模型的统计基准")
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--samples', type=int, default=10 ** 7, help="批量抽样次数")
+    parser.add_argument('--scalar-samples', type=int, default=10 ** 6, help="逐个抽样次数")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="输出JSON格式的报告")
+    args = parser.parse_args()
+
+    reports = [benchmark(name, args.samples, args.scalar_samples, args.seed) for name in args.models]
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    else:
+        print("\n\n".join(format_report(report) for report in reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+占卜流程并发压测工具
+模拟N个并发用户轮流使用四种占卜方式调用 run_divination_stream，
+统计吞吐量、首token时间（TTFT）、完整输出时间（TTLT）的p50/p95/p99，
+以及进程的峰值内存和CPU占用，用于评估Streamlit进程容量和发现性能回归。
+
+用法：
+    python load_test.py --users 20 --iterations 5                  # 使用内置模拟服务
+    python load_test.py --users 4 --iterations 2 --base-url https://api-inference.modelscope.cn/v1
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import casting
+from divination_agent import DivinationAgent
+from hedging import percentile
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
+
+METHODS = ["梅花易数", "天干地支", "六爻", "紫微斗数"]
+
+QUESTIONS = ["我的事业运如何？", "近期财运怎么样？", "感情会有进展吗？", "健康需要注意什么？",
+             "这次考试能顺利吗？", "适合换工作吗？", "今年适合投资吗？", "和朋友的关系会好转吗？"]
+
+# AI解读开始前固定输出的两段：起卦结果和"AI解读："标题
+HEADER_CHUNKS = 2
+
+# app.py中会渲染图表的占卜方式
+CHART_METHODS = {"梅花易数", "天干地支", "六爻"}
+
+# pyplot不是线程安全的，图表渲染串行执行，等待时间计入图表耗时
+_chart_lock = threading.Lock()
+
+
+def render_chart(chart_generator, divination_type: str, rng: random.Random) -> None:
+    """按app.py的方式渲染该占卜方式的图表，卦象由rng派生的种子决定，可重现"""
+    cast = casting.cast(divination_type, seed=rng.getrandbits(64))
+    with _chart_lock:
+        chart_generator.generate_chart(cast)
+
+
+class ResourceSampler:
+    """后台采样进程内存，结束时计算CPU占用"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_rss() -> int:
+        """当前常驻内存（字节），无法读取时返回0"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, self.current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> 'ResourceSampler':
+        self._wall = time.perf_counter()
+        self._cpu = os.times()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._wall
+        cpu = os.times()
+        self.cpu_seconds = (cpu.user - self._cpu.user) + (cpu.system - self._cpu.system)
+        # 多线程下可能超过100%（每个核心100%）
+        self.cpu_percent = 100 * self.cpu_seconds / wall if wall > 0 else 0.0
+        if resource is not None:
+            # Linux下ru_maxrss单位为KB，macOS下为字节
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak_rss = max(self.peak_rss, maxrss if sys.platform == 'darwin' else maxrss * 1024)
+
+
+def _summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{int(q * 100)}": percentile(samples, q) if samples else None for q in (0.5, 0.95, 0.99)}
+
+
+def run_load_test(agent_factory: Callable[[], DivinationAgent], users: int = 10, iterations: int = 3,
+                  methods: Optional[List[str]] = None, charts: bool = False, seed: int = 0) -> Dict:
+    """并发运行占卜流程并返回统计报告
+
+    每个用户使用独立的智能体（对应一个Streamlit会话），按顺序轮流使用各占卜方式，
+    共执行iterations轮
+    """
+    methods = methods or METHODS
+    chart_generator = None
+    if charts:
+        from chart_generator import ChartGenerator
+        chart_generator = ChartGenerator()
+
+    lock = threading.Lock()
+    stats = {method: {'ttft': [], 'ttlt': [], 'chart': [], 'errors': 0} for method in methods}
+    start_barrier = threading.Barrier(users)
+
+    def user(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        agent = agent_factory()
+        start_barrier.wait()
+        for i in range(iterations * len(methods)):
+            method = methods[(index + i) % len(methods)]
+            question = rng.choice(QUESTIONS)
+            chart_time = None
+            if chart_generator is not None and method in CHART_METHODS:
+                chart_start = time.perf_counter()
+                render_chart(chart_generator, method, rng)
+                chart_time = time.perf_counter() - chart_start
+
+            start = time.perf_counter()
+            ttft = None
+            failed = False
+            for n, chunk in enumerate(agent.run_divination_stream(method, question, session_id=f"user-{index}")):
+                if n == HEADER_CHUNKS and ttft is None:
+                    ttft = time.perf_counter() - start
+                if "AI解读失败" in chunk or "占卜过程中出现错误" in chunk:
+                    failed = True
+            ttlt = time.perf_counter() - start
+
+            with lock:
+                entry = stats[method]
+                if chart_time is not None:
+                    entry['chart'].append(chart_time)
+                if failed or ttft is None:
+                    entry['errors'] += 1
+                else:
+                    entry['ttft'].append(ttft)
+                    entry['ttlt'].append(ttlt)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    with ResourceSampler() as sampler:
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_start
+
+    completed = sum(len(entry['ttlt']) for entry in stats.values())
+    return {
+        'users': users,
+        'iterations': iterations,
+        'wall_seconds': wall,
+        'completed': completed,
+        'errors': sum(entry['errors'] for entry in stats.values()),
+        'throughput': completed / wall if wall > 0 else 0.0,
+        'peak_rss_mb': sampler.peak_rss / (1024 * 1024),
+        'cpu_seconds': sampler.cpu_seconds,
+        'cpu_percent': sampler.cpu_percent,
+        'methods': {
+            method: {
+                'completed': len(entry['ttlt']),
+                'errors': entry['errors'],
+                'ttft': _summary(entry['ttft']),
+                'ttlt': _summary(entry['ttlt']),
+                'chart': _summary(entry['chart']) if entry['chart'] else None,
+            }
+            for method, entry in stats.items()
+        },
+    }
+
+
+def format_report(report: Dict) -> str:
+    """格式化为终端表格"""
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:.0f}"
+
+    lines = [
+        f"👥 并发用户：{report['users']}，每人 {report['iterations']} 轮，耗时 {report['wall_seconds']:.2f} 秒",
+        f"🚀 吞吐量：{report['throughput']:.2f} 次/秒（完成 {report['completed']}，失败 {report['errors']}）",
+        f"💾 峰值内存：{report['peak_rss_mb']:.1f} MB    🖥 CPU：{report['cpu_seconds']:.2f} 秒"
+        f"（{report['cpu_percent']:.0f}%）",
+        "",
+        f"{'方式':<6}{'完成':>6}{'失败':>6}   {'TTFT p50/p95/p99 (ms)':>24}   {'TTLT p50/p95/p99 (ms)':>24}",
+    ]
+    for method, entry in report['methods'].items():
+        ttft = "/".join(ms(entry['ttft'][k]) for k in ('p50', 'p95', 'p99'))
+        ttlt = "/".join(ms(entry['ttlt'][k]) for k in ('p50', 'p95', 'p99'))
+        line = f"{method:<6}{entry['completed']:>6}{entry['errors']:>6}   {ttft:>24}   {ttlt:>24}"
+        if entry['chart'] is not None:
+            line += f"   图表 p50/p95 {ms(entry['chart']['p50'])}/{ms(entry['chart']['p95'])} ms"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="占卜流程并发压测")
+    parser.add_argument('--users', type=int, default=10, help="并发用户数")
+    parser.add_argument('--iterations', type=int, default=3, help="每个用户轮流使用全部占卜方式的轮数")
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=METHODS)
+    parser.add_argument('--base-url', default=None, help="上游地址，不指定时启动内置模拟服务")
+    parser.add_argument('--mock-profile', default='fast', help="内置模拟服务的延迟配置")
+    parser.add_argument('--api-key', default=None)
+    parser.add_argument('--charts', action='store_true', help="同时渲染图表")
+    parser.add_argument('--json', action='store_true', help="输出JSON格式的报告")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    api_key = args.api_key
+    if base_url is None:
+        from mock_server import MockServer, PROFILES
+        server = MockServer(PROFILES[args.mock_profile]).start()
+        base_url = server.base_url
+        api_key = api_key or "mock"
+
+    # 关闭请求合并，每个用户的请求都真实到达上游
+    factory = lambda: DivinationAgent(api_key=api_key, base_url=base_url, coalesce=False)
+    try:
+        report = run_load_test(factory, args.users, args.iterations, args.methods, args.charts)
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
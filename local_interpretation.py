@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模板解读模块
+AI模型不可用（熔断打开或调用失败）时，根据已经算出的卦象数据
+在本地即时拼出一份模板化的解读，保证用户总能拿到结果
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import hexagrams
+
+# 提示用户当前内容不是AI生成的
+LOCAL_NOTICE = "（AI服务暂时繁忙，以下为根据卦象生成的本地解读）\n\n"
+
+HEXAGRAM_MEANINGS: Dict[str, Tuple[str, str]] = {
+    "乾卦": ("刚健中正，自强不息，主事业上升、主动进取", "宜积极行动、把握主动，但要防止刚愎自用"),
+    "姤卦": ("不期而遇，阴始生于下，主机缘突至、人际变化", "宜审慎对待突如其来的机会与邀约，守住原则"),
+    "同人卦": ("与人同心，志同道合，主合作顺利、得人相助", "宜广结善缘、寻求合作，以诚待人"),
+    "大有卦": ("火在天上，普照万物，主收获丰盛、名利双收", "宜乘势而为，同时谦逊分享，切忌骄满"),
+    "履卦": ("如履虎尾，小心行事，主处境需谨慎、依礼而行", "宜循规蹈矩、步步为营，不可冒进"),
+    "小畜卦": ("密云不雨，蓄而未发，主积累阶段、时机未到", "宜耐心积蓄力量，做好准备等待时机"),
+    "需卦": ("云上于天，等待时机，主暂缓、需要耐心", "宜静待时机、养精蓄锐，不要急于求成"),
+    "大畜卦": ("山中藏天，厚积薄发，主大有积累、可成大事", "宜充实自己、稳健投入，时机成熟即可大展身手"),
+}
+
+STEM_MEANINGS: Dict[str, str] = {
+    "甲": "阳木，如参天大树，主进取、担当", "乙": "阴木，如花草藤蔓，主柔韧、变通",
+    "丙": "阳火，如太阳，主热情、光明", "丁": "阴火，如烛光，主细腻、洞察",
+    "戊": "阳土，如高山，主稳重、诚信", "己": "阴土，如田园，主包容、务实",
+    "庚": "阳金，如刀剑，主果断、变革", "辛": "阴金，如珠玉，主精致、自省",
+    "壬": "阳水，如江河，主智慧、开拓", "癸": "阴水，如雨露，主灵动、滋养",
+}
+
+BRANCH_MEANINGS: Dict[str, str] = {
+    "子": "属水，生肖鼠，主机敏与新的开端", "丑": "属土，生肖牛，主勤恳与积累",
+    "寅": "属木，生肖虎，主勇气与开创", "卯": "属木，生肖兔，主温和与成长",
+    "辰": "属土，生肖龙，主变化与机遇", "巳": "属火，生肖蛇，主智慧与谋划",
+    "午": "属火，生肖马，主活力与行动", "未": "属土，生肖羊，主平和与人缘",
+    "申": "属金，生肖猴，主灵活与应变", "酉": "属金，生肖鸡，主条理与收获",
+    "戌": "属土，生肖狗，主忠诚与守成", "亥": "属水，生肖猪，主福气与休整",
+}
+
+# 三爻卦，按（初爻，二爻，三爻）1为阳、0为阴
+TRIGRAMS: Dict[str, Tuple[str, str]] = {
+    "111": ("乾", "天，刚健"), "110": ("兑", "泽，喜悦"), "101": ("离", "火，光明"),
+    "100": ("震", "雷，奋起"), "011": ("巽", "风，顺入"), "010": ("坎", "水，险陷"),
+    "001": ("艮", "山，止静"), "000": ("坤", "地，柔顺"),
+}
+
+STAR_MEANINGS: Dict[str, str] = {
+    "紫微星": "帝星，主尊贵、领导力与统筹全局",
+    "天机星": "智慧之星，主谋略、变动与善于思考",
+    "太阳星": "光明之星，主热情、付出与声名",
+    "武曲星": "财星，主执行力、财富与刚毅",
+    "天同星": "福星，主安逸、人缘与知足常乐",
+    "廉贞星": "囚星，主自律、原则与感情浓烈",
+}
+
+PALACE_MEANINGS: Dict[str, str] = {
+    "命宫": "个人性格与人生格局", "兄弟宫": "手足与朋友关系",
+    "夫妻宫": "感情与婚姻", "子女宫": "子女、晚辈与创造力",
+    "财帛宫": "财运与理财方式", "疾厄宫": "健康与身心状态",
+}
+
+
+def _plum_blossom(cast: str) -> List[str]:
+    hexagram = cast.split(' ', 1)[0]
+    if hexagram in HEXAGRAM_MEANINGS:
+        meaning, advice = HEXAGRAM_MEANINGS[hexagram]
+        return [f"所得{hexagram}：{meaning}。", advice]
+    value = hexagrams.BY_NAME[hexagram]
+    upper_name, upper_image = TRIGRAMS[format(hexagrams.UPPER[value], '03b')[::-1]]
+    lower_name, lower_image = TRIGRAMS[format(hexagrams.LOWER[value], '03b')[::-1]]
+    return [f"所得{hexagram}（{hexagrams.FULL_NAMES[value]}），上卦为{upper_name}（{upper_image}），"
+            f"下卦为{lower_name}（{lower_image}）。", "宜稳中求进，保持平常心"]
+
+
+def _heavenly_stems_earthly_branches(cast: str) -> List[str]:
+    stem, branch = cast.split(',', 1)[0].split(' ', 1)
+    return [f"天干{stem}为{STEM_MEANINGS.get(stem, '')}；地支{branch}{BRANCH_MEANINGS.get(branch, '')}。"
+            f"{stem}{branch}相合，刚柔相济，内外呼应。",
+            "宜发挥天干所示的长处，借地支所示的时运顺势而为"]
+
+
+def _six_yao(cast: str) -> List[str]:
+    lower_name, lower_image = TRIGRAMS[cast[:3]]
+    upper_name, upper_image = TRIGRAMS[cast[3:6]]
+    yang = cast.count('1')
+    if yang >= 4:
+        tendency = "阳爻居多，气势刚健，事情主动推进的力量较强"
+        advice = "宜主动出击，但注意刚柔并济、留有余地"
+    elif yang <= 2:
+        tendency = "阴爻居多，气势柔顺，宜守不宜攻"
+        advice = "宜以静制动、积蓄力量，等待转机"
+    else:
+        tendency = "阴阳均衡，进退皆有余地"
+        advice = "宜审时度势，在稳定中寻求突破"
+    value = int(cast[:6][::-1], 2)
+    return [f"得{hexagrams.NAMES[value]}（{hexagrams.FULL_NAMES[value]}），下卦为{lower_name}（{lower_image}），"
+            f"上卦为{upper_name}（{upper_image}）。{tendency}。", advice]
+
+
+def _purple_star(cast: str) -> List[str]:
+    star, palace = cast.split(' ', 1)
+    return [f"{star}为{STAR_MEANINGS.get(star, '')}，落于{palace}，主要影响{PALACE_MEANINGS.get(palace, '')}。",
+            f"在{PALACE_MEANINGS.get(palace, '相关方面')}上多加用心，发挥{star}的长处"]
+
+
+_BUILDERS: Dict[str, Callable[[str], List[str]]] = {
+    "梅花易数": _plum_blossom,
+    "天干地支": _heavenly_stems_earthly_branches,
+    "六爻": _six_yao,
+    "紫微斗数": _purple_star,
+}
+
+
+def local_interpretation(divination_type: str, cast: Optional[str], question: str, result: str = "") -> str:
+    """根据卦象键生成本地模板解读，无法识别的卦象退回占卜结果原文"""
+    builder = _BUILDERS.get(divination_type)
+    try:
+        analysis, advice = builder(cast) if builder and cast else (None, None)
+    except (KeyError, ValueError):
+        analysis, advice = None, None
+    if analysis is None:
+        analysis = f"本次{divination_type}的结果如下：{result.strip()}"
+        advice = "宜保持平常心，顺势而为"
+
+    return (f"1. 卦象解析\n{analysis}\n\n"
+            f"2. 对您问题的回答\n关于「{question.strip()}」，此卦提示：{advice}。\n\n"
+            f"3. 建议\n凡事顺其自然、量力而行，卦象只是参考，最终的选择仍在于您自己。"
+            f"AI服务恢复后可再次占卜获得更详细的解读。")
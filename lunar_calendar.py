@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+农历模块
+每个农历年用一个整数记录各月大小和闰月（1900~2100年共201个）：
+低4位为闰月月份（0为无闰月），第16-m位为第m月的大小（1为大月30天，0为小月29天），
+第16位为闰月的大小。导入时由此展开为按顺序排列的各月首日偏移（自1900年正月初一起的天数），
+公历与农历的互相换算都是常数次数组访问，to_lunar_array / to_solar_array 用 NumPy 整体换算日期数组
+"""
+
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+# 农历1900年正月初一
+BASE_DATE = date(1900, 1, 31)
+
+LUNAR_INFO = (
+    0x04bd8, 0x04ae0, 0x0a570, 0x054d5, 0x0d260, 0x0d950, 0x16554, 0x056a0, 0x09ad0, 0x055d2,  # 1900~1909
+    0x04ae0, 0x0a5b6, 0x0a4d0, 0x0d250, 0x1d255, 0x0b540, 0x0d6a0, 0x0ada2, 0x095b0, 0x14977,  # 1910~1919
+    0x04970, 0x0a4b0, 0x0b4b5, 0x06a50, 0x06d40, 0x1ab54, 0x02b60, 0x09570, 0x052f2, 0x04970,  # 1920~1929
+    0x06566, 0x0d4a0, 0x0ea50, 0x16a95, 0x05ad0, 0x02b60, 0x186e3, 0x092e0, 0x1c8d7, 0x0c950,  # 1930~1939
+    0x0d4a0, 0x1d8a6, 0x0b550, 0x056a0, 0x1a5b4, 0x025d0, 0x092d0, 0x0d2b2, 0x0a950, 0x0b557,  # 1940~1949
+    0x06ca0, 0x0b550, 0x15355, 0x04da0, 0x0a5b0, 0x14573, 0x052b0, 0x0a9a8, 0x0e950, 0x06aa0,  # 1950~1959
+    0x0aea6, 0x0ab50, 0x04b60, 0x0aae4, 0x0a570, 0x05260, 0x0f263, 0x0d950, 0x05b57, 0x056a0,  # 1960~1969
+    0x096d0, 0x04dd5, 0x04ad0, 0x0a4d0, 0x0d4d4, 0x0d250, 0x0d558, 0x0b540, 0x0b6a0, 0x195a6,  # 1970~1979
+    0x095b0, 0x049b0, 0x0a974, 0x0a4b0, 0x0b27a, 0x06a50, 0x06d40, 0x0af46, 0x0ab60, 0x09570,  # 1980~1989
+    0x04af5, 0x04970, 0x064b0, 0x074a3, 0x0ea50, 0x06b58, 0x05ac0, 0x0ab60, 0x096d5, 0x092e0,  # 1990~1999
+    0x0c960, 0x0d954, 0x0d4a0, 0x0da50, 0x07552, 0x056a0, 0x0abb7, 0x025d0, 0x092d0, 0x0cab5,  # 2000~2009
+    0x0a950, 0x0b4a0, 0x0baa4, 0x0ad50, 0x055d9, 0x04ba0, 0x0a5b0, 0x15176, 0x052b0, 0x0a930,  # 2010~2019
+    0x07954, 0x06aa0, 0x0ad50, 0x05b52, 0x04b60, 0x0a6e6, 0x0a4e0, 0x0d260, 0x0ea65, 0x0d530,  # 2020~2029
+    0x05aa0, 0x076a3, 0x096d0, 0x04afb, 0x04ad0, 0x0a4d0, 0x1d0b6, 0x0d250, 0x0d520, 0x0dd45,  # 2030~2039
+    0x0b5a0, 0x056d0, 0x055b2, 0x049b0, 0x0a577, 0x0a4b0, 0x0aa50, 0x1b255, 0x06d20, 0x0ada0,  # 2040~2049
+    0x14b63, 0x09370, 0x049f8, 0x04970, 0x064b0, 0x168a6, 0x0ea50, 0x06b20, 0x1a6c4, 0x0aae0,  # 2050~2059
+    0x092e0, 0x0d2e3, 0x0c960, 0x0d557, 0x0d4a0, 0x0da50, 0x05d55, 0x056a0, 0x0a6d0, 0x055d4,  # 2060~2069
+    0x052d0, 0x0a9b8, 0x0a950, 0x0b4a0, 0x0b6a6, 0x0ad50, 0x055a0, 0x0aba4, 0x0a5b0, 0x052b0,  # 2070~2079
+    0x0b273, 0x06930, 0x07337, 0x06aa0, 0x0ad50, 0x14b55, 0x04b60, 0x0a570, 0x054e4, 0x0d160,  # 2080~2089
+    0x0e968, 0x0d520, 0x0daa0, 0x16aa6, 0x056d0, 0x04ae0, 0x0a9d4, 0x0a2d0, 0x0d150, 0x0f252,  # 2090~2099
+    0x0d520,  # 2100
+)
+
+MONTH_NAMES = ["正", "二", "三", "四", "五", "六", "七", "八", "九", "十", "冬", "腊"]
+DAY_NAMES = (["初" + n for n in "一二三四五六七八九十"] + ["十" + n for n in "一二三四五六七八九"] + ["二十"]
+             + ["廿" + n for n in "一二三四五六七八九"] + ["三十"])
+
+# 朔望月平均天数，用于直接估算所在的月
+_MEAN_MONTH = 29.530588
+
+
+def leap_month(year: int) -> int:
+    """闰月月份，没有闰月为0"""
+    return LUNAR_INFO[year - FIRST_YEAR] & 0xf
+
+
+def month_days(year: int, month: int, leap: bool = False) -> int:
+    """农历某月的天数"""
+    info = LUNAR_INFO[year - FIRST_YEAR]
+    return 30 if info & (0x10000 if leap else 0x10000 >> month) else 29
+
+
+def _months(year: int) -> List[Tuple[int, bool]]:
+    """某年各月按顺序排列的（月份，是否闰月）"""
+    months = []
+    for month in range(1, 13):
+        months.append((month, False))
+        if month == leap_month(year):
+            months.append((month, True))
+    return months
+
+
+def _build_tables():
+    starts, years, months, leaps, first_month = [], [], [], [], []
+    offset = 0
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        first_month.append(len(starts))
+        for month, leap in _months(year):
+            starts.append(offset)
+            years.append(year)
+            months.append(month)
+            leaps.append(leap)
+            offset += month_days(year, month, leap)
+    # 末尾哨兵：2100年之后第一个月的首日
+    starts.append(offset)
+    return starts, years, months, leaps, first_month
+
+
+_starts, _years, _months_of, _leaps, _first_month = _build_tables()
+_STARTS = np.array(_starts, dtype=np.int64)
+_YEARS = np.array(_years, dtype=np.int16)
+_MONTHS = np.array(_months_of, dtype=np.int8)
+_LEAPS = np.array(_leaps, dtype=bool)
+_FIRST_MONTH = np.array(_first_month, dtype=np.int64)
+_LEAP_MONTH = np.array([info & 0xf for info in LUNAR_INFO], dtype=np.int64)
+_BASE_DAY = np.datetime64(BASE_DATE, 'D')
+_RANGE_ERROR = f"超出农历表范围（{FIRST_YEAR}年正月初一至{LAST_YEAR}年腊月）"
+
+
+def _month_index(days: int) -> int:
+    """所在农历月的序号：按朔望月平均长度估算后至多前后调整一次"""
+    if not 0 <= days < _starts[-1]:
+        raise ValueError(_RANGE_ERROR)
+    index = min(int(days / _MEAN_MONTH), len(_starts) - 2)
+    if _starts[index] > days:
+        index -= 1
+    elif _starts[index + 1] <= days:
+        index += 1
+    return index
+
+
+def to_lunar(day: date) -> Tuple[int, int, int, bool]:
+    """公历日期 -> 农历（年，月，日，是否闰月）"""
+    days = (day - BASE_DATE).days
+    index = _month_index(days)
+    return _years[index], _months_of[index], days - _starts[index] + 1, _leaps[index]
+
+
+def _solar_offset(year: int, month: int, day: int, leap: bool) -> int:
+    if not FIRST_YEAR <= year <= LAST_YEAR or not 1 <= month <= 12:
+        raise ValueError(_RANGE_ERROR)
+    if leap and leap_month(year) != month:
+        raise ValueError(f"农历{year}年没有闰{MONTH_NAMES[month - 1]}月")
+    if not 1 <= day <= month_days(year, month, leap):
+        raise ValueError(f"农历{year}年{'闰' if leap else ''}{MONTH_NAMES[month - 1]}月没有{day}日")
+    # 闰月及其后的月份在月序中后移一位
+    index = _first_month[year - FIRST_YEAR] + month - 1 + (leap or 0 < leap_month(year) < month)
+    return _starts[index] + day - 1
+
+
+def to_solar(year: int, month: int, day: int, leap: bool = False) -> date:
+    """农历（年，月，日，是否闰月） -> 公历日期"""
+    return BASE_DATE + timedelta(days=_solar_offset(year, month, day, leap))
+
+
+def format_lunar(year: int, month: int, day: int, leap: bool = False) -> str:
+    """农历日期的中文写法，例如 "正月初一"、"闰二月十五" """
+    return f"{'闰' if leap else ''}{MONTH_NAMES[month - 1]}月{DAY_NAMES[day - 1]}"
+
+
+def to_lunar_array(days) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """批量换算，days为公历日期的 datetime64 数组（或可转换为它的序列），返回（年，月，日，是否闰月）四个数组"""
+    offsets = (np.asarray(days, dtype='datetime64[D]') - _BASE_DAY).astype(np.int64)
+    if offsets.size and (offsets.min() < 0 or offsets.max() >= _STARTS[-1]):
+        raise ValueError(_RANGE_ERROR)
+    index = np.minimum((offsets / _MEAN_MONTH).astype(np.int64), len(_STARTS) - 2)
+    index -= _STARTS[index] > offsets
+    index += _STARTS[index + 1] <= offsets
+    return _YEARS[index], _MONTHS[index], (offsets - _STARTS[index] + 1).astype(np.int8), _LEAPS[index]
+
+
+def to_solar_array(years, months, days, leaps: Optional[np.ndarray] = None) -> np.ndarray:
+    """批量换算农历日期为公历 datetime64[D] 数组，不检查日期是否存在"""
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    leaps = np.zeros(years.shape, dtype=bool) if leaps is None else np.asarray(leaps, dtype=bool)
+    if years.size and (years.min() < FIRST_YEAR or years.max() > LAST_YEAR):
+        raise ValueError(_RANGE_ERROR)
+    leap_of_year = _LEAP_MONTH[years - FIRST_YEAR]
+    index = _FIRST_MONTH[years - FIRST_YEAR] + months - 1 + (leaps | ((leap_of_year > 0) & (leap_of_year < months)))
+    return _BASE_DAY + _STARTS[index] + np.asarray(days, dtype=np.int64) - 1
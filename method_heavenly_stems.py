@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+天干地支
+以十天干、十二地支组合起卦；指定时间时按干支历取当日日柱，并附上年、月、日、时四柱
+"""
+
+import random
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from batch_casting import CastBatch, pair_labels
+from casting import CastResult, HEAVENLY_STEMS, EARTHLY_BRANCHES
+from divination_methods import DivinationMethod, register
+from ganzhi_calendar import SEXAGENARY, pillars
+
+NAME = "天干地支"
+
+
+def cast(rng: random.Random, moment: Optional[datetime] = None) -> CastResult:
+    """天干地支起卦，moment为None时随机取干支，否则取该时间的日柱，numbers为四柱的干支序号"""
+    if moment is None:
+        return CastResult(NAME, (rng.choice(HEAVENLY_STEMS), rng.choice(EARTHLY_BRANCHES)))
+    four = pillars(moment)
+    return CastResult(NAME, tuple(SEXAGENARY[four[2]]), four)
+
+
+def batch(generator: np.random.Generator, count: int) -> CastBatch:
+    """批量起卦，symbols为（N，2）的下标数组"""
+    symbols = np.stack([generator.integers(0, len(HEAVENLY_STEMS), size=count, dtype=np.int8),
+                        generator.integers(0, len(EARTHLY_BRANCHES), size=count, dtype=np.int8)], axis=1)
+    outcomes = symbols[:, 0].astype(np.intp) * len(EARTHLY_BRANCHES) + symbols[:, 1]
+    return CastBatch(NAME, outcomes, pair_labels(HEAVENLY_STEMS, EARTHLY_BRANCHES), symbols=symbols)
+
+
+def texts(cast: CastResult) -> Tuple[str, str]:
+    stem, branch = cast.symbols
+    result = f"天干：{stem}\n地支：{branch}\n干支组合：{stem}{branch}\n"
+    if cast.numbers:
+        result += "四柱：" + " ".join(SEXAGENARY[index] + label for index, label in zip(cast.numbers, "年月日时")) + "\n"
+    prompt = f"""
+天干地支占卜结果：
+
+{result}"""
+    return prompt, result + "\n"
+
+
+def base_casts() -> Iterator[Tuple[str, str]]:
+    for stem in HEAVENLY_STEMS:
+        for branch in EARTHLY_BRANCHES:
+            cast = CastResult(NAME, (stem, branch))
+            yield cast.key, texts(cast)[0]
+
+
+def display(cast: CastResult) -> str:
+    stem, branch = cast.symbols
+    html = f"<div class='hexagram-display'>天干地支：{stem}{branch}</div>"
+    html += "<div class='visualization-container'>"
+    html += "<h3>📊 干支详情</h3>"
+    html += f"<p><strong>天干</strong>：{stem}</p>"
+    html += f"<p><strong>地支</strong>：{branch}</p>"
+    html += f"<p><strong>组合</strong>：{stem}{branch}</p>"
+    if cast.numbers:
+        four = " ".join(SEXAGENARY[index] + label for index, label in zip(cast.numbers, "年月日时"))
+        html += f"<p><strong>四柱</strong>：{four}</p>"
+    html += "</div>"
+    return html
+
+
+register(DivinationMethod(
+    NAME, cast, texts,
+    chart=lambda chart_generator, cast: chart_generator.generate_heavenly_stems_chart(*cast.symbols),
+    chart_title="天干地支关系图",
+    base_casts=base_casts,
+    batch=batch,
+    display=display,
+))
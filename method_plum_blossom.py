@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+梅花易数
+宋代邵雍所创，以数字起卦：第一数取上卦，第二数取下卦，三数之和定动爻；
+也可按年月日时起卦，同一时辰内起出的卦相同，卦象、提示词和图表按时辰复用
+"""
+
+import functools
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import hexagrams
+from batch_casting import CastBatch, plum_blossom_hexagrams
+from casting import CastResult, EARTHLY_BRANCHES
+from divination_methods import DivinationMethod, register
+from ganzhi_calendar import BEIJING
+from lunar_calendar import MONTH_NAMES, DAY_NAMES, to_lunar
+
+NAME = "梅花易数"
+
+# 六十四卦卦名，按文王卦序排列
+HEXAGRAM_NAMES = [hexagrams.NAMES[hexagrams.BY_KING_WEN[number]] for number in range(1, 65)]
+
+
+def hexagram_name(numbers: List[int]) -> str:
+    """根据起卦数字得到卦名"""
+    value, _ = hexagrams.plum_blossom(numbers)
+    return hexagrams.NAMES[value]
+
+
+def hexagram(cast: CastResult) -> Tuple[int, int]:
+    """起卦结果的（卦值，动爻掩码）：三个数为数字起卦，四个数为年月日时起卦"""
+    if len(cast.numbers) == 4:
+        return hexagrams.plum_blossom_time(*cast.numbers)
+    return hexagrams.plum_blossom(cast.numbers)
+
+
+def time_bucket(moment: datetime) -> Tuple[int, int, int, bool, int]:
+    """起卦时间所在的（农历年，月，日，是否闰月，时支数），子时从23点起算作次日"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(BEIJING).replace(tzinfo=None)
+    shifted = moment + timedelta(hours=1)
+    return to_lunar(shifted.date()) + (shifted.hour // 2 + 1,)
+
+
+@functools.lru_cache(maxsize=256)
+def _time_cast(year: int, month: int, day: int, leap: bool, hour: int) -> Tuple[Tuple[str], Tuple[int, ...]]:
+    """按时辰缓存年月日时起卦的（卦名，起卦数），起卦数为（年支数，月，日，时支数），闰月按本月数"""
+    numbers = ((year - 4) % 12 + 1, month, day, hour)
+    value, _ = hexagrams.plum_blossom_time(*numbers)
+    return (hexagrams.NAMES[value],), numbers
+
+
+def cast(rng: random.Random, moment: Optional[datetime] = None) -> CastResult:
+    """梅花易数起卦，moment为None时随机取三个数，否则按该时间年月日时起卦"""
+    if moment is not None:
+        return CastResult(NAME, *_time_cast(*time_bucket(moment)))
+    numbers = tuple(rng.randint(1, 8) for _ in range(3))
+    return CastResult(NAME, (hexagram_name(numbers),), numbers)
+
+
+def batch(generator: np.random.Generator, count: int) -> CastBatch:
+    """批量起卦，起卦数字为（N，3）的int8数组"""
+    numbers = generator.integers(1, 9, size=(count, 3), dtype=np.int8)
+    values, moving = plum_blossom_hexagrams(numbers)
+    return CastBatch(NAME, values, hexagrams.NAMES, numbers=numbers, moving=moving)
+
+
+def _numbers_text(numbers: Tuple[int, ...]) -> str:
+    if len(numbers) == 4:
+        year, month, day, hour = numbers
+        return (f"起卦时间：{EARTHLY_BRANCHES[year - 1]}年{MONTH_NAMES[month - 1]}月{DAY_NAMES[day - 1]}"
+                f"{EARTHLY_BRANCHES[hour - 1]}时（年{year}、月{month}、日{day}、时{hour}）")
+    return f"数字：{numbers[0]}, {numbers[1]}, {numbers[2]}"
+
+
+# 起卦结果按卦象比较（不含种子），同一时辰的占卜共用同一份文本
+@functools.lru_cache(maxsize=1024)
+def texts(cast: CastResult) -> Tuple[str, str]:
+    name, = cast.symbols
+    value, mask = hexagram(cast)
+    info = hexagrams.describe(value, mask)
+    details = "\n".join(f"{label}：{text}" for label, text in info.items() if label != '本卦')
+    numbers = _numbers_text(cast.numbers)
+    prompt = f"""
+梅花易数占卜结果：
+
+卦象：{name}
+{numbers}
+{details}
+"""
+    header = f"占卜结果：{name}\n{numbers}\n动爻：{info['动爻']}　变卦：{info['变卦']}\n\n"
+    return prompt, header
+
+
+def base_casts() -> Iterator[Tuple[str, str]]:
+    """通用解读只区分卦名，不区分起卦数字"""
+    for name in HEXAGRAM_NAMES:
+        yield name, f"\n梅花易数占卜结果：\n\n卦象：{name}\n"
+
+
+def chart(chart_generator, cast: CastResult) -> str:
+    labels = ['Year', 'Month', 'Day', 'Hour'] if len(cast.numbers) == 4 else None
+    return chart_generator.generate_plum_blossom_chart(list(cast.numbers), labels)
+
+
+def display(cast: CastResult) -> str:
+    value, mask = hexagram(cast)
+    if len(cast.numbers) == 4:
+        labels = ["年支数", "月", "日", "时支数"]
+    else:
+        labels = ["数字1", "数字2", "数字3"]
+    html = f"<div class='hexagram-display'>梅花易数：{cast.symbols[0]}</div>"
+    html += "<div class='visualization-container'>"
+    html += "<h3>📊 数字详情</h3>"
+    for label, number in zip(labels, cast.numbers):
+        html += f"<p><strong>{label}</strong>：{number}</p>"
+    html += (f"<p><strong>卦象</strong>：上卦{hexagrams.TRIGRAM_NAMES[hexagrams.UPPER[value]]}，"
+             f"下卦{hexagrams.TRIGRAM_NAMES[hexagrams.LOWER[value]]}，"
+             f"{hexagrams.LINE_NAMES[hexagrams.moving_lines(mask)[0] - 1]}动，"
+             f"变{hexagrams.NAMES[value ^ mask]}</p>")
+    html += "</div>"
+    return html
+
+
+register(DivinationMethod(
+    NAME, cast, texts,
+    chart=chart,
+    chart_title="梅花易数数字分布",
+    base_casts=base_casts,
+    batch=batch,
+    display=display,
+))
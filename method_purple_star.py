@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+紫微斗数
+传统命理学，分析星曜分布
+"""
+
+import random
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from batch_casting import CastBatch, pair_labels
+from casting import CastResult
+from divination_methods import DivinationMethod, register
+
+NAME = "紫微斗数"
+
+STARS = ["紫微星", "天机星", "太阳星", "武曲星", "天同星", "廉贞星"]
+POSITIONS = ["命宫", "兄弟宫", "夫妻宫", "子女宫", "财帛宫", "疾厄宫"]
+
+
+def cast(rng: random.Random) -> CastResult:
+    """紫微斗数起盘"""
+    return CastResult(NAME, (rng.choice(STARS), rng.choice(POSITIONS)))
+
+
+def batch(generator: np.random.Generator, count: int) -> CastBatch:
+    """批量起卦，symbols为（N，2）的下标数组"""
+    symbols = np.stack([generator.integers(0, len(STARS), size=count, dtype=np.int8),
+                        generator.integers(0, len(POSITIONS), size=count, dtype=np.int8)], axis=1)
+    outcomes = symbols[:, 0].astype(np.intp) * len(POSITIONS) + symbols[:, 1]
+    return CastBatch(NAME, outcomes, pair_labels(STARS, POSITIONS), symbols=symbols)
+
+
+def texts(cast: CastResult) -> Tuple[str, str]:
+    star, position = cast.symbols
+    prompt = f"""
+紫微斗数占卜结果：
+
+主星：{star}
+宫位：{position}
+"""
+    return prompt, f"主星：{star}\n宫位：{position}\n\n"
+
+
+def base_casts() -> Iterator[Tuple[str, str]]:
+    for star in STARS:
+        for position in POSITIONS:
+            cast = CastResult(NAME, (star, position))
+            yield cast.key, texts(cast)[0]
+
+
+# 紫微斗数没有图表
+register(DivinationMethod(NAME, cast, texts, base_casts=base_casts, batch=batch))
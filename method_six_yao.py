@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+六爻
+《易经》占卜法，六次起爻组成卦象，老阳、老阴为动爻，动爻变后得变卦
+"""
+
+import random
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+import hexagrams
+from batch_casting import CastBatch, lines_to_hexagrams
+from casting import CastResult
+from divination_methods import DivinationMethod, register
+from line_models import get_model
+
+NAME = "六爻"
+
+
+def cast(rng: random.Random, model: Optional[str] = None) -> CastResult:
+    """六爻起卦，从初爻到上爻（6老阴，7少阳，8少阴，9老阳）
+
+    model为起爻方式（均匀、铜钱、蓍草，见 line_models），默认均匀
+    """
+    table = get_model(model)
+    if table is get_model():
+        # 默认的均匀起爻仍用 randint，同一种子起出的卦与引入起爻模型之前相同
+        return CastResult(NAME, numbers=tuple(rng.randint(6, 9) for _ in range(6)))
+    return CastResult(NAME, numbers=tuple(table.draw(rng) for _ in range(6)))
+
+
+def batch(generator: np.random.Generator, count: int, model: Optional[str] = None) -> CastBatch:
+    """批量起卦，爻值为（N，6）的int8数组"""
+    table = get_model(model)
+    if table is get_model():
+        lines = generator.integers(6, 10, size=(count, 6), dtype=np.int8)
+    else:
+        lines = table.sample(generator, (count, 6))
+    values, moving = lines_to_hexagrams(lines)
+    return CastBatch(NAME, values, hexagrams.NAMES, numbers=lines, moving=moving)
+
+
+def texts(cast: CastResult) -> Tuple[str, str]:
+    value, mask = hexagrams.from_lines(cast.numbers)
+    # 倒序显示（从下到上），动爻标注老阳○、老阴×
+    marks = {9: " ○", 6: " ×"}  # 动爻：老阳○、老阴×
+    hexagram = "\n".join(line + marks.get(number, "")
+                         for line, number in zip(cast.yao_lines[::-1], cast.numbers[::-1]))
+    info = hexagrams.describe(value, mask)
+    details = "\n".join(f"{label}：{text}" for label, text in info.items())
+    prompt = f"""
+六爻占卜结果：
+
+卦象：
+{hexagram}
+{details}
+"""
+    header = f"六爻卦象：{hexagrams.NAMES[value]}"
+    if mask:
+        header += f" → {hexagrams.NAMES[value ^ mask]}（{info['动爻']}动）"
+    return prompt, f"{header}\n{hexagram}\n\n"
+
+
+def base_casts() -> Iterator[Tuple[str, str]]:
+    """通用解读只区分本卦阴阳，不区分老少"""
+    for value in range(64):
+        cast = CastResult(NAME, numbers=tuple(hexagrams.to_lines(value)))
+        yield cast.key, texts(cast)[0]
+
+
+def display(cast: CastResult) -> str:
+    value, mask = hexagrams.from_lines(cast.numbers)
+    title = hexagrams.NAMES[value]
+    if mask:
+        title += f" → {hexagrams.NAMES[value ^ mask]}"
+    marks = {9: " ○", 6: " ×"}  # 动爻：老阳○、老阴×
+    html = f"<div class='hexagram-display'>六爻卦象：{title}</div>"
+    html += "<div class='visualization-container'>"
+    html += "<h3>📊 卦象展示</h3>"
+    for line, number in zip(reversed(cast.yao_lines), reversed(cast.numbers)):  # 从下到上显示
+        html += f"<div class='yao-line'>{line}{marks.get(number, '')}</div>"
+    html += "</div>"
+    return html
+
+
+register(DivinationMethod(
+    NAME, cast, texts,
+    chart=lambda chart_generator, cast: chart_generator.generate_six_yao_chart(cast.yao_lines),
+    chart_title="六爻卦象可视化",
+    base_casts=base_casts,
+    batch=batch,
+    display=display,
+))
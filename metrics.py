@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+监控指标模块
+以Prometheus文本格式在本地端口暴露占卜服务的运行指标：各占卜方式的请求数、
+大模型首token与总耗时直方图、输出token数、各类图表渲染耗时、缓存命中率、
+按类型统计的错误数以及正在进行的占卜数。
+指标来自 DivinationAgent 的分阶段耗时记录（timing.Trace）和 ChartGenerator 的渲染钩子
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import chart_generator
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN
+from timing import BUCKETS, Histogram, TimingRegistry, default_registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """采集时同步组件自己维护的累计值，该值只增不减"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class HistogramMetric(_Metric):
+    """分桶直方图，复用 timing.Histogram"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get(self, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def _render_samples(self, items) -> List[str]:
+        lines = []
+        for key, histogram in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{labels} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标集合，collector在每次抓取前刷新当前值类指标"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=BUCKETS) -> HistogramMetric:
+        return self._register(HistogramMetric(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """生成Prometheus文本格式"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for collector in collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("指标采集失败")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class DivinationMetrics:
+    """占卜服务的全部指标及其数据来源"""
+
+    def __init__(self, timing_registry: Optional[TimingRegistry] = None):
+        self.timing_registry = timing_registry if timing_registry is not None else default_registry
+        self.registry = MetricsRegistry()
+        r = self.registry
+
+        self.requests = r.counter('divination_requests_total', "完成的占卜次数", ('method', 'source'))
+        self.errors = r.counter('divination_errors_total', "按错误类型统计的失败次数", ('method', 'error'))
+        self.chunks = r.counter('divination_stream_chunks_total', "大模型流式输出的文本块数", ('method',))
+        self.llm_ttft = r.histogram('divination_llm_ttft_seconds', "大模型首token延迟", ('method',))
+        self.llm_duration = r.histogram('divination_llm_duration_seconds', "大模型完整输出耗时", ('method',))
+        self.reading_duration = r.histogram('divination_reading_duration_seconds', "一次占卜的总耗时", ('method',))
+        self.stage_duration = r.histogram('divination_stage_seconds', "占卜各阶段耗时", ('stage',))
+        self.chart_duration = r.histogram('divination_chart_render_seconds', "图表渲染耗时", ('chart',))
+        self.active = r.gauge('divination_active_readings', "正在进行（含流式输出中）的占卜数")
+
+        self.cache_lookups = r.counter('divination_cache_lookups_total', "解读缓存查询次数", ('result',))
+        self.cache_hit_ratio = r.gauge('divination_cache_hit_ratio', "解读缓存命中率（含相似问题命中）")
+        self.cache_entries = r.gauge('divination_cache_entries', "解读缓存条目数")
+        self.upstream_active = r.gauge('divination_upstream_active', "正在进行的上游请求数")
+        self.upstream_waiting = r.gauge('divination_upstream_waiting', "在限流器中排队的请求数")
+        self.circuit_open = r.gauge('divination_circuit_open', "上游熔断器状态（0关闭，0.5半开，1打开）")
+        self.hedge_fire_rate = r.gauge('divination_hedge_fire_rate', "最近请求中补发对冲请求的比例")
+        self.hedge_saved = r.gauge('divination_hedge_ttft_saved_seconds', "对冲节省的首token延迟（保守估计）",
+                                   ('quantile',))
+
+        self._cache = None
+        self._limiter = None
+        self._breaker = None
+        self._hedge = None
+        r.add_collector(self._collect)
+
+        self.timing_registry.add_listener(self.on_trace)
+        chart_generator.add_render_hook(self.on_chart)
+
+    def watch(self, cache=None, limiter=None, circuit_breaker=None, hedge_policy=None) -> None:
+        """登记需要在抓取时读取状态的共享组件"""
+        if cache is not None:
+            self._cache = cache
+        if limiter is not None:
+            self._limiter = limiter
+        if circuit_breaker is not None:
+            self._breaker = circuit_breaker
+        if hedge_policy is not None:
+            self._hedge = hedge_policy
+
+    def on_trace(self, record: Dict) -> None:
+        """一次占卜结束时更新指标"""
+        method = record.get('method', '')
+        stages = record.get('stages', {})
+        self.requests.inc(method=method, source=record.get('source', ''))
+        if record.get('error'):
+            self.errors.inc(method=method, error=record['error'])
+        if record.get('chunks'):
+            self.chunks.inc(record['chunks'], method=method)
+        if 'llm_ttft' in stages:
+            self.llm_ttft.observe(stages['llm_ttft'], method=method)
+        if 'llm_total' in stages:
+            self.llm_duration.observe(stages['llm_total'], method=method)
+        self.reading_duration.observe(record.get('total', 0.0), method=method)
+        for stage, seconds in stages.items():
+            if not stage.startswith('llm_'):
+                self.stage_duration.observe(seconds, stage=stage)
+
+    def on_chart(self, chart_type: str, seconds: float) -> None:
+        self.chart_duration.observe(seconds, chart=chart_type)
+
+    def _collect(self) -> None:
+        self.active.set(self.timing_registry.active)
+        if self._cache is not None:
+            self.cache_lookups.set_total(self._cache.hits, result='hit')
+            self.cache_lookups.set_total(self._cache.similar_hits, result='similar')
+            self.cache_lookups.set_total(self._cache.misses, result='miss')
+            self.cache_hit_ratio.set(self._cache.hit_ratio)
+            self.cache_entries.set(len(self._cache))
+        if self._limiter is not None:
+            stats = self._limiter.stats()
+            self.upstream_active.set(stats['active'])
+            self.upstream_waiting.set(stats['waiting'])
+        if self._breaker is not None:
+            self.circuit_open.set({CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}[self._breaker.state])
+        if self._hedge is not None:
+            stats = self._hedge.stats()
+            self.hedge_fire_rate.set(stats['fire_rate'])
+            self.hedge_saved.set(stats['saved_p95'], quantile='0.95')
+            self.hedge_saved.set(stats['saved_p99'], quantile='0.99')
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    def close(self) -> None:
+        """停止接收新的记录"""
+        self.timing_registry.remove_listener(self.on_trace)
+        chart_generator.remove_render_hook(self.on_chart)
+
+
+class MetricsServer:
+    """在后台线程中提供 /metrics 的HTTP服务"""
+
+    def __init__(self, metrics: DivinationMetrics, host: str = '127.0.0.1', port: int = 9108):
+        self.metrics = metrics
+        self._server = ThreadingHTTPServer((host, port), _make_handler(metrics))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> 'MetricsServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _make_handler(metrics: DivinationMetrics):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_metrics_server(host: str = '127.0.0.1', port: int = 9108, cache=None, limiter=None,
+                         circuit_breaker=None, hedge_policy=None) -> MetricsServer:
+    """创建指标并在后台启动 /metrics 服务"""
+    metrics = DivinationMetrics()
+    metrics.watch(cache, limiter, circuit_breaker, hedge_policy)
+    return MetricsServer(metrics, host, port).start()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟ModelScope服务
+实现OpenAI兼容的 /v1/chat/completions（含SSE流式输出）和 /v1/models，
+首token延迟、输出速度、错误率和429注入均可配置，用于离线压测和复现上游行为。
+
+用法：
+    python mock_server.py --port 8001 --profile typical
+    MODELSCOPE_BASE_URL=http://127.0.0.1:8001/v1 streamlit run app.py
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+# 模拟输出的文本素材，按1~2个字切分为token
+SAMPLE_TEXT = (
+    "此卦象显示您当前正处于一个积累与转变的阶段。从卦象来看，上卦主外，下卦主内，"
+    "内外相应，说明您的努力终将得到回报。在事业方面，宜稳扎稳打，不宜冒进；"
+    "在财运方面，正财稳定，偏财需谨慎；在感情方面，真诚沟通是关键；"
+    "在健康方面，注意作息规律，劳逸结合。建议您保持耐心，把握时机，顺势而为。"
+)
+
+
+class LatencyProfile:
+    """模拟上游的延迟与故障特征"""
+
+    def __init__(self, ttft: float = 0.5, ttft_jitter: float = 0.0, tokens_per_second: float = 40.0,
+                 output_tokens: int = 300, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, max_concurrent: Optional[int] = None):
+        """ttft为首token延迟秒数（另加0~ttft_jitter的随机抖动），tokens_per_second为输出速度，
+        error_rate为返回500的概率，rate_limit_rate为返回429的概率，
+        max_concurrent为同时进行的请求上限，超出时同样返回429
+        """
+        self.ttft = ttft
+        self.ttft_jitter = ttft_jitter
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+
+
+# 预置的延迟配置
+PROFILES: Dict[str, LatencyProfile] = {
+    "instant": LatencyProfile(ttft=0.0, tokens_per_second=0, output_tokens=60),
+    "fast": LatencyProfile(ttft=0.2, tokens_per_second=200, output_tokens=200),
+    "typical": LatencyProfile(ttft=1.5, ttft_jitter=1.0, tokens_per_second=40, output_tokens=600),
+    "degraded": LatencyProfile(ttft=8.0, ttft_jitter=6.0, tokens_per_second=10, output_tokens=600,
+                               error_rate=0.2, rate_limit_rate=0.1),
+    "throttled": LatencyProfile(ttft=1.0, tokens_per_second=40, output_tokens=400, max_concurrent=4,
+                                retry_after=2.0),
+}
+
+
+def tokenize(text: str, count: int, rng: random.Random) -> Iterator[str]:
+    """循环使用素材文本，产出count个1~2字的token"""
+    source = itertools.cycle(text)
+    for _ in range(count):
+        yield ''.join(next(source) for _ in range(rng.randint(1, 2)))
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, host: str = '127.0.0.1', port: int = 0,
+                 seed: Optional[int] = None):
+        """port为0时自动选择空闲端口；运行期间可以直接替换profile"""
+        self.profile = profile or PROFILES["fast"]
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self._ids = itertools.count(1)
+
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _admit(self) -> Optional[int]:
+        """决定本次请求是否注入错误，返回错误状态码或None（放行并计入在途请求）"""
+        profile = self.profile
+        with self._lock:
+            self.requests += 1
+            roll = self.rng.random()
+            if roll < profile.rate_limit_rate or (
+                    profile.max_concurrent is not None and self.active >= profile.max_concurrent):
+                self.rate_limited += 1
+                return 429
+            if roll < profile.rate_limit_rate + profile.error_rate:
+                self.errors += 1
+                return 500
+            self.active += 1
+            return None
+
+    def _finish(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def _ttft(self) -> float:
+        profile = self.profile
+        with self._lock:
+            return profile.ttft + self.rng.uniform(0, profile.ttft_jitter)
+
+    def _tokens(self, max_tokens: Optional[int]) -> Iterator[str]:
+        count = self.profile.output_tokens
+        if max_tokens:
+            count = min(count, max_tokens)
+        with self._lock:
+            seed = self.rng.random()
+        return tokenize(SAMPLE_TEXT, count, random.Random(seed))
+
+    def _next_id(self) -> str:
+        with self._lock:
+            return f"chatcmpl-mock-{next(self._ids)}"
+
+
+def _make_handler(server: MockServer):
+    class Handler(BaseHTTPRequestHandler):
+        # 使用HTTP/1.1以支持长连接，流式响应使用分块传输
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+            self._send_json(status, {'error': {'message': message, 'type': 'mock_error', 'code': status}}, headers)
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/v1/models':
+                self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model'}]})
+            else:
+                self._send_error(404, f"未知路径：{self.path}")
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_error(400, "请求体不是合法的JSON")
+                return
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self._send_error(404, f"未知路径：{self.path}")
+                return
+            if not self.headers.get('Authorization'):
+                self._send_error(401, "缺少API密钥")
+                return
+
+            status = server._admit()
+            if status == 429:
+                self._send_error(429, "请求频率过高", {'Retry-After': f"{server.profile.retry_after:g}"})
+                return
+            if status == 500:
+                self._send_error(500, "模拟的上游错误")
+                return
+
+            try:
+                if body.get('stream'):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端中途断开（例如对冲请求的落败方被取消）
+                self.close_connection = True
+            finally:
+                server._finish()
+
+        def _delay(self, seconds: float) -> None:
+            if seconds > 0:
+                time.sleep(seconds)
+
+        def _complete(self, body: Dict) -> None:
+            tokens = list(server._tokens(body.get('max_tokens')))
+            tps = server.profile.tokens_per_second
+            self._delay(server._ttft() + (len(tokens) / tps if tps else 0))
+            self._send_json(200, {
+                'id': server._next_id(),
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+            })
+
+        def _stream(self, body: Dict) -> None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            completion_id = server._next_id()
+            created = int(time.time())
+            model = body.get('model', 'mock')
+
+            def event(delta: Dict, finish_reason: Optional[str] = None) -> None:
+                payload = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': created,
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                }
+                self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+            self._delay(server._ttft())
+            tps = server.profile.tokens_per_second
+            for i, token in enumerate(server._tokens(body.get('max_tokens'))):
+                if i:
+                    self._delay(1 / tps if tps else 0)
+                event({'role': 'assistant', 'content': token} if i == 0 else {'content': token})
+            event({}, 'stop')
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟ModelScope的OpenAI兼容接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='typical')
+    parser.add_argument('--ttft', type=float, help="首token延迟（秒）")
+    parser.add_argument('--ttft-jitter', type=float, help="首token延迟的随机抖动上限（秒）")
+    parser.add_argument('--tps', type=float, help="每秒输出的token数，0为不限速")
+    parser.add_argument('--tokens', type=int, help="每次输出的token数")
+    parser.add_argument('--error-rate', type=float, help="返回500的概率")
+    parser.add_argument('--rate-limit-rate', type=float, help="返回429的概率")
+    parser.add_argument('--retry-after', type=float, help="429响应的Retry-After秒数")
+    parser.add_argument('--max-concurrent', type=int, help="同时进行的请求上限，超出返回429")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    base = PROFILES[args.profile]
+    overrides = {
+        'ttft': args.ttft, 'ttft_jitter': args.ttft_jitter, 'tokens_per_second': args.tps,
+        'output_tokens': args.tokens, 'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate,
+        'retry_after': args.retry_after, 'max_concurrent': args.max_concurrent,
+    }
+    settings = dict(vars(base))
+    settings.update({name: value for name, value in overrides.items() if value is not None})
+
+    server = MockServer(LatencyProfile(**settings), args.host, args.port, args.seed).start()
+    print(f"🚀 模拟服务已启动：{server.base_url}（配置：{args.profile}）")
+    print(f"   MODELSCOPE_BASE_URL={server.base_url} streamlit run app.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+占卜流水线模块
+起卦完成后立即在后台线程中开始消费AI解读流，界面线程同时渲染图表和卦象，
+大模型的首token等待与本地的图表渲染互相重叠。
+Streamlit的界面元素只能在脚本线程中更新，后台线程把文本段、排队和阶段进度作为事件放入队列，
+由脚本线程按顺序取出并刷新界面
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 事件类型
+CHUNK = "chunk"    # 一段输出文本
+QUEUE = "queue"    # 上游排队进度（位置，预计等待秒数）
+PROGRESS = "progress"  # 流水线阶段完成（阶段名）
+CHART = "chart"    # 图表渲染结束（Future）
+TICK = "tick"      # 等待超过tick秒仍没有新事件
+ERROR = "error"    # 流中抛出的异常
+DONE = "done"      # 流结束
+
+Event = Tuple[str, object]
+
+
+class BackgroundStream:
+    """在后台线程中提前消费流式输出，调用方线程按顺序读取事件"""
+
+    def __init__(self, name: str = "divination-stream"):
+        self._events: "queue.Queue[Event]" = queue.Queue()
+        self._closed = threading.Event()
+        self._name = name
+        self._thread: Optional[threading.Thread] = None
+
+    def post(self, kind: str, payload: object = None) -> None:
+        """放入一个事件，可在任意线程调用"""
+        self._events.put((kind, payload))
+
+    def on_queue(self, position: int, wait: float) -> None:
+        """作为限流器的排队回调，把排队进度转交给调用方线程"""
+        self.post(QUEUE, (position, wait))
+
+    def track(self, trace, stages: Iterable[str]) -> None:
+        """trace中的指定阶段完成时放入进度事件"""
+        stages = frozenset(stages)
+        trace.add_observer(lambda name: self.post(PROGRESS, name) if name in stages else None)
+
+    def start(self, stream: Iterable[str]) -> 'BackgroundStream':
+        """在后台线程中开始消费stream"""
+        self._thread = threading.Thread(target=self._run, args=(stream,), daemon=True, name=self._name)
+        self._thread.start()
+        return self
+
+    def _run(self, stream: Iterable[str]) -> None:
+        iterator = iter(stream)
+        try:
+            for chunk in iterator:
+                self.post(CHUNK, chunk)
+                if self._closed.is_set():
+                    break
+        except BaseException as e:
+            self.post(ERROR, e)
+        finally:
+            # 提前关闭时让生成器执行清理（归还上游槽位、结束请求合并等）
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+            self.post(DONE)
+
+    def events(self, timeout: Optional[float] = None, tick: Optional[float] = None) -> Iterator[Event]:
+        """按顺序读取事件直到流结束，流中的异常在此重新抛出
+
+        timeout为等待单个事件的最长秒数，超时抛出 queue.Empty；
+        设置tick时每等待tick秒产出一个TICK事件，供调用方刷新按时间推进的界面
+        """
+        waited = 0.0
+        while True:
+            if tick is None:
+                kind, payload = self._events.get(timeout=timeout)
+            else:
+                try:
+                    kind, payload = self._events.get(timeout=tick)
+                except queue.Empty:
+                    waited += tick
+                    if timeout is not None and waited >= timeout:
+                        raise
+                    yield TICK, None
+                    continue
+                waited = 0.0
+            if kind == DONE:
+                return
+            if kind == ERROR:
+                raise payload
+            yield kind, payload
+
+    def close(self) -> None:
+        """不再需要后续输出（例如用户离开页面），后台线程在下一段文本后停止"""
+        self._closed.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class ProgressSteps:
+    """按流水线真实进度推进的步骤展示
+
+    steps为（阶段，文字）列表，每一步在对应阶段完成后才算完成，并按顺序展示；
+    min_step_seconds为每一步至少展示的时间，只是视觉效果：它推迟后续步骤的展示，但不阻塞流水线
+    """
+
+    def __init__(self, steps: List[Tuple[str, str]], min_step_seconds: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.steps = list(steps)
+        self.min_step_seconds = min_step_seconds
+        self._clock = clock
+        self._done: Set[str] = set()
+        self._shown_at: List[float] = []
+
+    def complete(self, *stages: str) -> None:
+        """标记阶段完成"""
+        self._done.update(stages)
+        self._advance()
+
+    def _advance(self) -> None:
+        now = self._clock()
+        while len(self._shown_at) < len(self.steps):
+            stage = self.steps[len(self._shown_at)][0]
+            if stage not in self._done:
+                break
+            if self._shown_at and now - self._shown_at[-1] < self.min_step_seconds:
+                break
+            self._shown_at.append(now)
+
+    def lines(self) -> List[str]:
+        """当前应展示的步骤：已完成的步骤加上正在进行的一步"""
+        self._advance()
+        return [text for _, text in self.steps[:len(self._shown_at) + 1]]
+
+    @property
+    def finished(self) -> bool:
+        """所有步骤均已完成并展示"""
+        self._advance()
+        return len(self._shown_at) == len(self.steps)
+
+    @property
+    def pending(self) -> bool:
+        """有已完成但因最短展示时间尚未展示的步骤，需要继续按时间刷新"""
+        return any(stage in self._done for stage, _ in self.steps[len(self._shown_at):])
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+近似问题匹配模块
+基于字符n-gram的MinHash + LSH，在同一卦象下把新问题映射到已回答过的相似问题，
+完全在本地计算，不依赖网络。
+问题中的时间词（今年、下次……）和事项词（财运、考试……）单独提取，
+这些词不同的两个问题即使字面接近也不算相似，例如"明年财运"与"今年财运"
+"""
+
+import re
+import threading
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+from interpretation_cache import normalize_question
+
+# 对问题含义影响不大的虚词和人称
+FILLER_CHARS = set('的了吗呢吧啊呀哦么我请问下一')
+
+# 常见疑问说法统一为同一种写法
+SYNONYMS = [
+    ('怎么样', '如何'),
+    ('怎样', '如何'),
+    ('好不好', '如何'),
+    ('咋样', '如何'),
+    ('运势', '运'),
+    ('运气', '运'),
+    ('这个月', '本月'),
+    ('这周', '本周'),
+]
+
+# 时间词和事项词：决定问题问的是什么，必须完全一致才算相似
+TIME_WORDS = ('今年', '明年', '去年', '后年', '今天', '明天', '后天', '昨天', '今晚', '明晚',
+              '这次', '下次', '上次', '本周', '下周', '上周', '本月', '下个月', '上个月')
+SUBJECT_WORDS = ('财运', '事业', '工作', '求职', '升职', '学业', '考试', '面试', '考研', '高考',
+                 '感情', '婚姻', '姻缘', '桃花', '复合', '结婚', '健康', '身体', '官司', '出行',
+                 '搬家', '投资', '生意')
+# 先匹配较长的词，例如"下个月"不会被拆开
+_KEY_TERMS = re.compile('|'.join(sorted(TIME_WORDS + SUBJECT_WORDS, key=len, reverse=True)))
+
+DEFAULT_THRESHOLD = 0.8
+
+# MinHash使用的梅森素数
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def canonical_question(question: str) -> Tuple[FrozenSet[str], List[str]]:
+    """在规范化基础上统一同义说法，返回（关键词集合，去掉关键词和虚词后的其余片段）"""
+    text = normalize_question(question)
+    for source, target in SYNONYMS:
+        text = text.replace(source, target)
+    # 先提取关键词再去虚词，"下次"里的"下"不会被当作虚词去掉
+    terms = frozenset(_KEY_TERMS.findall(text))
+    pieces = (''.join(ch for ch in piece if ch not in FILLER_CHARS) for piece in _KEY_TERMS.split(text))
+    return terms, [piece for piece in pieces if piece]
+
+
+def shingles(pieces: List[str], ngram: int = 2) -> Set[str]:
+    """将各片段切分为ngram个字符的n-gram集合，不足ngram个字符的片段整体保留"""
+    grams = set()
+    for piece in pieces:
+        if len(piece) < ngram:
+            grams.add(piece)
+        else:
+            grams.update(piece[i:i + ngram] for i in range(len(piece) - ngram + 1))
+    return grams
+
+
+def _features(question: str, ngram: int) -> Tuple[FrozenSet[str], Set[str]]:
+    """问题的关键词集合与参与相似度计算的特征集合；关键词作为整体特征，与语序无关"""
+    terms, pieces = canonical_question(question)
+    return terms, shingles(pieces, ngram) | {f"#{term}" for term in terms}
+
+
+class QuestionIndex:
+    """按卦象分组的近似问题索引（MinHash + LSH）"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = 64, bands: int = 16,
+                 ngram: int = 2, seed: int = 1):
+        """threshold为Jaccard相似度阈值，num_perm需能被bands整除"""
+        if num_perm % bands != 0:
+            raise ValueError("num_perm必须能被bands整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        # (分组, 问题) -> (关键词集合, 特征集合)
+        self._entries: Dict[Tuple[str, str], Tuple[FrozenSet[str], Set[str]]] = {}
+        # (分组, 段序号, 段签名) -> 问题集合
+        self._buckets: Dict[Tuple[str, int, bytes], Set[str]] = {}
+        # (分组, 问题) -> 各段签名，删除时使用
+        self._band_keys: Dict[Tuple[str, str], List[bytes]] = {}
+
+    def _signature(self, grams: Set[str]) -> np.ndarray:
+        """计算MinHash签名"""
+        hashes = np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+        # 乘法在uint64上自然溢出，再截取低61位，保持全程向量化
+        values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) & np.uint64(_MERSENNE_PRIME)
+        return values.min(axis=1)
+
+    def _bands_of(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, group: str, question: str) -> None:
+        """登记一个已回答的问题，question应为规范化后的文本"""
+        terms, grams = _features(question, self.ngram)
+        if not grams:
+            return
+        entry = (group, question)
+        with self._lock:
+            if entry in self._entries:
+                return
+            band_keys = self._bands_of(self._signature(grams))
+            self._entries[entry] = (terms, grams)
+            self._band_keys[entry] = band_keys
+            for i, band in enumerate(band_keys):
+                self._buckets.setdefault((group, i, band), set()).add(question)
+
+    def discard(self, group: str, question: str) -> None:
+        """移除问题（对应缓存条目被淘汰时调用）"""
+        entry = (group, question)
+        with self._lock:
+            if self._entries.pop(entry, None) is None:
+                return
+            for i, band in enumerate(self._band_keys.pop(entry)):
+                bucket = self._buckets.get((group, i, band))
+                if bucket is not None:
+                    bucket.discard(question)
+                    if not bucket:
+                        del self._buckets[(group, i, band)]
+
+    def query(self, group: str, question: str) -> Optional[str]:
+        """查找同一分组中最相似且超过阈值的已登记问题"""
+        terms, grams = _features(question, self.ngram)
+        if not grams:
+            return None
+        band_keys = self._bands_of(self._signature(grams))
+
+        best, best_score = None, self.threshold
+        with self._lock:
+            candidates = set()
+            for i, band in enumerate(band_keys):
+                candidates |= self._buckets.get((group, i, band), set())
+            # LSH只负责筛选候选，关键词必须一致，最终用精确的Jaccard相似度确认
+            for candidate in candidates:
+                stored_terms, stored = self._entries[(group, candidate)]
+                if stored_terms != terms:
+                    continue
+                score = len(grams & stored) / len(grams | stored)
+                if score >= best_score:
+                    best, best_score = candidate, score
+        return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
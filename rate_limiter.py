@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游调用限流模块
+所有Streamlit会话共用一个ModelScope密钥，突发请求会触发429并拖慢所有人。
+这里在进程内用令牌桶限制每秒请求数、用槽位限制同时进行的流式请求数，
+超出的请求按会话轮转公平排队，并提供排队位置和预计等待时间
+"""
+
+import asyncio
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional
+
+# 排队回调：(排队位置，预计等待秒数)
+QueueCallback = Callable[[int, float], None]
+
+# 排队时刷新位置的间隔（秒）
+POLL_INTERVAL = 0.1
+
+
+class Slot:
+    """已获得的上游调用槽位，用完后必须释放"""
+
+    def __init__(self, limiter: 'UpstreamLimiter'):
+        self._limiter = limiter
+        self._released = False
+        self._started = time.monotonic()
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(time.monotonic() - self._started)
+
+    def __enter__(self) -> 'Slot':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class _Ticket:
+    """排队中的请求"""
+
+    __slots__ = ('session_id', 'seq')
+
+    def __init__(self, session_id: str, seq: int):
+        self.session_id = session_id
+        self.seq = seq
+
+
+class UpstreamLimiter:
+    """令牌桶 + 并发槽位 + 按会话公平排队的限流器"""
+
+    def __init__(self, rate: float = 2.0, burst: int = 4, max_concurrent: int = 8):
+        """rate为每秒请求数，burst为令牌桶容量，max_concurrent为同时进行的流式请求上限"""
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._active = 0
+        # 会话轮转顺序：会话ID -> 该会话的排队请求
+        self._queues: 'OrderedDict[str, Deque[_Ticket]]' = OrderedDict()
+        self._seq = itertools.count()
+        # 流式请求平均持续时间（指数滑动平均），用于估算等待时间
+        self._avg_duration = 10.0
+
+        self.granted = 0
+        self.queued = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _enqueue(self, session_id: str) -> _Ticket:
+        ticket = _Ticket(session_id, next(self._seq))
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        return ticket
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.session_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[ticket.session_id]
+
+    def _try_grant(self, ticket: _Ticket) -> bool:
+        """轮到该请求且有令牌和空闲槽位时放行（调用方需持有锁）"""
+        self._refill(time.monotonic())
+        if not self._queues:
+            return False
+        session_id, queue = next(iter(self._queues.items()))
+        if queue[0] is not ticket:
+            return False
+        if self._tokens < 1 or self._active >= self.max_concurrent:
+            return False
+
+        self._tokens -= 1
+        self._active += 1
+        self.granted += 1
+        queue.popleft()
+        # 放行后该会话移到轮转队尾，其他会话的请求优先
+        del self._queues[session_id]
+        if queue:
+            self._queues[session_id] = queue
+        self._cond.notify_all()
+        return True
+
+    def _position(self, ticket: _Ticket) -> int:
+        """按轮转顺序计算排在第几位（从1开始，调用方需持有锁）"""
+        sessions = list(self._queues.items())
+        own_index = next(i for i, (session_id, _) in enumerate(sessions) if session_id == ticket.session_id)
+        depth = list(self._queues[ticket.session_id]).index(ticket)
+        position = 0
+        for i, (_, queue) in enumerate(sessions):
+            # 每一轮每个会话放行一个请求
+            position += min(len(queue), depth + (1 if i < own_index else 0))
+        return position + 1
+
+    def _estimate_wait(self, position: int) -> float:
+        """根据令牌补充速度和槽位释放速度估算等待秒数（调用方需持有锁）"""
+        token_wait = max(0.0, (position - self._tokens) / self.rate) if self.rate > 0 else 0.0
+        free_slots = self.max_concurrent - self._active
+        slot_wait = 0.0
+        if position > free_slots:
+            slot_wait = math.ceil((position - free_slots) / self.max_concurrent) * self._avg_duration
+        return max(token_wait, slot_wait)
+
+    def queue_position(self, session_id: str) -> Optional[int]:
+        """该会话最早一个排队请求的位置，不在排队时返回None"""
+        with self._cond:
+            queue = self._queues.get(session_id)
+            if not queue:
+                return None
+            return self._position(queue[0])
+
+    def estimated_wait(self, session_id: str) -> float:
+        """该会话最早一个排队请求的预计等待秒数"""
+        with self._cond:
+            queue = self._queues.get(session_id)
+            if not queue:
+                return 0.0
+            return self._estimate_wait(self._position(queue[0]))
+
+    def acquire(self, session_id: Optional[str] = None, on_wait: Optional[QueueCallback] = None,
+                timeout: Optional[float] = None) -> Slot:
+        """阻塞直到获得槽位；排队期间定期用（位置，预计等待）调用on_wait"""
+        session_id = session_id or 'default'
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            ticket = self._enqueue(session_id)
+            try:
+                waited = False
+                while not self._try_grant(ticket):
+                    if not waited:
+                        waited = True
+                        self.queued += 1
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("等待上游调用槽位超时")
+                    if on_wait is not None:
+                        position = self._position(ticket)
+                        wait = self._estimate_wait(position)
+                        # 回调可能较慢（例如刷新界面），不持有锁执行
+                        self._cond.release()
+                        try:
+                            on_wait(position, wait)
+                        finally:
+                            self._cond.acquire()
+                    self._cond.wait(POLL_INTERVAL)
+            except BaseException:
+                self._remove(ticket)
+                self._cond.notify_all()
+                raise
+        return Slot(self)
+
+    async def acquire_async(self, session_id: Optional[str] = None,
+                            on_wait: Optional[QueueCallback] = None) -> Slot:
+        """acquire的asyncio版本，排队时让出事件循环"""
+        session_id = session_id or 'default'
+        with self._cond:
+            ticket = self._enqueue(session_id)
+        try:
+            waited = False
+            while True:
+                with self._cond:
+                    if self._try_grant(ticket):
+                        return Slot(self)
+                    position = self._position(ticket)
+                    wait = self._estimate_wait(position)
+                    if not waited:
+                        waited = True
+                        self.queued += 1
+                if on_wait is not None:
+                    on_wait(position, wait)
+                await asyncio.sleep(POLL_INTERVAL)
+        except BaseException:
+            with self._cond:
+                self._remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def _release(self, duration: float) -> None:
+        with self._cond:
+            self._active -= 1
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        """当前限流状态"""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'active': self._active,
+                'waiting': sum(len(queue) for queue in self._queues.values()),
+                'tokens': self._tokens,
+                'granted': self.granted,
+                'queued': self.queued,
+                'avg_duration': self._avg_duration,
+            }
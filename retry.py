@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+重试策略模块
+对429、5xx、超时和连接错误做带抖动的指数退避重试，优先遵循Retry-After；
+401/403等不可重试的错误立即抛出。流式请求只在首个token产出前重试，
+用户看到的内容不会重复或中断
+"""
+
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from errors import UpstreamError, classify_error
+
+T = TypeVar('T')
+
+
+class RetryPolicy:
+    """指数退避重试策略"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_retry_after: float = 30.0, rng: Optional[random.Random] = None):
+        """max_attempts含首次请求；Retry-After超过max_retry_after时不再等待而是直接失败"""
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._rng = rng or random.Random()
+        self.retries = 0
+
+    def backoff(self, attempt: int, error: UpstreamError) -> Optional[float]:
+        """第attempt次（从0开始）失败后的等待秒数，返回None表示不再重试"""
+        if not error.retryable or attempt + 1 >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            if error.retry_after > self.max_retry_after:
+                return None
+            return error.retry_after
+        # 全抖动：在[0, 上限]内均匀取值，避免大量请求同时重试
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return self._rng.uniform(0, ceiling)
+
+    def call(self, fn: Callable[[], T], sleep: Callable[[float], None] = time.sleep) -> T:
+        """带重试地执行一次非流式调用"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                error = classify_error(e)
+                delay = self.backoff(attempt, error)
+                if delay is None:
+                    raise error from e
+                self.retries += 1
+                sleep(delay)
+                attempt += 1
+
+    def stream(self, open_texts: Callable[[], Iterator[str]],
+               sleep: Callable[[float], None] = time.sleep) -> Iterator[str]:
+        """带重试地读取流式文本，只在首个文本产出前重试"""
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                for text in open_texts():
+                    emitted = True
+                    yield text
+                return
+            except Exception as e:
+                error = classify_error(e)
+                delay = None if emitted else self.backoff(attempt, error)
+                if delay is None:
+                    raise error from e
+                self.retries += 1
+                sleep(delay)
+                attempt += 1
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """带重试地执行一次异步非流式调用"""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                error = classify_error(e)
+                delay = self.backoff(attempt, error)
+                if delay is None:
+                    raise error from e
+                self.retries += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def stream_async(self, open_texts: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """带重试地读取异步流式文本，只在首个文本产出前重试"""
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async for text in open_texts():
+                    emitted = True
+                    yield text
+                return
+            except Exception as e:
+                error = classify_error(e)
+                delay = None if emitted else self.backoff(attempt, error)
+                if delay is None:
+                    raise error from e
+                self.retries += 1
+                await asyncio.sleep(delay)
+                attempt += 1
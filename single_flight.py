@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+相同请求合并模块
+多个会话几乎同时提交相同的占卜方式、卦象和问题时，只向上游发起一次生成，
+后到的调用方订阅同一个文本流（包括已经收到的部分）
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional
+
+
+class SharedStream:
+    """一次上游生成的广播缓冲，订阅者总是从头开始读取"""
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self.subscribers = 0
+
+    def append(self, chunk: str) -> None:
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def subscribe(self) -> Iterator[str]:
+        """逐段读取，上游出错时在已收到的内容之后抛出同一个异常"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                pending = self._chunks[index:]
+                done, error = self._done, self._error
+            index += len(pending)
+            yield from pending
+            if done and index >= len(self._chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class StreamCoalescer:
+    """按键合并进行中的流式请求（线程版，供同步接口使用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, SharedStream] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    def stream(self, key: Hashable, factory: Callable[[], Iterator[str]],
+               on_join: Optional[Callable[[], None]] = None) -> Iterator[str]:
+        """第一个调用方在后台线程中打开上游流，之后相同键的调用方直接订阅
+
+        on_join在调用方合并到已有请求（factory不会被调用）时执行
+        """
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = SharedStream()
+                self._inflight[key] = shared
+                self.upstream_calls += 1
+            else:
+                self.coalesced_calls += 1
+            shared.subscribers += 1
+
+        if not leader and on_join is not None:
+            on_join()
+        if leader:
+            # 由后台线程消费上游，即使发起者中途离开，其他订阅者也能收到完整内容
+            threading.Thread(target=self._pump, args=(key, shared, factory), daemon=True).start()
+        return shared.subscribe()
+
+    def _pump(self, key: Hashable, shared: SharedStream, factory: Callable[[], Iterator[str]]) -> None:
+        error = None
+        try:
+            for chunk in factory():
+                shared.append(chunk)
+        except BaseException as e:
+            error = e
+        finally:
+            # 先移出在途表再结束，之后的相同请求会重新走缓存或上游
+            with self._lock:
+                self._inflight.pop(key, None)
+            shared.finish(error)
+
+    def inflight(self) -> int:
+        """当前在途的上游请求数"""
+        with self._lock:
+            return len(self._inflight)
+
+    def is_inflight(self, key: Hashable) -> bool:
+        """该键是否已有在途的上游请求"""
+        with self._lock:
+            return key in self._inflight
+
+
+class AsyncSharedStream:
+    """SharedStream 的 asyncio 版本"""
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.subscribers = 0
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self._done = True
+        self._error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self._chunks):
+                yield self._chunks[index]
+                index += 1
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                return
+            await self._changed.wait()
+
+
+class AsyncStreamCoalescer:
+    """按键合并进行中的流式请求（asyncio版，供异步接口使用）"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, AsyncSharedStream] = {}
+        self._tasks = set()
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]],
+               on_join: Optional[Callable[[], None]] = None) -> AsyncIterator[str]:
+        """第一个调用方创建后台任务打开上游流，之后相同键的调用方直接订阅"""
+        key = self._loop_key(key)
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = AsyncSharedStream()
+            self._inflight[key] = shared
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(self._pump(key, shared, factory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.coalesced_calls += 1
+            if on_join is not None:
+                on_join()
+        shared.subscribers += 1
+        return shared.subscribe()
+
+    @staticmethod
+    def _loop_key(key: Hashable) -> Hashable:
+        # asyncio原语绑定在事件循环上，不同事件循环之间不合并
+        return (id(asyncio.get_running_loop()), key)
+
+    async def _pump(self, key: Hashable, shared: AsyncSharedStream,
+                    factory: Callable[[], AsyncIterator[str]]) -> None:
+        error = None
+        try:
+            async for chunk in factory():
+                shared.append(chunk)
+        except BaseException as e:
+            error = e
+        finally:
+            self._inflight.pop(key, None)
+            shared.finish(error)
+
+    def inflight(self) -> int:
+        """当前在途的上游请求数"""
+        return len(self._inflight)
+
+    def is_inflight(self, key: Hashable) -> bool:
+        """该键在当前事件循环中是否已有在途的上游请求"""
+        return self._loop_key(key) in self._inflight
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试界面装配：app.py 创建智能体和启动指标服务时使用的参数与实际接口一致
+app.py 导入时即运行Streamlit界面，这里从源码中读出调用参数，再用同样的参数构造
+"""
+
+import sys
+import os
+import ast
+import inspect
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from divination_agent import DivinationAgent
+from interpretation_cache import InterpretationCache
+from hedging import HedgePolicy
+from rate_limiter import UpstreamLimiter
+from circuit_breaker import CircuitBreaker
+from metrics import start_metrics_server
+
+print("🔍 正在测试界面装配...")
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def app_calls(name):
+    """app.py 中对name的每一次调用所用的关键字参数名"""
+    with open(APP_PATH, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [[keyword.arg for keyword in node.keywords] for node in ast.walk(tree)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == name]
+
+
+def test_agent_kwargs_match_app():
+    """测试用 app.py 的参数（包括保存API密钥后重建时）构造智能体"""
+    components = {
+        "api_key": "test_key",
+        "cache": InterpretationCache(":memory:"),
+        "base_store": None,
+        "hedge": HedgePolicy(),
+        "limiter": UpstreamLimiter(),
+        "circuit_breaker": CircuitBreaker(),
+    }
+    calls = app_calls("DivinationAgent")
+    assert len(calls) >= 2
+    for kwargs in calls:
+        # 智能体不接受的参数名在构造时抛出TypeError
+        agent = DivinationAgent(**{name: components.get(name) for name in kwargs})
+        assert agent.hedge is components["hedge"]
+    print("✅ 智能体参数测试成功")
+
+
+def test_metrics_server_kwargs_match_app():
+    """测试 app.py 启动指标服务的参数都被接受"""
+    calls = app_calls("start_metrics_server")
+    assert calls
+    for kwargs in calls:
+        inspect.signature(start_metrics_server).bind(**{name: None for name in kwargs})
+    print("✅ 指标服务参数测试成功")
+
+
+if __name__ == "__main__":
+    test_agent_kwargs_match_app()
+    test_metrics_server_kwargs_match_app()
+    print("🎉 所有测试通过！")
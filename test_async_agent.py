@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试异步占卜接口
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from interpretation_cache import InterpretationCache
+from conftest import make_agent
+
+print("🔍 正在测试异步占卜接口...")
+
+
+def test_run_divination_async():
+    """测试异步非流式占卜"""
+    agent = make_agent(["卦象", "吉利"])
+    result = asyncio.run(agent.run_divination_async("天干地支", "我的事业运如何？"))
+    assert "天干地支占卜结果" in result
+    assert "卦象吉利" in result
+    print("✅ 异步占卜测试成功")
+
+
+def test_run_divination_stream_async_concurrent():
+    """测试同一事件循环中并发多个流式占卜"""
+    agent = make_agent(["卦象", "吉利"])
+
+    async def collect(divination_type, i):
+        chunks = []
+        async for chunk in agent.run_divination_stream_async(divination_type, f"今年财运如何？{i}"):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def main():
+        methods = ["梅花易数", "天干地支", "六爻", "紫微斗数"] * 25
+        return await asyncio.gather(*(collect(t, i) for i, t in enumerate(methods)))
+
+    results = asyncio.run(main())
+    assert len(results) == 100
+    assert all("AI解读：\n卦象吉利" in r for r in results)
+    assert agent.async_client.chat.completions.calls == 100
+    print("✅ 异步并发流式占卜测试成功")
+
+
+def test_unsupported_method_async():
+    """测试不支持的占卜方式"""
+    agent = make_agent(["卦象", "吉利"])
+
+    async def main():
+        return [chunk async for chunk in agent.run_divination_stream_async("塔罗", "问题")]
+
+    assert asyncio.run(main()) == ["暂不支持 塔罗 占卜方法"]
+    print("✅ 不支持方式测试成功")
+
+
+def test_prebuilt_cast_uses_its_method():
+    """测试传入已起好的卦时，按卦象自身的占卜方式读写缓存，与同步接口一致"""
+    agent = make_agent(["卦象", "吉利"])
+    agent.cache = InterpretationCache(":memory:")
+    cast = agent.cast("梅花易数", seed=7)
+
+    async def collect(divination_type):
+        return "".join([chunk async for chunk in agent.run_divination_stream_async(
+            divination_type, "我的事业运如何？", cast=cast)])
+
+    first = asyncio.run(collect("六爻"))
+    second = asyncio.run(collect("梅花易数"))
+    assert first == second
+    assert agent.async_client.chat.completions.calls == 1
+    assert agent.cache.hits == 1
+    print("✅ 预先起卦按卦象方式缓存测试成功")
+
+
+if __name__ == "__main__":
+    test_run_divination_async()
+    test_run_divination_stream_async_concurrent()
+    test_unsupported_method_async()
+    test_prebuilt_cast_uses_its_method()
+    print("🎉 所有测试通过！")
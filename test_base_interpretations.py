@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试通用卦象解读预生成
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from base_interpretations import BaseInterpretationStore, enumerate_casts, generate_all, base_key
+from divination_agent import QUESTION_MAX_TOKENS, QUESTION_SECTION
+from casting import CastResult
+from conftest import make_agent
+
+print("🔍 正在测试通用卦象解读预生成...")
+
+
+def test_enumerate_casts():
+    """测试卦象空间的枚举"""
+    casts = list(enumerate_casts())
+    counts = {}
+    for divination_type, _, _ in casts:
+        counts[divination_type] = counts.get(divination_type, 0) + 1
+    assert counts == {"梅花易数": 64, "天干地支": 120, "六爻": 64, "紫微斗数": 36}
+    assert len({(t, k) for t, k, _ in casts}) == len(casts)
+    assert base_key("梅花易数", "乾卦 1,1,1") == "乾卦"
+    assert base_key("六爻", "101011 1,4") == "101011"
+    print("✅ 卦象枚举测试成功")
+
+
+def test_generate_and_store():
+    """测试并发生成并写入索引文件"""
+    agent = make_agent(lambda kwargs: ["通用解读：" + kwargs["messages"][1]["content"].split("占卜结果: ")[1][:20]])
+    completions = agent.async_client.chat.completions
+    completions.delay = 0.001
+
+    entries = asyncio.run(generate_all(agent, concurrency=4))
+    assert len(entries) == 284
+    assert completions.peak <= 4
+
+    path = os.path.join(tempfile.mkdtemp(), "base.bin")
+    BaseInterpretationStore.write(path, entries)
+    store = BaseInterpretationStore(path)
+    assert len(store) == 284
+    assert store.get("六爻", "111111") == entries[("六爻", "111111")]
+    assert store.get("紫微斗数", "不存在") is None
+    print("✅ 生成与存储测试成功")
+
+
+def test_agent_serves_base_first():
+    """测试占卜时先输出通用解读，再只请求针对问题的部分"""
+    path = os.path.join(tempfile.mkdtemp(), "base.bin")
+    BaseInterpretationStore.write(path, {("天干地支", "甲 子"): "甲子为六十甲子之首。"})
+
+    agent = make_agent(["宜守不宜攻。"], cast=CastResult("天干地支", ("甲", "子")),
+                       base_store=BaseInterpretationStore(path))
+    completions = agent.client.chat.completions
+
+    text = "".join(agent.run_divination_stream("天干地支", "我的事业运如何？"))
+    assert f"甲子为六十甲子之首。{QUESTION_SECTION}宜守不宜攻。" in text
+    assert completions.requests[0]["max_tokens"] == QUESTION_MAX_TOKENS
+    assert "甲子为六十甲子之首。" in completions.requests[0]["messages"][1]["content"]
+    print("✅ 通用解读优先输出测试成功")
+
+
+if __name__ == "__main__":
+    test_enumerate_casts()
+    test_generate_and_store()
+    test_agent_serves_base_first()
+    print("🎉 所有测试通过！")
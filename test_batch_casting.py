@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试批量起卦
+"""
+
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import hexagrams
+from batch_casting import batch_cast
+from casting import CastResult
+
+print("🔍 正在测试批量起卦...")
+
+
+def test_six_yao_batch():
+    """测试六爻批量起卦的数组与卦值"""
+    batch = batch_cast("六爻", 10000, seed=1)
+    assert batch.numbers.shape == (10000, 6) and batch.numbers.dtype == np.int8
+    assert set(np.unique(batch.numbers)) == {6, 7, 8, 9}
+    for row, value, mask in zip(batch.numbers[:200], batch.outcomes[:200], batch.moving[:200]):
+        assert hexagrams.from_lines(row.tolist()) == (value, mask)
+        assert CastResult("六爻", numbers=tuple(row.tolist())).bits == format(value, '06b')[::-1]
+    assert (batch.changed() == batch.outcomes ^ batch.moving).all()
+    assert batch.frequencies().sum() == 10000 and len(batch.frequency_table()) == 64
+    print("✅ 六爻批量起卦测试成功")
+
+
+def test_plum_blossom_batch():
+    """测试梅花易数批量起卦与逐卦起卦一致"""
+    batch = batch_cast("梅花易数", 5000, seed=2)
+    assert batch.numbers.shape == (5000, 3)
+    for row, value, mask in zip(batch.numbers[:200], batch.outcomes[:200], batch.moving[:200]):
+        assert hexagrams.plum_blossom(row.tolist()) == (value, mask)
+    assert (batch.frequencies() > 0).sum() == 64
+    print("✅ 梅花易数批量起卦测试成功")
+
+
+def test_symbol_batches_and_seed():
+    """测试干支、紫微斗数的频数表与种子重现"""
+    ganzhi = batch_cast("天干地支", 12000, seed=3)
+    table = ganzhi.frequency_table()
+    assert len(table) == 120 and sum(table.values()) == 12000
+    stem, branch = ganzhi.symbols[0]
+    assert ganzhi.labels[ganzhi.outcomes[0]] == CastResult("天干地支", ("甲乙丙丁戊己庚辛壬癸"[stem],
+                                                                       "子丑寅卯辰巳午未申酉戌亥"[branch])).key
+
+    stars = batch_cast("紫微斗数", 3600, seed=4)
+    assert stars.moving is None and len(stars.frequencies()) == 36
+    assert (batch_cast("紫微斗数", 3600, seed=4).outcomes == stars.outcomes).all()
+    assert batch_cast("塔罗", 10) is None
+    print("✅ 频数表与种子测试成功")
+
+
+if __name__ == "__main__":
+    test_six_yao_batch()
+    test_plum_blossom_batch()
+    test_symbol_batches_and_seed()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试结构化起卦结果
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import casting
+from casting import CastResult
+from method_plum_blossom import hexagram_name
+from chart_generator import ChartGenerator
+from conftest import make_agent
+
+print("🔍 正在测试结构化起卦结果...")
+
+
+def test_cast_keys_and_texts():
+    """测试卦象键与提示词、展示文本"""
+    plum = CastResult("梅花易数", ("乾卦",), (1, 1, 1))
+    assert plum.key == "乾卦 1,1,1"
+    assert "卦象：乾卦" in plum.prompt and plum.header.startswith("占卜结果：乾卦")
+
+    assert CastResult("天干地支", ("甲", "子")).key == "甲 子"
+    assert CastResult("紫微斗数", ("紫微星", "命宫")).key == "紫微星 命宫"
+
+    # 六爻从初爻到上爻：9老阳、8少阴、7少阳、6老阴
+    six = CastResult("六爻", numbers=(9, 8, 7, 6, 7, 7))
+    # 阴阳之后附上动爻位置
+    assert six.key == "101011 1,4"
+    assert six.yao_lines[:2] == ["———", "-- --"]
+    # 展示时上爻在最上方
+    assert six.header.splitlines()[1] == "———"
+    assert six.header.startswith("六爻卦象：")
+    # 上卦离（先天数3）、下卦乾（先天数1）
+    assert hexagram_name([3, 1, 8]) == "大有卦"
+    print("✅ 卦象键与文本测试成功")
+
+
+def test_cast_result_is_compact_and_hashable():
+    """测试起卦结果使用slots且可作为键"""
+    result = casting.cast("六爻")
+    assert not hasattr(result, '__dict__')
+    assert len(result.numbers) == 6 and set(result.numbers) <= {6, 7, 8, 9}
+    assert {result: 1}[CastResult("六爻", numbers=result.numbers)] == 1
+    assert casting.cast("塔罗") is None
+    print("✅ 紧凑结构测试成功")
+
+
+def test_same_cast_for_chart_and_agent():
+    """测试图表与AI解读使用同一个起卦结果"""
+    agent = make_agent(coalesce=False)
+    result = agent.cast("梅花易数")
+    chart = ChartGenerator().generate_chart(result)
+    assert chart.startswith("data:image/png;base64,")
+    assert ChartGenerator().generate_chart(CastResult("紫微斗数", ("紫微星", "命宫"))) is None
+
+    output = "".join(agent.run_divination_stream("梅花易数", "我的事业运如何？", cast=result))
+    assert output.startswith(result.header)
+    assert result.prompt.strip() in agent.client.chat.completions.requests[0]["messages"][1]["content"]
+    print("✅ 同一卦象测试成功")
+
+
+def test_seeded_cast_is_reproducible():
+    """测试相同种子重现相同卦象，且不使用全局random"""
+    import random
+    first = casting.cast("六爻", seed=42)
+    assert first.seed == 42
+    random.seed(0)
+    state = random.getstate()
+    for name in ["梅花易数", "天干地支", "六爻", "紫微斗数"]:
+        assert casting.cast(name, seed=7) == casting.cast(name, seed=7)
+    assert random.getstate() == state
+    assert casting.cast("六爻", seed=42) == first
+    # 不指定种子时生成新的种子并记录在结果中
+    assert casting.cast("六爻").seed != casting.cast("六爻").seed
+    print("✅ 种子重现测试成功")
+
+
+def test_time_based_plum_blossom():
+    """测试梅花易数年月日时起卦：同一时辰共用卦象、提示词与图表"""
+    from datetime import datetime
+    import method_plum_blossom
+    # 2026年10月18日为丙午年九月初九，11点至13点为午时
+    first = casting.cast("梅花易数", moment=datetime(2026, 10, 18, 11, 30))
+    second = casting.cast("梅花易数", moment=datetime(2026, 10, 18, 12, 50))
+    assert first == second and first.numbers == (7, 9, 9, 7) and first.symbols == ("否卦",)
+    assert first is not second and first.prompt is second.prompt
+    assert "午年九月初九午时" in first.header and "变卦：讼卦" in first.header
+    # 23点起为次日子时
+    assert casting.cast("梅花易数", moment=datetime(2026, 10, 18, 23, 10)).numbers == (7, 9, 10, 1)
+    assert method_plum_blossom._time_cast.cache_info().hits >= 1
+
+    # 界面每次重跑都会新建生成器，不同实例之间同样复用图表
+    assert ChartGenerator().generate_chart(first) is ChartGenerator().generate_chart(second)
+    print("✅ 时间起卦测试成功")
+
+
+if __name__ == "__main__":
+    test_cast_keys_and_texts()
+    test_cast_result_is_compact_and_hashable()
+    test_same_cast_for_chart_and_agent()
+    test_seeded_cast_is_reproducible()
+    test_time_based_plum_blossom()
+    print("🎉 所有测试通过！")
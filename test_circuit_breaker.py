@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试上游熔断与本地解读
+"""
+
+import sys
+import os
+import time
+import httpx
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from local_interpretation import LOCAL_NOTICE, local_interpretation
+from errors import AuthenticationError
+from divination_agent import DivinationAgent
+from casting import CastResult
+from conftest import make_agent
+
+print("🔍 正在测试上游熔断与本地解读...")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures():
+    """测试连续失败达到阈值后熔断，成功会清零计数"""
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(0.5)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    print("✅ 连续失败熔断测试成功")
+
+
+def test_opens_on_latency_slo_breach():
+    """测试慢调用比例超出阈值后熔断"""
+    breaker = CircuitBreaker(latency_slo=2.0, window=10, min_calls=4, slow_call_ratio=0.5)
+    for latency in [0.5, 3.0, 0.5]:
+        breaker.record_success(latency)
+    assert breaker.state == CLOSED
+    breaker.record_success(5.0)
+    assert breaker.state == OPEN
+    print("✅ 延迟SLO熔断测试成功")
+
+
+def test_background_probe_closes_breaker():
+    """测试冷却结束后在后台探测，探测成功恢复，失败继续熔断"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+
+    probes = []
+
+    def failing_probe():
+        probes.append(1)
+        raise RuntimeError("仍然不可用")
+
+    assert not breaker.allow(failing_probe)
+    assert probes == []
+    clock.now = 10
+    assert not breaker.allow(failing_probe)
+    for _ in range(100):
+        if breaker.state == OPEN:
+            break
+        time.sleep(0.01)
+    assert probes == [1] and breaker.state == OPEN
+
+    clock.now = 20
+    assert not breaker.allow(lambda: None)
+    for _ in range(100):
+        if breaker.state == CLOSED:
+            break
+        time.sleep(0.01)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    print("✅ 后台探测测试成功")
+
+
+def test_half_open_trial_without_probe():
+    """测试没有探测函数时半开状态只放行一个试探请求"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    print("✅ 半开试探测试成功")
+
+
+def test_local_interpretation():
+    """测试本地解读使用卦象数据"""
+    assert "乾卦" in local_interpretation("梅花易数", "乾卦 1,1,1", "事业如何？")
+    text = local_interpretation("六爻", "111000", "感情如何？")
+    assert "下卦为乾" in text and "上卦为坤" in text
+    assert "财帛宫" in local_interpretation("紫微斗数", "武曲星 财帛宫", "财运如何？")
+    assert "甲" in local_interpretation("天干地支", "甲 子", "健康如何？")
+    assert "卦象：未知卦" in local_interpretation("六爻", "乱码", "？", "卦象：未知卦")
+    print("✅ 本地解读测试成功")
+
+
+def test_agent_serves_local_when_open():
+    """测试熔断打开后智能体不再调用上游，立即返回本地解读"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    agent = make_agent(cast=CastResult("紫微斗数", ("紫微星", "命宫")), coalesce=False, circuit_breaker=breaker)
+    agent.retry_policy.max_attempts = 1
+    agent.client.chat.completions.error = httpx.ConnectError("refused")
+    calls = agent.client.chat.completions.requests
+
+    output = "".join(agent.run_divination_stream("紫微斗数", "我的事业运如何？"))
+    assert "AI解读失败" in output
+    assert breaker.state == OPEN and len(calls) == 1
+
+    start = time.monotonic()
+    output = "".join(agent.run_divination_stream("紫微斗数", "我的事业运如何？"))
+    assert time.monotonic() - start < 0.1
+    assert LOCAL_NOTICE in output and "紫微星" in output
+    assert len(calls) == 1
+
+    result = agent.run_divination("紫微斗数", "我的事业运如何？")
+    assert LOCAL_NOTICE in result and len(calls) == 1
+    print("✅ 熔断后本地解读测试成功")
+
+
+def test_auth_errors_do_not_trip_breaker():
+    """测试401等调用方错误不计入熔断"""
+    breaker = CircuitBreaker(failure_threshold=1)
+    agent = DivinationAgent(api_key="test_key", circuit_breaker=breaker)
+    agent._record_upstream(None, AuthenticationError("API密钥无效", 401))
+    assert breaker.state == CLOSED
+    print("✅ 认证错误不熔断测试成功")
+
+
+if __name__ == "__main__":
+    test_opens_after_consecutive_failures()
+    test_opens_on_latency_slo_breach()
+    test_background_probe_closes_breaker()
+    test_half_open_trial_without_probe()
+    test_local_interpretation()
+    test_agent_serves_local_when_open()
+    test_auth_errors_do_not_trip_breaker()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试ModelScope客户端连接池
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from client_pool import ClientPool, default_pool
+from divination_agent import DivinationAgent
+
+print("🔍 正在测试客户端连接池...")
+
+BASE_URL = "https://api-inference.modelscope.cn/v1"
+
+
+def test_pool_reuses_clients():
+    """测试相同密钥复用客户端，并共享同一个httpx连接池"""
+    pool = ClientPool(max_clients=4)
+    first = pool.get("key_a", BASE_URL)
+    assert pool.get("key_a", BASE_URL) is first
+    second = pool.get("key_b", BASE_URL)
+    assert second is not first
+    assert first._client is second._client
+    pool.close()
+    print("✅ 客户端复用测试成功")
+
+
+def test_pool_lru_eviction():
+    """测试超出容量时淘汰最久未使用的客户端"""
+    pool = ClientPool(max_clients=2)
+    a = pool.get("key_a", BASE_URL)
+    pool.get("key_b", BASE_URL)
+    pool.get("key_a", BASE_URL)
+    pool.get("key_c", BASE_URL)
+    assert len(pool) == 2
+    assert pool.get("key_a", BASE_URL) is a
+    pool.close()
+    print("✅ LRU淘汰测试成功")
+
+
+def test_async_eviction_closes_client():
+    """测试淘汰的异步客户端会关闭其连接池，无论是否在事件循环中创建"""
+    pool = ClientPool(max_clients=1)
+    a = pool.get_async("key_a", BASE_URL)
+    pool.get_async("key_b", BASE_URL)
+    assert a.is_closed()
+
+    async def main():
+        b = pool.get_async("key_b", BASE_URL)
+        c = pool.get_async("key_c", BASE_URL)
+        d = pool.get_async("key_d", BASE_URL)
+        await asyncio.sleep(0.01)
+        return b, c, d
+
+    b, c, d = asyncio.run(main())
+    assert b.is_closed() and c.is_closed()
+    assert not d.is_closed()
+    pool.close()
+    assert d.is_closed()
+    print("✅ 异步客户端淘汰关闭测试成功")
+
+
+def test_agent_survives_async_eviction():
+    """测试智能体的异步客户端被池淘汰关闭后，下次调用取得新的客户端"""
+    max_clients = default_pool.max_clients
+    default_pool.max_clients = 1
+    try:
+        agent = DivinationAgent(api_key="evicted_key")
+        first = agent.async_client
+        DivinationAgent(api_key="other_key").async_client
+        assert first.is_closed()
+        assert not agent.async_client.is_closed()
+        assert agent.async_client is not first
+    finally:
+        default_pool.max_clients = max_clients
+    print("✅ 淘汰后重新取得异步客户端测试成功")
+
+
+def test_agents_share_client():
+    """测试每次新建的智能体复用同一个客户端"""
+    first = DivinationAgent(api_key="shared_key")
+    second = DivinationAgent(api_key="shared_key")
+    assert first.client is second.client
+    assert first.async_client is second.async_client
+    print("✅ 智能体共享客户端测试成功")
+
+
+if __name__ == "__main__":
+    test_pool_reuses_clients()
+    test_pool_lru_eviction()
+    test_async_eviction_closes_client()
+    test_agent_survives_async_eviction()
+    test_agents_share_client()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试占卜方式注册表
+"""
+
+import sys
+import os
+import random
+import subprocess
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from casting import CastResult
+from divination_methods import DivinationMethod, BUILTIN_METHODS, get_method, method_names, register
+from conftest import make_agent
+
+print("🔍 正在测试占卜方式注册表...")
+
+
+def test_methods_load_lazily():
+    """测试导入智能体时不导入各占卜方式的模块，第一次使用时才导入"""
+    code = ("import sys; import divination_agent, chart_generator, base_interpretations; "
+            "from divination_methods import BUILTIN_METHODS, get_method; "
+            "assert not any(m in sys.modules for m in BUILTIN_METHODS.values()); "
+            "get_method('六爻'); "
+            "print(sorted(m for m in BUILTIN_METHODS.values() if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.strip() == "['method_six_yao']"
+    print("✅ 按需导入测试成功")
+
+
+def test_builtin_methods_registered():
+    """测试内置占卜方式按界面顺序注册"""
+    assert method_names()[:4] == ["梅花易数", "天干地支", "六爻", "紫微斗数"]
+    for name in BUILTIN_METHODS:
+        method = get_method(name)
+        result = method.cast(random.Random(0))
+        assert result.method == name
+        prompt, header = method.texts(result)
+        assert prompt and header
+    assert get_method("紫微斗数").chart is None
+    assert get_method("紫微斗数").display is None
+    assert get_method("塔罗") is None
+    print("✅ 内置方式注册测试成功")
+
+
+def test_agent_dispatches_registered_method():
+    """测试新注册的占卜方式无需修改智能体即可使用"""
+    register(DivinationMethod(
+        "测字", lambda rng: CastResult("测字", (rng.choice("木火土金水"),)),
+        lambda cast: (f"\n测字结果：{cast.symbols[0]}\n", f"字：{cast.symbols[0]}\n\n")))
+
+    agent = make_agent(coalesce=False)
+    output = "".join(agent.run_divination_stream("测字", "我的事业运如何？", cast=agent.cast("测字", seed=0)))
+    assert output.startswith("字：") and output.endswith("\n\nAI解读：\n解")
+    assert "测字" in method_names()
+    assert "暂不支持" in "".join(agent.run_divination_stream("塔罗", "我的事业运如何？"))
+    print("✅ 注册分派测试成功")
+
+
+def test_display_dispatches_registered_method():
+    """测试卦象展示按注册表分派，新注册的占卜方式也能展示"""
+    rng = random.Random(0)
+    assert "六爻卦象：" in get_method("六爻").display(get_method("六爻").cast(rng))
+    assert "四柱" in get_method("天干地支").display(get_method("天干地支").cast(rng, moment=datetime(2024, 2, 4, 17)))
+    plum = get_method("梅花易数")
+    assert "时支数" in plum.display(plum.cast(rng, moment=datetime(2024, 2, 4, 17)))
+    assert "数字1" in plum.display(plum.cast(rng))
+
+    register(DivinationMethod(
+        "抽签", lambda rng: CastResult("抽签", ("上上签",)),
+        lambda cast: (f"\n签文：{cast.symbols[0]}\n", f"签：{cast.symbols[0]}\n\n"),
+        display=lambda cast: f"<div class='hexagram-display'>抽签：{cast.symbols[0]}</div>"))
+    method = get_method("抽签")
+    assert method.display(method.cast(rng)) == "<div class='hexagram-display'>抽签：上上签</div>"
+    print("✅ 卦象展示分派测试成功")
+
+if __name__ == "__main__":
+    test_methods_load_lazily()
+    test_builtin_methods_registered()
+    test_agent_dispatches_registered_method()
+    test_display_dispatches_registered_method()
+    print("🎉 所有测试通过！")
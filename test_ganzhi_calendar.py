@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试干支历
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import casting
+import ganzhi_calendar
+from ganzhi_calendar import pillar_names, pillars, pillars_array, solar_terms
+from base_interpretations import base_key
+
+print("🔍 正在测试干支历...")
+
+
+def test_solar_term_table():
+    """测试节气表文件与现场计算一致，节气时刻接近天文台公布值"""
+    assert (ganzhi_calendar._load() == ganzhi_calendar.build_table()).all()
+    terms = dict(solar_terms(2024))
+    # 2024年立春为北京时间2月4日16:27，春分为3月20日11:06
+    assert abs(terms["立春"] - datetime(2024, 2, 4, 16, 27)) < timedelta(minutes=10)
+    assert abs(terms["春分"] - datetime(2024, 3, 20, 11, 6)) < timedelta(minutes=10)
+    print("✅ 节气表测试成功")
+
+
+def test_pillars():
+    """测试四柱：立春换年、节换月、23点换日"""
+    assert pillar_names(datetime(2000, 1, 1, 12)) == ("己卯", "丙子", "戊午", "戊午")
+    assert pillar_names(datetime(2024, 2, 4, 12))[:2] == ("癸卯", "乙丑")
+    assert pillar_names(datetime(2024, 2, 4, 17))[:2] == ("甲辰", "丙寅")
+    assert pillar_names(datetime(2024, 2, 4, 22, 59))[2:] == ("戊戌", "癸亥")
+    assert pillar_names(datetime(2024, 2, 4, 23, 0))[2:] == ("己亥", "甲子")
+    # 带时区的时间先换算为北京时间
+    assert pillars(datetime(2024, 2, 4, 9, tzinfo=timezone.utc)) == pillars(datetime(2024, 2, 4, 17))
+    try:
+        pillars(datetime(1899, 12, 31))
+        assert False, "应当拒绝超出节气表范围的时间"
+    except ValueError:
+        pass
+    print("✅ 四柱测试成功")
+
+
+def test_pillars_array_matches_scalar():
+    """测试批量换算与逐个换算一致"""
+    moments = np.arange(np.datetime64('1900-01-06T12:00'), np.datetime64('2100-12-31T23:00'),
+                        np.timedelta64(9973, 'm'))
+    table = pillars_array(moments)
+    assert table.shape == (len(moments), 4) and table.dtype == np.int8
+    for moment, row in zip(moments[::7], table[::7]):
+        assert tuple(row) == pillars(moment.astype(datetime))
+    print("✅ 批量换算测试成功")
+
+
+def test_time_based_cast():
+    """测试按时间起卦取日柱并附上四柱"""
+    result = casting.cast("天干地支", moment=datetime(2024, 2, 4, 17))
+    assert result.symbols == ("戊", "戌")
+    assert "四柱：甲辰年 丙寅月 戊戌日 辛酉时" in result.prompt
+    assert base_key("天干地支", result.key) == "戊 戌"
+    print("✅ 按时间起卦测试成功")
+
+
+if __name__ == "__main__":
+    test_solar_term_table()
+    test_pillars()
+    test_pillars_array_matches_scalar()
+    test_time_based_cast()
+    print("🎉 所有测试通过！")
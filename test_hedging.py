@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试对冲请求
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hedging import HedgePolicy, hedged_stream, percentile
+
+print("🔍 正在测试对冲请求...")
+
+
+class FakeStream:
+    """模拟流式响应：等待first_delay后逐段返回，可被close()中断"""
+
+    def __init__(self, pieces, first_delay):
+        self.pieces = pieces
+        self.first_delay = first_delay
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        if self.closed.wait(self.first_delay):
+            return
+        for piece in self.pieces:
+            if self.closed.is_set():
+                return
+            yield piece
+            time.sleep(0.01)
+
+    def close(self):
+        self.closed.set()
+
+
+def make_opener(delays, pieces=("乾", "为", "天")):
+    streams = []
+
+    def open_stream():
+        stream = FakeStream([f"{len(streams)}{p}" for p in pieces], delays[len(streams)])
+        streams.append(stream)
+        return stream
+    return open_stream, streams
+
+
+def test_percentile():
+    """测试分位数计算"""
+    samples = list(range(1, 101))
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.95) == 95
+    assert percentile(samples, 0.99) == 99
+    assert percentile([], 0.95) == 0.0
+    print("✅ 分位数测试成功")
+
+
+def test_no_hedge_when_fast():
+    """测试首token及时到达时不补发请求"""
+    policy = HedgePolicy(initial_delay=0.2)
+    open_stream, streams = make_opener([0.01])
+    assert "".join(hedged_stream(open_stream, lambda c: c, policy)) == "0乾0为0天"
+    assert len(streams) == 1
+    assert policy.stats()["hedges_fired"] == 0
+    print("✅ 无需对冲测试成功")
+
+
+def test_hedge_wins_and_loser_cancelled():
+    """测试首发请求过慢时对冲请求胜出，首发请求被取消"""
+    policy = HedgePolicy(initial_delay=0.05)
+    open_stream, streams = make_opener([2.0, 0.01])
+    started = time.perf_counter()
+    text = "".join(hedged_stream(open_stream, lambda c: c, policy))
+    elapsed = time.perf_counter() - started
+
+    assert text == "1乾1为1天"
+    assert elapsed < 1.0
+    assert streams[0].closed.is_set()
+    stats = policy.stats()
+    assert stats["hedges_fired"] == 1 and stats["hedges_won"] == 1
+    print(f"✅ 对冲胜出测试成功（用时 {elapsed:.2f}s）")
+
+
+def test_primary_error_propagates():
+    """测试首发请求立即失败时直接抛出异常"""
+    policy = HedgePolicy(initial_delay=1.0)
+
+    def open_stream():
+        raise RuntimeError("API密钥无效")
+
+    try:
+        list(hedged_stream(open_stream, lambda c: c, policy))
+        assert False, "应该抛出异常"
+    except RuntimeError as e:
+        assert "API密钥无效" in str(e)
+    print("✅ 错误传播测试成功")
+
+
+def test_delay_tracks_percentile():
+    """测试样本足够后按分位数调整对冲延迟"""
+    policy = HedgePolicy(percentile=0.9, min_delay=0.1, max_delay=3.0, min_samples=10)
+    for i in range(1, 11):
+        policy.record(i * 0.2, i * 0.2, fired=False, hedge_won=False)
+    assert abs(policy.delay() - 1.8) < 1e-9
+    print("✅ 对冲延迟自适应测试成功")
+
+
+if __name__ == "__main__":
+    test_percentile()
+    test_no_hedge_when_fast()
+    test_hedge_wins_and_loser_cancelled()
+    test_primary_error_propagates()
+    test_delay_tracks_percentile()
+    print("🎉 所有测试通过！")
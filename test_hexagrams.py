@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试六十四卦引擎
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import hexagrams
+from hexagrams import BY_NAME, NAMES, FULL_NAMES, KING_WEN, NUCLEAR, OPPOSITE, REVERSED
+
+print("🔍 正在测试六十四卦引擎...")
+
+
+def test_tables():
+    """测试卦名与文王卦序表"""
+    assert len(set(NAMES)) == 64 and sorted(KING_WEN) == list(range(1, 65))
+    assert NAMES[0b111111] == "乾卦" and FULL_NAMES[0b111111] == "乾为天"
+    assert NAMES[0] == "坤卦"
+    # 下卦乾、上卦坤为泰，反之为否
+    assert NAMES[hexagrams.from_trigrams(0, 7)] == "泰卦"
+    assert NAMES[hexagrams.from_trigrams(7, 0)] == "否卦"
+    assert FULL_NAMES[BY_NAME["姤卦"]] == "天风姤"
+    assert hexagrams.BY_KING_WEN[63] == BY_NAME["既济卦"]
+    print("✅ 卦表测试成功")
+
+
+def test_derived_hexagrams():
+    """测试互卦、错卦、综卦与变卦"""
+    assert NAMES[OPPOSITE[BY_NAME["乾卦"]]] == "坤卦"
+    assert NAMES[REVERSED[BY_NAME["屯卦"]]] == "蒙卦"
+    assert NAMES[NUCLEAR[BY_NAME["既济卦"]]] == "未济卦"
+    assert NAMES[NUCLEAR[BY_NAME["乾卦"]]] == "乾卦"
+    # 乾卦初爻动，变为姤卦
+    assert NAMES[hexagrams.changed(BY_NAME["乾卦"], 0b000001)] == "姤卦"
+    print("✅ 衍生卦测试成功")
+
+
+def test_lines_and_plum_blossom():
+    """测试爻值往返与梅花易数起卦"""
+    value, mask = hexagrams.from_lines([9, 8, 7, 6, 7, 7])
+    assert value == 0b110101 and mask == 0b001001
+    assert hexagrams.to_lines(value, mask) == [9, 8, 7, 6, 7, 7]
+    assert hexagrams.moving_lines(mask) == [1, 4]
+    info = hexagrams.describe(value, mask)
+    assert info['动爻'] == "初爻、四爻" and '变卦' in info
+
+    # 上卦离3、下卦乾1，三数之和12除6余0，上爻动
+    value, mask = hexagrams.plum_blossom([3, 1, 8])
+    assert NAMES[value] == "大有卦" and hexagrams.moving_lines(mask) == [6]
+    # 年月日时起卦：午年(7)九月初九午时(7)，上卦25→乾，下卦32→坤，动爻32除6余2
+    value, mask = hexagrams.plum_blossom_time(7, 9, 9, 7)
+    assert NAMES[value] == "否卦" and hexagrams.moving_lines(mask) == [2]
+    # 起卦数字1~8覆盖全部64卦，不再出现未知卦
+    assert len({hexagrams.plum_blossom([a, b, 1])[0] for a in range(1, 9) for b in range(1, 9)}) == 64
+    print("✅ 爻值与梅花易数起卦测试成功")
+
+
+if __name__ == "__main__":
+    test_tables()
+    test_derived_hexagrams()
+    test_lines_and_plum_blossom()
+    print("🎉 所有测试通过！")
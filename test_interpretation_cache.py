@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试占卜解读缓存
+"""
+
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from interpretation_cache import InterpretationCache, normalize_question, format_cast
+from question_similarity import QuestionIndex
+from casting import CastResult
+from conftest import make_agent
+
+print("🔍 正在测试占卜解读缓存...")
+
+
+def make_cache(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    return InterpretationCache(path, **kwargs)
+
+
+def test_normalize_question():
+    """测试问题规范化"""
+    assert normalize_question("我的事业运如何？") == normalize_question(" 我的事业运如何? ")
+    assert normalize_question("ＡＢＣ，abc") == "abcabc"
+    assert format_cast(["乾卦", 1, 1, 1]) == "乾卦 1,1,1"
+    print("✅ 问题规范化测试成功")
+
+
+def test_lru_eviction():
+    """测试容量淘汰最久未使用的条目"""
+    cache = make_cache(max_entries=2)
+    cache.set("梅花易数", "乾卦 1,1,1", "问题一", "解读一")
+    time.sleep(0.01)
+    cache.set("梅花易数", "乾卦 1,1,1", "问题二", "解读二")
+    time.sleep(0.01)
+    assert cache.get("梅花易数", "乾卦 1,1,1", "问题一") == "解读一"
+    time.sleep(0.01)
+    cache.set("梅花易数", "乾卦 1,1,1", "问题三", "解读三")
+
+    assert len(cache) == 2
+    assert cache.get("梅花易数", "乾卦 1,1,1", "问题二") is None
+    assert cache.get("梅花易数", "乾卦 1,1,1", "问题一") == "解读一"
+    print("✅ LRU淘汰测试成功")
+
+
+def test_ttl_expiry():
+    """测试过期条目不再命中"""
+    cache = make_cache(ttl_seconds=0.05)
+    cache.set("天干地支", "甲 子", "问题", "解读")
+    assert cache.get("天干地支", "甲 子", "问题") == "解读"
+    time.sleep(0.1)
+    assert cache.get("天干地支", "甲 子", "问题") is None
+    print("✅ TTL过期测试成功")
+
+
+def test_similar_question_hit():
+    """测试相似问题命中同一卦象下的缓存"""
+    cache = make_cache(question_index=QuestionIndex())
+    cache.set("梅花易数", "乾卦 1,1,1", "今年财运怎么样", "财运亨通")
+
+    assert cache.get("梅花易数", "乾卦 1,1,1", "我今年的财运如何？") == "财运亨通"
+    assert cache.get("梅花易数", "乾卦 1,1,1", "财运今年如何") == "财运亨通"
+    assert cache.similar_hits == 2
+    # 不同卦象或不同问题不应命中
+    assert cache.get("梅花易数", "姤卦 1,1,2", "我今年的财运如何？") is None
+    assert cache.get("梅花易数", "乾卦 1,1,1", "今年感情运如何") is None
+
+    # 重新打开时从数据库预热索引
+    reopened = InterpretationCache(cache.path, question_index=QuestionIndex())
+    assert reopened.get("梅花易数", "乾卦 1,1,1", "我今年的财运如何") == "财运亨通"
+    print("✅ 相似问题命中测试成功")
+
+
+def test_similar_question_rejects_different_subject():
+    """测试时间或事项不同的问题不会被当作相似问题"""
+    cache = make_cache(question_index=QuestionIndex())
+    cache.set("梅花易数", "乾卦 1,1,1", "今年财运怎么样", "财运亨通")
+    cache.set("梅花易数", "乾卦 1,1,1", "这次考试能通过吗", "可以通过")
+
+    assert cache.get("梅花易数", "乾卦 1,1,1", "明年财运怎么样") is None
+    assert cache.get("梅花易数", "乾卦 1,1,1", "这次面试能通过吗") is None
+    assert cache.get("梅花易数", "乾卦 1,1,1", "下次考试能通过吗") is None
+    assert cache.similar_hits == 0
+    # 同一问题换个说法仍然命中
+    assert cache.get("梅花易数", "乾卦 1,1,1", "请问这次的考试能通过吗？") == "可以通过"
+    print("✅ 不同时间或事项不误命中测试成功")
+
+
+def test_agent_replays_from_cache():
+    """测试相同卦象和问题第二次直接从缓存回放"""
+    agent = make_agent(["乾为天，", "自强不息。"], cast=CastResult("梅花易数", ("乾卦",), (1, 1, 1)), cache=make_cache())
+    completions = agent.client.chat.completions
+
+    first = "".join(agent.run_divination_stream("梅花易数", "我的事业运如何？"))
+    second = "".join(agent.run_divination_stream("梅花易数", "我的事业运如何?"))
+
+    assert first == second
+    assert "乾为天，自强不息。" in second
+    assert completions.calls == 1
+    assert agent.cache.hits == 1
+    print("✅ 缓存回放测试成功")
+
+
+if __name__ == "__main__":
+    test_normalize_question()
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_similar_question_hit()
+    test_similar_question_rejects_different_subject()
+    test_agent_replays_from_cache()
+    print("🎉 所有测试通过！")
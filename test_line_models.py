@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试起爻概率模型
+"""
+
+import sys
+import os
+import random
+from fractions import Fraction
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import casting
+from batch_casting import batch_cast
+from line_models import LINE_VALUES, MODELS, benchmark, get_model
+
+print("🔍 正在测试起爻概率模型...")
+
+
+def test_alias_tables_are_exact():
+    """测试别名表还原的分布与模型概率完全一致"""
+    for name, table in MODELS.items():
+        count = len(table.values)
+        distribution = {value: Fraction(0) for value in LINE_VALUES}
+        for value, threshold, alias in zip(table.values, table.threshold, table.alias):
+            distribution[value] += Fraction(threshold) / count
+            distribution[alias] += (1 - Fraction(threshold)) / count
+        assert tuple(distribution.values()) == table.probabilities, name
+    assert get_model("蓍草").probabilities == tuple(Fraction(n, 16) for n in (1, 5, 7, 3))
+    assert get_model("铜钱").probabilities == tuple(Fraction(n, 8) for n in (1, 3, 3, 1))
+    assert get_model().probabilities == (Fraction(1, 4),) * 4
+    print("✅ 别名表测试成功")
+
+
+def test_models_in_casting():
+    """测试逐卦起卦与批量起卦使用所选模型"""
+    assert casting.cast("六爻", seed=5, model="蓍草") == casting.cast("六爻", seed=5, model="蓍草")
+    assert set(casting.cast("六爻", seed=5).numbers) <= set(LINE_VALUES)
+    # 默认均匀起爻，同一种子与引入起爻模型之前的 randint(6, 9) 起卦结果相同
+    rng = random.Random(5)
+    assert casting.cast("六爻", seed=5).numbers == tuple(rng.randint(6, 9) for _ in range(6))
+    default = batch_cast("六爻", 20000, seed=6).numbers
+    assert abs((default == 6).mean() - 0.25) < 0.02
+    try:
+        casting.cast("六爻", model="硬币")
+        assert False, "应当拒绝不支持的起爻方式"
+    except ValueError:
+        pass
+
+    lines = batch_cast("六爻", 20000, seed=6, model="蓍草").numbers
+    # 蓍草法老阴约占1/16，明显少于老阳（约3/16）
+    assert (lines == 6).mean() < 0.08 < 0.16 < (lines == 9).mean()
+    print("✅ 起卦模型选择测试成功")
+
+
+def test_benchmark():
+    """测试统计基准的卡方检验"""
+    report = benchmark("铜钱", samples=200000, scalar_samples=1000, seed=7)
+    assert report['passed'] and abs(report['observed'][7] - 0.375) < 0.01
+    assert report['batch_samples_per_second'] > 0
+    print("✅ 统计基准测试成功")
+
+
+if __name__ == "__main__":
+    test_alias_tables_are_exact()
+    test_models_in_casting()
+    test_benchmark()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试并发压测工具
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import METHODS, run_load_test, format_report
+from mock_server import MockServer, LatencyProfile
+from divination_agent import DivinationAgent
+
+print("🔍 正在测试并发压测工具...")
+
+
+def test_load_test_against_mock_server():
+    """测试对模拟服务压测并统计各占卜方式的延迟"""
+    profile = LatencyProfile(ttft=0.05, tokens_per_second=0, output_tokens=20)
+    with MockServer(profile) as server:
+        factory = lambda: DivinationAgent(api_key="test_key", base_url=server.base_url, coalesce=False)
+        report = run_load_test(factory, users=4, iterations=1)
+        assert server.requests == 4 * len(METHODS)
+
+    assert report['completed'] == 4 * len(METHODS)
+    assert report['errors'] == 0
+    assert report['throughput'] > 0
+    assert report['peak_rss_mb'] > 0
+    for method in METHODS:
+        entry = report['methods'][method]
+        assert entry['completed'] == 4
+        assert 0.05 <= entry['ttft']['p50'] <= entry['ttlt']['p99']
+    assert "紫微斗数" in format_report(report)
+    print("✅ 压测统计测试成功")
+
+
+def test_load_test_counts_errors():
+    """测试上游出错时计入失败次数"""
+    with MockServer(LatencyProfile(error_rate=1.0)) as server:
+        def factory():
+            agent = DivinationAgent(api_key="test_key", base_url=server.base_url, coalesce=False)
+            agent.retry_policy.max_attempts = 1
+            return agent
+        report = run_load_test(factory, users=2, iterations=1, methods=["六爻"])
+    assert report['completed'] == 0
+    assert report['errors'] == 2
+    assert report['methods']["六爻"]['ttft']['p50'] is None
+    print("✅ 失败统计测试成功")
+
+
+if __name__ == "__main__":
+    test_load_test_against_mock_server()
+    test_load_test_counts_errors()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试农历换算
+"""
+
+import sys
+import os
+from datetime import date
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import lunar_calendar
+from lunar_calendar import format_lunar, leap_month, month_days, to_lunar, to_lunar_array, to_solar, to_solar_array
+
+print("🔍 正在测试农历换算...")
+
+
+def test_known_dates():
+    """测试春节、闰月等已知日期"""
+    assert to_lunar(date(1900, 1, 31)) == (1900, 1, 1, False)
+    assert to_lunar(date(2024, 2, 10)) == (2024, 1, 1, False)
+    assert to_solar(2025, 1, 1) == date(2025, 1, 29)
+    # 2023年闰二月，2025年闰六月
+    assert leap_month(2023) == 2 and leap_month(2025) == 6 and leap_month(2024) == 0
+    assert to_lunar(date(2023, 3, 22)) == (2023, 2, 1, True)
+    assert to_solar(2023, 2, 15, leap=True) == date(2023, 4, 5)
+    assert format_lunar(*to_lunar(date(2023, 4, 5))) == "闰二月十五"
+    assert month_days(2024, 1) in (29, 30)
+    for args in [(2024, 2, 1, True), (2024, 13, 1, False), (1899, 1, 1, False), (2024, 1, 31, False)]:
+        try:
+            to_solar(*args)
+            assert False, f"应当拒绝不存在的农历日期 {args}"
+        except ValueError:
+            pass
+    print("✅ 已知日期测试成功")
+
+
+def test_bulk_conversion_round_trip():
+    """测试整个农历表范围内批量换算往返一致，并与逐日换算相同"""
+    end = to_solar(2100, 12, month_days(2100, 12))
+    days = np.arange(np.datetime64('1900-01-31'), np.datetime64(end) + 1)
+    years, months, day_numbers, leaps = to_lunar_array(days)
+    # 月序估算调整后与二分查找一致
+    index = np.searchsorted(lunar_calendar._STARTS, np.arange(len(days)), side='right') - 1
+    assert (months == lunar_calendar._MONTHS[index]).all() and (leaps == lunar_calendar._LEAPS[index]).all()
+    assert day_numbers.min() == 1 and day_numbers.max() == 30
+    assert (to_solar_array(years, months, day_numbers, leaps) == days).all()
+    for i in range(0, len(days), 997):
+        day = days[i].astype(date)
+        lunar = to_lunar(day)
+        assert lunar == (years[i], months[i], day_numbers[i], leaps[i])
+        assert to_solar(*lunar) == day
+    print("✅ 批量换算测试成功")
+
+
+if __name__ == "__main__":
+    test_known_dates()
+    test_bulk_conversion_round_trip()
+    print("🎉 所有测试通过！")
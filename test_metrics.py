@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试Prometheus监控指标
+"""
+
+import sys
+import os
+import urllib.request
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import DivinationMetrics, MetricsRegistry, MetricsServer
+from timing import TimingRegistry, Trace
+from interpretation_cache import InterpretationCache
+from chart_generator import ChartGenerator
+from rate_limiter import UpstreamLimiter
+from circuit_breaker import CircuitBreaker
+from hedging import HedgePolicy
+from conftest import make_agent
+
+print("🔍 正在测试Prometheus监控指标...")
+
+
+def test_exposition_format():
+    """测试计数器、直方图的文本格式与标签转义"""
+    registry = MetricsRegistry()
+    counter = registry.counter('demo_total', "示例计数", ('method',))
+    histogram = registry.histogram('demo_seconds', "示例耗时", ('method',), buckets=(0.1, 1.0))
+    counter.inc(method='六爻')
+    counter.inc(2, method='a"b')
+    histogram.observe(0.05, method='六爻')
+    histogram.observe(0.5, method='六爻')
+    histogram.observe(5, method='六爻')
+
+    text = registry.render()
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{method="六爻"} 1' in text
+    assert 'demo_total{method="a\\"b"} 2' in text
+    assert 'demo_seconds_bucket{method="六爻",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{method="六爻",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{method="六爻",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{method="六爻"} 3' in text
+    print("✅ 文本格式测试成功")
+
+
+def test_reading_and_chart_metrics():
+    """测试占卜结束和图表渲染时更新指标"""
+    timing_registry = TimingRegistry()
+    metrics = DivinationMetrics(timing_registry)
+    cache = InterpretationCache(":memory:")
+    metrics.watch(cache=cache)
+    try:
+        agent = make_agent(["乾", "为", "天"], cache=cache, coalesce=False)
+        trace = Trace(registry=timing_registry, method="六爻")
+        assert metrics.render().count("divination_active_readings 1") == 1
+        "".join(agent.run_divination_stream("六爻", "我的事业运如何？", trace=trace))
+        trace.finish()
+
+        ChartGenerator().generate_plum_blossom_chart([1, 2, 3])
+        text = metrics.render()
+    finally:
+        metrics.close()
+
+    assert 'divination_requests_total{method="六爻",source="upstream"} 1' in text
+    assert 'divination_stream_chunks_total{method="六爻"} 3' in text
+    assert 'divination_llm_ttft_seconds_count{method="六爻"} 1' in text
+    assert 'divination_llm_duration_seconds_count{method="六爻"} 1' in text
+    assert 'divination_chart_render_seconds_count{chart="plum_blossom"} 1' in text
+    assert 'divination_cache_lookups_total{result="miss"} 1' in text
+    # 累计次数按计数器导出，可以直接用 rate() 计算
+    assert "# TYPE divination_cache_lookups_total counter" in text
+    assert "divination_active_readings 0" in text
+    print("✅ 占卜与图表指标测试成功")
+
+
+def test_errors_by_class():
+    """测试按错误类型计数"""
+    timing_registry = TimingRegistry()
+    metrics = DivinationMetrics(timing_registry)
+    try:
+        Trace(registry=timing_registry, method="梅花易数").finish(error="RateLimitError")
+    finally:
+        metrics.close()
+    assert metrics.errors.get(method="梅花易数", error="RateLimitError") == 1
+    print("✅ 错误计数测试成功")
+
+
+def test_component_gauges():
+    """测试抓取时读取缓存、限流器、熔断器和对冲策略状态，每个状态指标都有合理的取值"""
+    timing_registry = TimingRegistry()
+    metrics = DivinationMetrics(timing_registry)
+    cache = InterpretationCache(":memory:")
+    cache.set("六爻", "111111", "事业如何？", "乾为天")
+    cache.get("六爻", "111111", "事业如何？")
+    cache.get("六爻", "000000", "事业如何？")
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    hedge = HedgePolicy()
+    hedge.record(ttft=1.0, upstream_ttft=3.0, fired=True, hedge_won=True)
+    hedge.record(ttft=0.5, upstream_ttft=0.5, fired=False, hedge_won=False)
+    metrics.watch(cache=cache, limiter=UpstreamLimiter(), circuit_breaker=breaker, hedge_policy=hedge)
+    try:
+        text = metrics.render()
+    finally:
+        metrics.close()
+
+    samples = dict(line.rsplit(' ', 1) for line in text.splitlines() if line and not line.startswith('#'))
+    assert float(samples['divination_cache_hit_ratio']) == 0.5
+    assert float(samples['divination_cache_entries']) == 1
+    assert float(samples['divination_upstream_active']) == 0
+    assert float(samples['divination_upstream_waiting']) == 0
+    assert float(samples['divination_circuit_open']) == 1
+    assert float(samples['divination_active_readings']) == 0
+    assert float(samples['divination_hedge_fire_rate']) == 0.5
+    assert float(samples['divination_hedge_ttft_saved_seconds{quantile="0.95"}']) == 2.0
+    assert float(samples['divination_hedge_ttft_saved_seconds{quantile="0.99"}']) == 2.0
+    print("✅ 组件状态指标测试成功")
+
+
+def test_metrics_endpoint():
+    """测试 /metrics HTTP服务"""
+    metrics = DivinationMetrics(TimingRegistry())
+    server = MetricsServer(metrics, port=0).start()
+    try:
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            body = response.read().decode('utf-8')
+    finally:
+        server.stop()
+        metrics.close()
+    assert "# TYPE divination_requests_total counter" in body
+    print("✅ 指标接口测试成功")
+
+
+if __name__ == "__main__":
+    test_exposition_format()
+    test_reading_and_chart_metrics()
+    test_errors_by_class()
+    test_component_gauges()
+    test_metrics_endpoint()
+    print("🎉 所有测试通过！")
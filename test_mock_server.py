@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试本地模拟ModelScope服务
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockServer, LatencyProfile, SAMPLE_TEXT
+from divination_agent import DivinationAgent
+from errors import RateLimitError, ServerError
+from retry import RetryPolicy
+
+print("🔍 正在测试本地模拟服务...")
+
+
+def make_agent(server, **kwargs):
+    return DivinationAgent(api_key="test_key", base_url=server.base_url, coalesce=False,
+                           retry_policy=RetryPolicy(max_attempts=1), **kwargs)
+
+
+def test_streaming_through_agent():
+    """测试智能体通过base_url接入模拟服务的流式输出"""
+    profile = LatencyProfile(ttft=0.1, tokens_per_second=500, output_tokens=30)
+    with MockServer(profile, seed=1) as server:
+        agent = make_agent(server)
+        start = time.monotonic()
+        output = "".join(agent.run_divination_stream("梅花易数", "我的事业运如何？"))
+        elapsed = time.monotonic() - start
+
+    interpretation = output.split("AI解读：\n", 1)[1]
+    assert SAMPLE_TEXT.startswith(interpretation)
+    assert len(interpretation) >= 30
+    assert 0.1 <= elapsed < 2
+    print("✅ 流式输出测试成功")
+
+
+def test_non_stream_and_max_tokens():
+    """测试非流式接口并遵循max_tokens"""
+    profile = LatencyProfile(ttft=0, tokens_per_second=0, output_tokens=5000)
+    with MockServer(profile) as server:
+        agent = make_agent(server)
+        text = agent._get_ai_interpretation("六爻", "感情如何？", "卦象：乾")
+    assert SAMPLE_TEXT[:20] in text
+    assert len(text) <= 1500 * 2
+    print("✅ 非流式输出测试成功")
+
+
+def test_error_injection():
+    """测试429与500注入会被归类为对应的上游错误"""
+    with MockServer(LatencyProfile(rate_limit_rate=1.0, retry_after=3)) as server:
+        agent = make_agent(server)
+        try:
+            list(agent._stream_interpretation("六爻", "问题", "结果", "111111"))
+            assert False, "应该抛出RateLimitError"
+        except RateLimitError as e:
+            assert e.retry_after == 3.0
+        assert server.rate_limited == 1
+
+    with MockServer(LatencyProfile(error_rate=1.0)) as server:
+        agent = make_agent(server)
+        try:
+            list(agent._stream_interpretation("六爻", "问题", "结果", "111111"))
+            assert False, "应该抛出ServerError"
+        except ServerError:
+            pass
+    print("✅ 错误注入测试成功")
+
+
+def test_concurrency_limit_returns_429():
+    """测试超出并发上限时返回429"""
+    profile = LatencyProfile(ttft=0.1, tokens_per_second=10, output_tokens=5, max_concurrent=1)
+    with MockServer(profile) as server:
+        agent = make_agent(server)
+        first = agent._stream_interpretation("六爻", "问题一", "结果", "111111")
+        next(first)  # 第一个请求仍在输出中
+        try:
+            list(make_agent(server)._stream_interpretation("六爻", "问题二", "结果", "000000"))
+            assert False, "应该抛出RateLimitError"
+        except RateLimitError:
+            pass
+        assert "".join(first)
+    print("✅ 并发上限测试成功")
+
+
+if __name__ == "__main__":
+    test_streaming_through_agent()
+    test_non_stream_and_max_tokens()
+    test_error_injection()
+    test_concurrency_limit_returns_429()
+    print("🎉 所有测试通过！")
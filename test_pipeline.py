@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试占卜流水线（后台提前消费AI解读流）
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline import BackgroundStream, ProgressSteps, CHUNK, QUEUE, PROGRESS, TICK
+from timing import Trace, TimingRegistry
+from rate_limiter import UpstreamLimiter
+from conftest import make_agent
+
+print("🔍 正在测试占卜流水线...")
+
+
+def test_stream_runs_while_caller_is_busy():
+    """测试调用方忙于其他工作（渲染图表）时上游流已在后台进行"""
+    agent = make_agent(["乾", "为", "天"], delay=0.1, coalesce=False)
+    cast = agent.cast("六爻")
+    stream = BackgroundStream().start(agent.run_divination_stream("六爻", "我的事业运如何？", cast=cast))
+
+    start = time.perf_counter()
+    time.sleep(0.3)  # 模拟图表渲染
+    chunks = [payload for kind, payload in stream.events() if kind == CHUNK]
+    # 读取时大部分内容已经到达，总耗时接近两者中较长的一个而不是两者之和
+    assert time.perf_counter() - start < 0.55
+    assert "".join(chunks).endswith("乾为天")
+    # 输出的卦象与调用方预先得到的卦象一致
+    assert chunks[0] == cast.header
+    print("✅ 后台消费测试成功")
+
+
+def test_queue_events_forwarded():
+    """测试排队进度作为事件转交给调用方线程"""
+    limiter = UpstreamLimiter(rate=100, burst=100, max_concurrent=1)
+    held = limiter.acquire("other")
+    agent = make_agent(["坤"], coalesce=False)
+    agent.limiter = limiter
+
+    stream = BackgroundStream()
+    stream.start(agent.run_divination_stream("梅花易数", "今年适合投资吗？", session_id="me",
+                                             on_queue=stream.on_queue))
+    threading.Timer(0.2, held.release).start()
+    events = list(stream.events(timeout=5))
+    kinds = [kind for kind, _ in events]
+    assert QUEUE in kinds
+    assert kinds.index(QUEUE) < len(kinds) - 1
+    assert events[-1] == (CHUNK, "坤")
+    print("✅ 排队事件测试成功")
+
+
+def test_errors_reraised_and_close_stops():
+    """测试流中的异常在调用方重新抛出，close后后台线程停止"""
+    def failing():
+        yield "a"
+        raise ValueError("boom")
+
+    stream = BackgroundStream().start(failing())
+    received = []
+    try:
+        for kind, payload in stream.events(timeout=5):
+            received.append(payload)
+        raise AssertionError("应当抛出异常")
+    except ValueError:
+        pass
+    assert received == ["a"]
+
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield "x"
+        finally:
+            closed.set()
+
+    stream = BackgroundStream().start(endless())
+    stream.close()
+    stream.join(timeout=5)
+    assert closed.is_set()
+    print("✅ 异常与提前关闭测试成功")
+
+
+def test_progress_events_from_trace():
+    """测试上游连接和首token作为进度事件在文本之前到达"""
+    agent = make_agent(["乾"], coalesce=False)
+    trace = Trace(registry=TimingRegistry())
+    stream = BackgroundStream()
+    stream.track(trace, ("connect", "first_token"))
+    stream.start(agent.run_divination_stream("六爻", "我的事业运如何？", trace=trace))
+    events = list(stream.events(timeout=5))
+    progress = [payload for kind, payload in events if kind == PROGRESS]
+    assert progress == ["connect", "first_token"]
+    assert events.index((PROGRESS, "first_token")) < events.index((CHUNK, "乾"))
+    print("✅ 进度事件测试成功")
+
+
+def test_progress_steps_follow_real_stages():
+    """测试步骤只在对应阶段完成后按顺序推进"""
+    steps = [("cast", "起卦"), ("chart", "绘图"), ("connect", "连接"), ("first_token", "等待")]
+    progress = ProgressSteps(steps)
+    assert progress.lines() == ["起卦"]
+    progress.complete("cast")
+    assert progress.lines() == ["起卦", "绘图"]
+    # 上游先于图表完成时仍按顺序展示
+    progress.complete("connect")
+    assert progress.lines() == ["起卦", "绘图"]
+    progress.complete("chart")
+    assert progress.lines() == ["起卦", "绘图", "连接", "等待"]
+    assert not progress.finished
+    progress.complete("first_token")
+    assert progress.finished
+    print("✅ 进度步骤测试成功")
+
+
+def test_progress_min_step_is_non_blocking():
+    """测试最短展示时间只推迟展示，不阻塞完成"""
+    now = [0.0]
+    progress = ProgressSteps([("cast", "a"), ("cast", "b"), ("chart", "c")], min_step_seconds=0.5,
+                             clock=lambda: now[0])
+    progress.complete("cast", "chart")
+    assert progress.lines() == ["a", "b"]
+    assert progress.pending and not progress.finished
+    now[0] = 0.5
+    assert progress.lines() == ["a", "b", "c"]
+    now[0] = 1.0
+    assert progress.finished and not progress.pending
+
+    # 没有新事件时按tick产出TICK事件，调用方据此刷新
+    stream = BackgroundStream()
+    events = stream.events(tick=0.01)
+    assert next(events) == (TICK, None)
+    stream.start(iter(["x"]))
+    assert [event for event in events if event[0] != TICK] == [(CHUNK, "x")]
+    print("✅ 最短展示时间测试成功")
+
+
+if __name__ == "__main__":
+    test_stream_runs_while_caller_is_busy()
+    test_queue_events_forwarded()
+    test_errors_reraised_and_close_stops()
+    test_progress_events_from_trace()
+    test_progress_steps_follow_real_stages()
+    test_progress_min_step_is_non_blocking()
+    print("🎉 所有测试通过！")
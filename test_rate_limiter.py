@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试上游限流与公平排队
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rate_limiter import UpstreamLimiter
+from single_flight import StreamCoalescer
+from casting import CastResult
+from conftest import make_agent
+
+print("🔍 正在测试上游限流与公平排队...")
+
+
+def test_concurrency_limit():
+    """测试同时进行的请求数不超过上限"""
+    limiter = UpstreamLimiter(rate=1000, burst=1000, max_concurrent=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with limiter.acquire("s"):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    assert limiter.stats()['active'] == 0
+    print("✅ 并发上限测试成功")
+
+
+def test_token_bucket_rate():
+    """测试令牌用完后按速率放行"""
+    limiter = UpstreamLimiter(rate=20, burst=2, max_concurrent=10)
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire("s").release()
+    elapsed = time.monotonic() - start
+    # 前2个请求使用桶内令牌，后2个各等待约0.05秒
+    assert 0.08 <= elapsed < 0.5
+    print("✅ 令牌桶速率测试成功")
+
+
+def test_fair_round_robin():
+    """测试不同会话轮流放行，单个会话的大量请求不会饿死其他会话"""
+    limiter = UpstreamLimiter(rate=1000, burst=1000, max_concurrent=1)
+    blocker = limiter.acquire("占位")
+    order = []
+    positions = {}
+
+    def work(session_id, name):
+        def on_wait(position, wait):
+            positions.setdefault(name, position)
+        with limiter.acquire(session_id, on_wait):
+            order.append(name)
+
+    threads = []
+    for name in ["a1", "a2", "a3"]:
+        threads.append(threading.Thread(target=work, args=("a", name)))
+        threads[-1].start()
+        time.sleep(0.02)
+    threads.append(threading.Thread(target=work, args=("b", "b1")))
+    threads[-1].start()
+    time.sleep(0.05)
+
+    assert limiter.queue_position("a") == 1
+    assert limiter.queue_position("b") == 2
+    assert limiter.queue_position("c") is None
+    assert limiter.estimated_wait("b") > 0
+
+    blocker.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert positions["a3"] == 3
+    print("✅ 会话公平排队测试成功")
+
+
+def test_timeout_leaves_queue():
+    """测试排队超时后请求离开队列"""
+    limiter = UpstreamLimiter(rate=1000, burst=1000, max_concurrent=1)
+    blocker = limiter.acquire("a")
+    try:
+        limiter.acquire("b", timeout=0.05)
+        assert False, "应该超时"
+    except TimeoutError:
+        pass
+    assert limiter.queue_position("b") is None
+    blocker.release()
+    limiter.acquire("b").release()
+    print("✅ 排队超时测试成功")
+
+
+def test_async_acquire():
+    """测试asyncio版限流"""
+    limiter = UpstreamLimiter(rate=1000, burst=1000, max_concurrent=2)
+    active = []
+    peak = []
+
+    async def work():
+        slot = await limiter.acquire_async("s")
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.02)
+        active.pop()
+        slot.release()
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(6)))
+
+    asyncio.run(main())
+    assert max(peak) == 2
+    assert limiter.stats()['granted'] == 6
+    print("✅ 异步限流测试成功")
+
+
+def test_agent_reports_queue_and_coalesced_calls_skip_limiter():
+    """测试智能体排队时回调排队位置，合并的相同请求不占用槽位"""
+    limiter = UpstreamLimiter(rate=1000, burst=1000, max_concurrent=1)
+    coalescer = StreamCoalescer()
+    agents = []
+    for _ in range(2):
+        agent = make_agent(["乾", "为", "天"], 0.05, CastResult("紫微斗数", ("紫微星", "命宫")), limiter=limiter)
+        agent.coalescer = coalescer
+        agents.append(agent)
+
+    blocker = limiter.acquire("占位")
+    reports = []
+    outputs = [None, None]
+
+    def run(i):
+        outputs[i] = "".join(agents[i].run_divination_stream(
+            "紫微斗数", "我的事业运如何？", session_id=f"会话{i}", on_queue=lambda p, w: reports.append(p)))
+
+    first = threading.Thread(target=run, args=(0,))
+    first.start()
+    time.sleep(0.15)
+    assert reports and reports[0] == 1
+    blocker.release()
+    time.sleep(0.05)
+    second = threading.Thread(target=run, args=(1,))
+    second.start()
+    first.join()
+    second.join()
+
+    assert outputs == ["主星：紫微星\n宫位：命宫\n\nAI解读：\n乾为天"] * 2
+    assert coalescer.upstream_calls == 1 and coalescer.coalesced_calls == 1
+    assert limiter.stats()['granted'] == 2  # 占位请求 + 第一个会话
+    assert limiter.stats()['active'] == 0
+    print("✅ 智能体排队测试成功")
+
+
+if __name__ == "__main__":
+    test_concurrency_limit()
+    test_token_bucket_rate()
+    test_fair_round_robin()
+    test_timeout_leaves_queue()
+    test_async_acquire()
+    test_agent_reports_queue_and_coalesced_calls_skip_limiter()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试错误分类与重试策略
+"""
+
+import sys
+import os
+import httpx
+import openai
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from errors import (AuthenticationError, RateLimitError, ServerError, UpstreamTimeoutError,
+                    UpstreamConnectionError, classify_error)
+from retry import RetryPolicy
+
+print("🔍 正在测试错误分类与重试策略...")
+
+REQUEST = httpx.Request("POST", "https://api-inference.modelscope.cn/v1/chat/completions")
+
+
+def status_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls(f"Error code: {status}", response=response, body=None)
+
+
+def test_classify_error():
+    """测试上游异常的分类"""
+    assert isinstance(classify_error(status_error(openai.AuthenticationError, 401)), AuthenticationError)
+    limited = classify_error(status_error(openai.RateLimitError, 429, {"retry-after": "2"}))
+    assert isinstance(limited, RateLimitError) and limited.retry_after == 2.0
+    assert str(limited) == "API请求频率过高，请稍后重试"
+    assert isinstance(classify_error(status_error(openai.InternalServerError, 503)), ServerError)
+    assert isinstance(classify_error(openai.APITimeoutError(request=REQUEST)), UpstreamTimeoutError)
+    assert isinstance(classify_error(httpx.ConnectError("refused")), UpstreamConnectionError)
+    print("✅ 错误分类测试成功")
+
+
+def test_call_retries_then_succeeds():
+    """测试429后遵循Retry-After重试"""
+    policy = RetryPolicy(max_attempts=3)
+    sleeps = []
+    outcomes = [status_error(openai.RateLimitError, 429, {"retry-after": "1.5"}), "ok"]
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert policy.call(fn, sleep=sleeps.append) == "ok"
+    assert sleeps == [1.5]
+    print("✅ 429重试测试成功")
+
+
+def test_no_retry_on_auth_error():
+    """测试401不重试"""
+    policy = RetryPolicy(max_attempts=5)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise status_error(openai.AuthenticationError, 401)
+
+    try:
+        policy.call(fn, sleep=lambda s: None)
+        assert False, "应该抛出异常"
+    except AuthenticationError:
+        pass
+    assert len(calls) == 1
+    print("✅ 401不重试测试成功")
+
+
+def test_backoff_is_bounded():
+    """测试指数退避带抖动且不超过上限"""
+    policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=4.0)
+    error = ServerError("服务端错误", 502)
+    for attempt in range(8):
+        delay = policy.backoff(attempt, error)
+        assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+    assert policy.backoff(9, error) is None
+    print("✅ 退避上限测试成功")
+
+
+def test_stream_retries_only_before_first_token():
+    """测试流式请求只在首个token前重试"""
+    policy = RetryPolicy(max_attempts=3)
+    attempts = []
+
+    def open_texts():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("refused")
+        yield "乾"
+        raise httpx.ReadTimeout("timeout")
+
+    received = []
+    try:
+        for text in policy.stream(open_texts, sleep=lambda s: None):
+            received.append(text)
+        assert False, "应该抛出异常"
+    except UpstreamTimeoutError:
+        pass
+    assert received == ["乾"]
+    assert len(attempts) == 2
+    print("✅ 流式重试测试成功")
+
+
+if __name__ == "__main__":
+    test_classify_error()
+    test_call_retries_then_succeeds()
+    test_no_retry_on_auth_error()
+    test_backoff_is_bounded()
+    test_stream_retries_only_before_first_token()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试相同请求合并
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import StreamCoalescer, AsyncStreamCoalescer
+from casting import CastResult
+from conftest import FakeCompletions, fake_client, make_agent
+
+print("🔍 正在测试相同请求合并...")
+
+
+def test_coalescer_shares_one_upstream():
+    """测试后到的订阅者能收到已产出的内容"""
+    coalescer = StreamCoalescer()
+    started = threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        for piece in ["一", "二", "三"]:
+            started.set()
+            time.sleep(0.05)
+            yield piece
+
+    first = coalescer.stream("key", factory)
+    started.wait()
+    time.sleep(0.08)
+    second = coalescer.stream("key", factory)
+
+    assert "".join(first) == "一二三"
+    assert "".join(second) == "一二三"
+    assert len(calls) == 1
+    assert coalescer.coalesced_calls == 1
+    assert coalescer.inflight() == 0
+    print("✅ 同步请求合并测试成功")
+
+
+def test_coalescer_propagates_error():
+    """测试上游出错时所有订阅者都收到同一个异常"""
+    coalescer = StreamCoalescer()
+
+    def factory():
+        yield "一"
+        time.sleep(0.05)
+        raise RuntimeError("上游断开")
+
+    streams = [coalescer.stream("key", factory) for _ in range(3)]
+    for stream in streams:
+        received = []
+        try:
+            for piece in stream:
+                received.append(piece)
+            assert False, "应该抛出异常"
+        except RuntimeError as e:
+            assert str(e) == "上游断开"
+        assert received == ["一"]
+    print("✅ 错误传播测试成功")
+
+
+def test_agent_coalesces_concurrent_sessions():
+    """测试多个会话同时提交相同请求只调用一次上游"""
+    completions = FakeCompletions(["乾", "为", "天", "。"], delay=0.05)
+    agents = []
+    for _ in range(5):
+        agent = make_agent(cast=CastResult("紫微斗数", ("紫微星", "命宫")))
+        agent.coalescer = StreamCoalescer() if not agents else agents[0].coalescer
+        agent.client = fake_client(completions)
+        agents.append(agent)
+
+    outputs = [None] * len(agents)
+
+    def run(i):
+        outputs[i] = "".join(agents[i].run_divination_stream("紫微斗数", "我的事业运如何？"))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(agents))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert completions.calls == 1
+    assert all(output.endswith("AI解读：\n乾为天。") for output in outputs)
+    print("✅ 智能体请求合并测试成功")
+
+
+def test_async_coalescer():
+    """测试asyncio版请求合并"""
+    coalescer = AsyncStreamCoalescer()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        for piece in ["一", "二", "三"]:
+            await asyncio.sleep(0.01)
+            yield piece
+
+    async def collect():
+        return "".join([piece async for piece in coalescer.stream("key", factory)])
+
+    async def main():
+        return await asyncio.gather(*(collect() for _ in range(10)))
+
+    assert asyncio.run(main()) == ["一二三"] * 10
+    assert len(calls) == 1
+    print("✅ 异步请求合并测试成功")
+
+
+if __name__ == "__main__":
+    test_coalescer_shares_one_upstream()
+    test_coalescer_propagates_error()
+    test_agent_coalesces_concurrent_sessions()
+    test_async_coalescer()
+    print("🎉 所有测试通过！")
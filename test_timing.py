@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试分阶段耗时统计
+"""
+
+import sys
+import os
+import io
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from timing import Histogram, TimingRegistry, Trace, enable_json_log
+from conftest import make_agent
+
+print("🔍 正在测试分阶段耗时统计...")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_trace_records_stages_and_marks():
+    """测试阶段耗时累加、时刻只记第一次、结束时写入直方图"""
+    clock = FakeClock()
+    registry = TimingRegistry()
+    trace = Trace(registry=registry, clock=clock, method="六爻")
+    with trace.span("cast"):
+        clock.now += 0.01
+    with trace.span("render"):
+        clock.now += 0.02
+    trace.mark("first_token")
+    with trace.span("render"):
+        clock.now += 0.03
+    trace.mark("first_token")
+    trace.mark("last_token")
+
+    record = trace.finish()
+    assert record['method'] == "六爻"
+    assert record['stages'] == {'cast': 0.01, 'render': 0.05}
+    assert record['marks'] == {'first_token': 0.03, 'last_token': 0.06}
+    assert record['total'] == 0.06
+    assert trace.finish() is record  # 重复调用只记录一次
+
+    snapshot = registry.snapshot()
+    assert snapshot['render']['count'] == 1
+    assert abs(snapshot['render']['sum'] - 0.05) < 1e-9
+    assert snapshot['total']['count'] == 1
+    print("✅ 阶段记录测试成功")
+
+
+def test_histogram_quantile():
+    """测试分桶直方图的分位数估算"""
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in [0.5] * 50 + [1.5] * 45 + [3.0] * 5:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 1.0
+    assert 1.0 < histogram.quantile(0.9) <= 2.0
+    assert 2.0 < histogram.quantile(0.99) <= 4.0
+    histogram.observe(100)
+    assert histogram.quantile(1.0) == 4.0
+    assert Histogram().quantile(0.5) is None
+    print("✅ 直方图分位数测试成功")
+
+
+def test_json_log_line():
+    """测试每次结束输出一行JSON"""
+    stream = io.StringIO()
+    enable_json_log(stream)
+    enable_json_log(stream)  # 重复调用不会重复输出
+    try:
+        Trace(registry=TimingRegistry(), method="梅花易数").finish()
+    finally:
+        import timing
+        for handler in list(timing.logger.handlers):
+            timing.logger.removeHandler(handler)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])['method'] == "梅花易数"
+    print("✅ JSON日志测试成功")
+
+
+def test_agent_stream_reports_stages():
+    """测试智能体流式占卜记录起卦、构建提示词、连接上游和首末token"""
+    agent = make_agent(["乾", "为", "天"], coalesce=False)
+    trace = Trace(registry=TimingRegistry())
+    output = "".join(agent.run_divination_stream("六爻", "我的事业运如何？", trace=trace))
+    assert output.endswith("乾为天")
+
+    # 传入的trace由调用方结束
+    assert trace.record is None
+    record = trace.finish()
+    assert {"cast", "cache", "queue", "prompt", "connect"} <= set(record['stages'])
+    assert record['marks']['first_token'] <= record['marks']['last_token']
+    assert isinstance(record['seed'], int)  # 种子随记录输出，可据此重现卦象
+    print("✅ 智能体阶段记录测试成功")
+
+
+if __name__ == "__main__":
+    test_trace_records_stages_and_marks()
+    test_histogram_quantile()
+    test_json_log_line()
+    test_agent_stream_reports_stages()
+    print("🎉 所有测试通过！")
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分阶段耗时统计模块
+一次占卜要经过起卦、图表渲染、构建提示词、连接上游、首token、
+末token、最终渲染等阶段。Trace记录每个阶段的耗时，结束时输出一行JSON日志，
+并写入进程内的直方图，便于定位慢请求究竟慢在matplotlib、等待还是大模型
+"""
+
+import bisect
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("divination.timing")
+
+# 直方图分桶上界（秒），覆盖毫秒级的缓存命中到分钟级的长输出
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """固定分桶的延迟直方图"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶线性插值估算分位数，超出最大分桶时返回最大上界"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class TimingRegistry:
+    """按阶段汇总的直方图集合，线程安全"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._listeners: List[Callable[[Dict], None]] = []
+        # 已开始但尚未结束的Trace数量，即正在进行的占卜数
+        self.active = 0
+
+    def add_listener(self, listener: Callable[[Dict], None]) -> None:
+        """注册Trace结束时的回调，参数为完整的耗时记录"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _started(self) -> None:
+        with self._lock:
+            self.active += 1
+
+    def _finished(self, record: Dict) -> None:
+        with self._lock:
+            self.active -= 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(record)
+            except Exception:
+                logger.exception("耗时记录回调失败")
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """各阶段的次数、总耗时、分桶计数与估算分位数"""
+        with self._lock:
+            return {
+                stage: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': list(zip(histogram.buckets, itertools.accumulate(histogram.counts))),
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'p99': histogram.quantile(0.99),
+                }
+                for stage, histogram in self._histograms.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+# 进程内共享的耗时统计
+default_registry = TimingRegistry()
+
+_trace_ids = itertools.count(1)
+
+
+class Trace:
+    """一次占卜的分阶段耗时记录
+
+    span统计阶段耗时（同名阶段累加），mark记录某个时刻距开始的偏移（只记第一次）
+    """
+
+    def __init__(self, name: str = "reading", registry: Optional[TimingRegistry] = None,
+                 clock: Callable[[], float] = time.perf_counter, **attrs):
+        self.name = name
+        self.id = next(_trace_ids)
+        self.attrs = attrs
+        self.registry = registry if registry is not None else default_registry
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started = clock()
+        self.stages: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._order: List[str] = []
+        self.record: Optional[Dict] = None
+        self._observers: List[Callable[[str], None]] = []
+        self.registry._started()
+
+    def add_observer(self, observer: Callable[[str], None]) -> None:
+        """注册阶段回调：每个阶段结束或打点时以阶段名调用，可能在后台线程中执行"""
+        with self._lock:
+            self._observers.append(observer)
+
+    def _notify(self, name: str) -> None:
+        for observer in list(self._observers):
+            try:
+                observer(name)
+            except Exception:
+                logger.exception("阶段回调失败")
+
+    @contextmanager
+    def span(self, stage: str):
+        """统计with块的耗时"""
+        start = self._clock()
+        try:
+            yield self
+        finally:
+            self.add(stage, self._clock() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        """累加某个阶段的耗时"""
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = 0.0
+                self._order.append(stage)
+            self.stages[stage] += seconds
+        self._notify(stage)
+
+    def mark(self, name: str) -> None:
+        """记录某个时刻（例如首token）距开始的偏移"""
+        offset = self._clock() - self.started
+        with self._lock:
+            first = name not in self.marks
+            self.marks.setdefault(name, offset)
+        if first:
+            self._notify(name)
+
+    def set(self, **attrs) -> None:
+        """附加属性（例如输出的token数、错误类型），随记录一起输出"""
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self, **attrs) -> Dict:
+        """结束记录：输出JSON日志并写入直方图，重复调用只生效一次"""
+        with self._lock:
+            if self.record is not None:
+                return self.record
+            self.attrs.update(attrs)
+            self.record = {
+                'trace': self.name,
+                'id': self.id,
+                **self.attrs,
+                'total': round(self._clock() - self.started, 6),
+                'stages': {stage: round(self.stages[stage], 6) for stage in self._order},
+                'marks': {name: round(offset, 6) for name, offset in self.marks.items()},
+            }
+            stages = dict(self.stages)
+            marks = dict(self.marks)
+
+        for stage, seconds in stages.items():
+            self.registry.observe(stage, seconds)
+        for name, offset in marks.items():
+            self.registry.observe(name, offset)
+        self.registry.observe("total", self.record['total'])
+        logger.info(json.dumps(self.record, ensure_ascii=False))
+        self.registry._finished(self.record)
+        return self.record
+
+
+class NullTrace:
+    """不记录任何内容的Trace，未开启统计时使用"""
+
+    def span(self, stage: str):
+        return nullcontext(self)
+
+    def add(self, stage: str, seconds: float) -> None:
+        pass
+
+    def add_observer(self, observer: Callable[[str], None]) -> None:
+        pass
+
+    def mark(self, name: str) -> None:
+        pass
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def finish(self, **attrs) -> Dict:
+        return {}
+
+
+NULL_TRACE = NullTrace()
+
+
+def enable_json_log(stream=None) -> None:
+    """将耗时记录以每行一个JSON的形式输出到stream（默认stderr）"""
+    if any(getattr(handler, '_divination_timing', False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    handler._divination_timing = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False